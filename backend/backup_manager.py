@@ -5,18 +5,140 @@ Handles automated daily backups and restoration capabilities
 """
 
 import os
+import re
+import sys
 import subprocess
 import datetime
 import json
 import gzip
 import shutil
+import tempfile
+import time
 from pathlib import Path
 
+# Dump formats: plain SQL through a compressor, custom archive through a compressor,
+# or a directory archive written by parallel pg_dump jobs
+FORMATS = ('plain', 'custom', 'directory')
+
+# External compressors, all multi-threaded except gzip; 'python' is the legacy
+# in-process gzip.open path, kept for comparison
+COMPRESSORS = {
+    'zstd': {'suffix': '.zst', 'compress': ['zstd', '-q', '-3', '-T{jobs}', '-c'], 'decompress': ['zstd', '-q', '-d', '-c']},
+    'pigz': {'suffix': '.gz', 'compress': ['pigz', '-6', '-p', '{jobs}', '-c'], 'decompress': ['pigz', '-d', '-c']},
+    'gzip': {'suffix': '.gz', 'compress': ['gzip', '-6', '-c'], 'decompress': ['gzip', '-d', '-c']},
+}
+
+FORMAT_SUFFIX = {'plain': '.sql', 'custom': '.dump', 'directory': '.dir'}
+
+# Decompressors by file suffix, fastest first
+DECOMPRESSORS = {'.zst': ('zstd',), '.gz': ('pigz', 'gzip')}
+
+# Restores read backup files in chunks of this size
+CHUNK_SIZE = 1024 * 1024
+
+# pg_restore --verbose lines for a TOC entry that is done (serial and parallel phases)
+RESTORED_ITEM = re.compile(rb'(?:processing(?: missed)?|finished) item (\d+)')
+
+# pg_restore -l line of a table definition: "215; 1259 16390 TABLE public users postgres"
+TOC_TABLE = re.compile(rb'^\d+; \d+ \d+ TABLE (\S+) (\S+) ', re.M)
+
+# Exact row count of every table in the public schema, one "table|rows" line each, in one query
+ROW_COUNTS_SQL = (
+    "SELECT table_name, (xpath('/row/c/text()', query_to_xml("
+    "format('SELECT count(*) AS c FROM %I.%I', table_schema, table_name), false, true, ''"
+    ")))[1]::text::bigint "
+    "FROM information_schema.tables WHERE table_schema = 'public' AND table_type = 'BASE TABLE'"
+)
+
+
+# swap: load into a side database and rename it over the live one; replace: drop and restore in place
+RESTORE_MODES = ('swap', 'replace')
+
+
+def quote_ident(name):
+    return '"' + name.replace('"', '""') + '"'
+
+
+def quote_literal(value):
+    return "'" + value.replace("'", "''") + "'"
+
+
+def backup_format_of(filename):
+    """Dump format of a backup file name, e.g. 'custom' for backup_x.dump.zst"""
+    if filename.endswith(FORMAT_SUFFIX['directory']):
+        return 'directory'
+    for suffix in DECOMPRESSORS:
+        if filename.endswith(suffix):
+            filename = filename[:-len(suffix)]
+            break
+    for backup_format, suffix in FORMAT_SUFFIX.items():
+        if filename.endswith(suffix):
+            return backup_format
+    return None
+
+
+def print_progress(status):
+    """Default progress report: one line on stderr, stdout carries the JSON result"""
+    if status['unit'] == 'bytes':
+        amount = f"{status['done'] / 1e6:.1f} of {status['total'] / 1e6:.1f} MB, {status['rate'] / 1e6:.1f} MB/s"
+    else:
+        amount = f"{status['done']} of {status['total']} {status['unit']}, {status['rate']:.1f}/s"
+    percent = f"{status['percent']}% " if status['percent'] is not None else ''
+    eta = str(datetime.timedelta(seconds=round(status['eta']))) if status['eta'] is not None else '?'
+    print(f"restore {status['phase']}: {percent}{amount}, ETA {eta}", file=sys.stderr, flush=True)
+
+
+class TransferProgress:
+    """
+    Throughput and ETA of one restore phase, passed to `report` at most every
+    BACKUP_PROGRESS_INTERVAL seconds and once when the phase ends
+    """
+    
+    def __init__(self, phase, total, unit='bytes', report=None, interval=None):
+        self.phase = phase
+        self.total = total or 0
+        self.unit = unit
+        self.report = report or print_progress
+        self.interval = float(interval if interval is not None else os.getenv('BACKUP_PROGRESS_INTERVAL', '5'))
+        self.done = 0
+        self.started = self._reported = time.monotonic()
+    
+    def update(self, amount):
+        self.done += amount
+        now = time.monotonic()
+        if now - self._reported >= self.interval:
+            self._reported = now
+            self.report(self.status(now))
+    
+    def finish(self):
+        self.report(self.status(time.monotonic()))
+    
+    def status(self, now):
+        elapsed = now - self.started
+        rate = self.done / elapsed if elapsed > 0 else 0.0
+        remaining = max(self.total - self.done, 0)
+        return {
+            'phase': self.phase,
+            'unit': self.unit,
+            'done': self.done,
+            'total': self.total,
+            'percent': round(100 * self.done / self.total, 1) if self.total else None,
+            'rate': rate,
+            'eta': remaining / rate if rate and self.total else None,
+            'elapsed': round(elapsed, 3),
+        }
+
 
 class BackupManager:
-    def __init__(self):
-        self.backup_dir = Path('/app/backups')
-        self.backup_dir.mkdir(exist_ok=True)
+    def __init__(self, backup_format=None, compressor=None, jobs=None, backup_dir=None):
+        self.backup_dir = Path(backup_dir or os.getenv('BACKUP_DIR', '/app/backups'))
+        self.backup_dir.mkdir(parents=True, exist_ok=True)
+        
+        self.backup_format = backup_format or os.getenv('BACKUP_FORMAT', 'plain')
+        if self.backup_format not in FORMATS:
+            raise ValueError(f"Unknown backup format: {self.backup_format}")
+        self.compressor = compressor or os.getenv('BACKUP_COMPRESSOR', 'auto')
+        self.jobs = int(jobs or os.getenv('BACKUP_JOBS', '0')) or os.cpu_count() or 1
         
         # Database configuration
         self.db_config = {
@@ -26,49 +148,193 @@ class BackupManager:
             'password': os.getenv('POSTGRES_PASSWORD', 'postgres'),
             'name': os.getenv('POSTGRES_DB', 'sistema'),
         }
-        
-    def create_backup(self):
-        """Create a compressed backup of the database"""
-        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
-        backup_filename = f"backup_{self.db_config['name']}_{timestamp}.sql.gz"
-        backup_path = self.backup_dir / backup_filename
-        
-        # Set environment variable for password
+    
+    def _env(self):
         env = os.environ.copy()
         env['PGPASSWORD'] = self.db_config['password']
-        
-        # Build pg_dump command
-        cmd = [
-            'pg_dump',
+        return env
+    
+    def _connection_args(self):
+        return [
             '-h', self.db_config['host'],
             '-p', self.db_config['port'],
             '-U', self.db_config['user'],
+        ]
+    
+    def _psql(self, database, sql, env=None):
+        """Run SQL through psql and return its unaligned output, stopping at the first error"""
+        result = subprocess.run(
+            ['psql', *self._connection_args(), '-d', database, '-v', 'ON_ERROR_STOP=1', '-Atc', sql],
+            env=env or self._env(), capture_output=True, check=True
+        )
+        return result.stdout.decode().strip()
+    
+    def resolve_compressor(self):
+        """Pick the compressor: the configured one, or the fastest installed (zstd, pigz, gzip)"""
+        if self.compressor == 'python':
+            return 'python'
+        if self.compressor != 'auto':
+            if self.compressor not in COMPRESSORS:
+                raise ValueError(f"Unknown compressor: {self.compressor}")
+            if not shutil.which(self.compressor):
+                raise RuntimeError(f"Compressor not installed: {self.compressor}")
+            return self.compressor
+        for name in ('zstd', 'pigz', 'gzip'):
+            if shutil.which(name):
+                return name
+        return 'python'
+    
+    def compress_command(self, compressor):
+        return [arg.format(jobs=self.jobs) for arg in COMPRESSORS[compressor]['compress']]
+    
+    def pg_dump_version(self):
+        """Major version of the installed pg_dump (zstd archives need 16+)"""
+        output = subprocess.run(['pg_dump', '--version'], capture_output=True, text=True, check=True).stdout
+        match = re.search(r'(\d+)(?:\.\d+)?', output)
+        return int(match.group(1)) if match else 0
+    
+    def table_row_counts(self, database, env=None):
+        """Rows in each table of the public schema: {table: rows}"""
+        output = self._psql(database, ROW_COUNTS_SQL, env)
+        return {table: int(rows) for table, rows in (line.rsplit('|', 1) for line in output.splitlines())}
+    
+    def database_size(self):
+        """Size in bytes of the live database, used to report dump throughput"""
+        try:
+            return int(self._psql(self.db_config['name'], 'SELECT pg_database_size(current_database())'))
+        except (subprocess.CalledProcessError, ValueError, OSError):
+            return None
+    
+    def dump_command(self, output=None):
+        cmd = [
+            'pg_dump',
+            *self._connection_args(),
             '-d', self.db_config['name'],
             '--verbose',
-            '--clean',
-            '--if-exists'
         ]
+        if self.backup_format == 'plain':
+            # Only meaningful for plain SQL; archive formats take these at restore time
+            cmd += ['--clean', '--if-exists']
+        elif self.backup_format == 'custom':
+            # Compression happens in the external compressor, on all cores
+            cmd += ['-Fc', '-Z', '0']
+        else:
+            # Each job dumps and compresses its own tables
+            compression = 'zstd:3' if self.pg_dump_version() >= 16 else '6'
+            cmd += ['-Fd', '-j', str(self.jobs), '--compress', compression, '-f', str(output)]
+        return cmd
+    
+    def _run_dump_pipeline(self, dump_cmd, compress_cmd, output_path, env, stderr):
+        """
+        pg_dump | compressor > output_path, connected by OS pipes: the dump never
+        passes through Python. pg_dump's stderr goes to a file so a chatty
+        --verbose cannot fill its pipe and stall the chain
+        """
+        with open(output_path, 'wb') as output:
+            dump = subprocess.Popen(dump_cmd, env=env, stdout=subprocess.PIPE, stderr=stderr)
+            try:
+                compress = subprocess.Popen(compress_cmd, stdin=dump.stdout, stdout=output, stderr=subprocess.PIPE)
+            except OSError:
+                dump.kill()
+                dump.wait()
+                raise
+            finally:
+                # The compressor owns the read end now; if it dies, pg_dump gets SIGPIPE
+                dump.stdout.close()
+            _, compress_error = compress.communicate()
+            dump.wait()
         
+        if dump.returncode != 0:
+            raise subprocess.CalledProcessError(dump.returncode, dump_cmd)
+        if compress.returncode != 0:
+            raise subprocess.CalledProcessError(compress.returncode, compress_cmd, stderr=compress_error)
+    
+    @staticmethod
+    def _artifact_size(path):
+        if path.is_dir():
+            return sum(f.stat().st_size for f in path.rglob('*') if f.is_file())
+        return path.stat().st_size
+    
+    @staticmethod
+    def _remove_artifact(path):
+        if path.is_dir():
+            shutil.rmtree(path, ignore_errors=True)
+        elif path.exists():
+            path.unlink()
+    
+    def create_backup(self):
+        """
+        Create a compressed backup of the database
+        plain and custom stream pg_dump through a multi-threaded compressor
+        (zstd -T / pigz -p) straight to disk; directory runs BACKUP_JOBS
+        parallel pg_dump jobs that each compress their own tables
+        """
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        base_name = f"backup_{self.db_config['name']}_{timestamp}"
+        env = self._env()
+        
+        compressor = None if self.backup_format == 'directory' else self.resolve_compressor()
+        if self.backup_format == 'directory':
+            backup_filename = base_name + FORMAT_SUFFIX['directory']
+        elif compressor == 'python':
+            backup_filename = base_name + FORMAT_SUFFIX[self.backup_format] + '.gz'
+        else:
+            backup_filename = base_name + FORMAT_SUFFIX[self.backup_format] + COMPRESSORS[compressor]['suffix']
+        backup_path = self.backup_dir / backup_filename
+        
+        started = time.monotonic()
         try:
-            # Create backup and compress
-            with gzip.open(backup_path, 'wb') as backup_file:
-                result = subprocess.run(
-                    cmd,
-                    env=env,
-                    stdout=backup_file,
-                    stderr=subprocess.PIPE,
-                    check=True
-                )
+            # Manifest checked after a restore; taken just before pg_dump's snapshot,
+            # so writes in between can move the counts slightly
+            try:
+                table_rows = self.table_row_counts(self.db_config['name'], env)
+            except (subprocess.CalledProcessError, ValueError, OSError):
+                table_rows = None
+            
+            with tempfile.TemporaryFile() as stderr:
+                try:
+                    if self.backup_format == 'directory':
+                        subprocess.run(self.dump_command(backup_path), env=env, stderr=stderr, check=True)
+                    elif compressor == 'python':
+                        # Legacy path: compression runs in this process, under the GIL. The
+                        # dump is copied through GzipFile; handing it to Popen as stdout
+                        # would write to the raw file descriptor, uncompressed
+                        dump_cmd = self.dump_command()
+                        with gzip.open(backup_path, 'wb') as backup_file:
+                            dump = subprocess.Popen(dump_cmd, env=env, stdout=subprocess.PIPE, stderr=stderr)
+                            with dump.stdout:
+                                shutil.copyfileobj(dump.stdout, backup_file, 1024 * 1024)
+                            if dump.wait() != 0:
+                                raise subprocess.CalledProcessError(dump.returncode, dump_cmd)
+                    else:
+                        self._run_dump_pipeline(
+                            self.dump_command(), self.compress_command(compressor), backup_path, env, stderr
+                        )
+                except subprocess.CalledProcessError as e:
+                    stderr.seek(0)
+                    # The last lines of pg_dump's log carry the actual error
+                    e.stderr = e.stderr or stderr.read()[-4000:]
+                    raise
+            
+            elapsed = time.monotonic() - started
+            database_size = self.database_size()
             
             # Create metadata file
             metadata = {
                 'timestamp': timestamp,
                 'database': self.db_config['name'],
                 'filename': backup_filename,
-                'size': backup_path.stat().st_size
+                'format': self.backup_format,
+                'compressor': compressor or 'pg_dump',
+                'jobs': self.jobs if self.backup_format == 'directory' else 1,
+                'size': self._artifact_size(backup_path),
+                'database_size': database_size,
+                'seconds': round(elapsed, 3),
+                'mb_per_sec': round(database_size / elapsed / 1e6, 2) if database_size and elapsed else None,
+                'tables': table_rows,
             }
             
-            metadata_path = backup_path.with_suffix('.json')
+            metadata_path = self.backup_dir / f"{base_name}.json"
             with open(metadata_path, 'w') as f:
                 json.dump(metadata, f, indent=2)
             
@@ -81,14 +347,382 @@ class BackupManager:
                 'metadata': metadata
             }
             
-        except subprocess.CalledProcessError as e:
+        except (subprocess.CalledProcessError, OSError) as e:
+            self._remove_artifact(backup_path)
+            stderr = getattr(e, 'stderr', None)
             return {
                 'success': False,
-                'error': e.stderr.decode() if e.stderr else str(e)
+                'error': stderr.decode(errors='replace') if isinstance(stderr, bytes) else (stderr or str(e))
             }
     
-    def restore_backup(self, backup_filename):
-        """Restore database from backup file"""
+    def decompress_command(self, backup_path):
+        """Decompressor for a compressed backup file, or None to read it as is"""
+        names = DECOMPRESSORS.get(backup_path.suffix)
+        if not names:
+            return None
+        for name in names:
+            if shutil.which(name):
+                return list(COMPRESSORS[name]['decompress'])
+        if backup_path.suffix == '.gz':
+            # Python's gzip module reads these without an external tool
+            return None
+        raise RuntimeError(f"Decompressor not installed: {' or '.join(names)}")
+    
+    def _stream_into(self, backup_path, sink, env, stderr, progress):
+        """
+        backup file | decompressor | sink, with constant memory: the file is read
+        in CHUNK_SIZE chunks and the decompressed stream only crosses OS pipes.
+        `sink` is a restore command (psql, pg_restore reading stdin) or an open file
+        """
+        decompress_cmd = self.decompress_command(backup_path)
+        processes = []
+        try:
+            if isinstance(sink, list):
+                target = subprocess.Popen(
+                    sink, env=env, stdin=subprocess.PIPE, stdout=subprocess.DEVNULL, stderr=stderr
+                )
+                processes.append((target, sink))
+                writer = target.stdin
+            else:
+                writer = sink
+            
+            if decompress_cmd:
+                decompress = subprocess.Popen(decompress_cmd, stdin=subprocess.PIPE, stdout=writer, stderr=stderr)
+                processes.append((decompress, decompress_cmd))
+                if writer is not sink:
+                    # The decompressor owns the restore process's stdin now
+                    writer.close()
+                writer = decompress.stdin
+            
+            with open(backup_path, 'rb') as raw:
+                source = gzip.GzipFile(fileobj=raw) if decompress_cmd is None and backup_path.suffix == '.gz' else raw
+                try:
+                    while True:
+                        chunk = source.read(CHUNK_SIZE)
+                        if not chunk:
+                            break
+                        writer.write(chunk)
+                        # Progress counts backup file bytes, so the total is known upfront
+                        progress.update(raw.tell() - progress.done)
+                except BrokenPipeError:
+                    # A process in the chain exited early; its exit status says why
+                    pass
+                finally:
+                    if writer is not sink:
+                        try:
+                            writer.close()
+                        except BrokenPipeError:
+                            pass
+            
+            for process, _ in processes:
+                process.wait()
+        except BaseException:
+            for process, _ in processes:
+                process.kill()
+                process.wait()
+            raise
+        progress.finish()
+        
+        # The restore process first: when it fails the decompressor only sees a broken pipe
+        for process, cmd in processes:
+            if process.returncode != 0:
+                raise subprocess.CalledProcessError(process.returncode, cmd)
+    
+    @staticmethod
+    def toc_tables(listing):
+        """Tables of the public schema in a pg_restore -l listing"""
+        return {name.decode() for schema, name in TOC_TABLE.findall(listing) if schema == b'public'}
+    
+    @staticmethod
+    def _toc_weights(archive_path, listing):
+        """
+        Progress weight of each archive TOC entry: the size of its data file for
+        directory archives, one per entry otherwise (custom archives have no
+        per-entry sizes in the listing)
+        """
+        ids = [int(match.group(1)) for match in re.finditer(rb'^(\d+);', listing, re.M)]
+        if archive_path.is_dir():
+            sizes = {}
+            for data_file in archive_path.iterdir():
+                dump_id = data_file.name.split('.', 1)[0]
+                if dump_id.isdigit():
+                    sizes[int(dump_id)] = data_file.stat().st_size
+            if sizes:
+                return {dump_id: sizes.get(dump_id, 0) for dump_id in ids}, 'bytes'
+        return {dump_id: 1 for dump_id in ids}, 'items'
+    
+    def restore_command(self, backup_format, database, archive_path=None):
+        """
+        Command that loads a backup into `database`: psql or pg_restore reading
+        stdin, or with `archive_path` a parallel pg_restore of that archive
+        """
+        if backup_format == 'plain':
+            # All or nothing: the first failing statement aborts the load and rolls it back
+            return [
+                'psql', *self._connection_args(), '-d', database,
+                '-v', 'ON_ERROR_STOP=1', '--single-transaction', '-f', '-',
+            ]
+        cmd = ['pg_restore', *self._connection_args(), '-d', database]
+        if archive_path is not None:
+            cmd += ['--verbose', '-j', str(self.jobs), str(archive_path)]
+        return cmd
+    
+    def _run_pg_restore(self, archive_path, database, env, stderr, report):
+        """
+        pg_restore -j BACKUP_JOBS from a seekable archive, tracking finished TOC
+        entries. Returns the tables listed in the archive's TOC
+        """
+        listing = subprocess.run(
+            ['pg_restore', '-l', str(archive_path)], env=env, capture_output=True, check=True
+        ).stdout
+        weights, unit = self._toc_weights(archive_path, listing)
+        progress = TransferProgress('pg_restore', sum(weights.values()), unit, report)
+        cmd = self.restore_command('directory' if archive_path.is_dir() else 'custom', database, archive_path)
+        process = subprocess.Popen(cmd, env=env, stdout=subprocess.DEVNULL, stderr=subprocess.PIPE)
+        try:
+            for line in process.stderr:
+                stderr.write(line)
+                match = RESTORED_ITEM.search(line)
+                if match:
+                    progress.update(weights.get(int(match.group(1)), 0))
+            process.wait()
+        except BaseException:
+            process.kill()
+            process.wait()
+            raise
+        finally:
+            process.stderr.close()
+        progress.finish()
+        if process.returncode != 0:
+            raise subprocess.CalledProcessError(process.returncode, cmd)
+        return self.toc_tables(listing)
+    
+    def _load_backup(self, backup_path, backup_format, database, env, report=None):
+        """
+        Load a backup into an existing, empty database. Returns the tables in
+        the archive's TOC when pg_restore read one, None for streamed loads
+        """
+        with tempfile.TemporaryFile() as stderr:
+            try:
+                if backup_format == 'plain':
+                    restore_cmd = self.restore_command(backup_format, database)
+                    progress = TransferProgress('psql', backup_path.stat().st_size, report=report)
+                    self._stream_into(backup_path, restore_cmd, env, stderr, progress)
+                elif backup_format == 'directory':
+                    return self._run_pg_restore(backup_path, database, env, stderr, report)
+                elif self.jobs > 1:
+                    # Parallel pg_restore needs a seekable archive: decompress it to disk first
+                    if backup_path.suffix not in DECOMPRESSORS:
+                        return self._run_pg_restore(backup_path, database, env, stderr, report)
+                    else:
+                        with tempfile.NamedTemporaryFile(
+                            dir=self.backup_dir, prefix='.restore_', suffix='.dump'
+                        ) as archive:
+                            progress = TransferProgress('decompress', backup_path.stat().st_size, report=report)
+                            self._stream_into(backup_path, archive, env, stderr, progress)
+                            archive.flush()
+                            return self._run_pg_restore(Path(archive.name), database, env, stderr, report)
+                else:
+                    restore_cmd = self.restore_command(backup_format, database)
+                    progress = TransferProgress('pg_restore', backup_path.stat().st_size, report=report)
+                    self._stream_into(backup_path, restore_cmd, env, stderr, progress)
+                return None
+            except subprocess.CalledProcessError as e:
+                stderr.seek(0, os.SEEK_END)
+                stderr.seek(max(stderr.tell() - 4000, 0))
+                e.stderr = e.stderr or stderr.read()
+                raise
+    
+    def read_manifest(self, backup_filename):
+        """Row counts per table recorded when the backup was taken, or None (older backups)"""
+        base_name = backup_filename
+        for suffix in DECOMPRESSORS:
+            if base_name.endswith(suffix):
+                base_name = base_name[:-len(suffix)]
+                break
+        for suffix in FORMAT_SUFFIX.values():
+            if base_name.endswith(suffix):
+                base_name = base_name[:-len(suffix)]
+                break
+        try:
+            with open(self.backup_dir / f"{base_name}.json") as f:
+                return json.load(f).get('tables')
+        except (OSError, ValueError):
+            return None
+    
+    def validate_database(self, database, env=None, toc_tables=None, manifest=None):
+        """
+        Checks on a restored database before it goes live. It must have tables
+        and applied Django migrations; every table in the archive TOC
+        (`toc_tables`) or in the backup manifest (`manifest`, rows per table)
+        must exist, and no table may have fewer rows than the manifest beyond
+        BACKUP_ROW_COUNT_TOLERANCE (the manifest is counted just before the
+        dump, so concurrent writes move it slightly). Other row count
+        differences, and migrations applied on the live database but missing
+        from the backup, are reported, not fatal: restoring an older backup is
+        expected to need a migrate afterwards
+        """
+        restored_rows = self.table_row_counts(database, env)
+        if not restored_rows:
+            raise RuntimeError(f"Restored database {database} has no tables")
+        
+        expected = set(toc_tables or ()) | set(manifest or ())
+        missing = sorted(expected - set(restored_rows))
+        if missing:
+            raise RuntimeError(f"Restored database {database} is missing tables: {', '.join(missing)}")
+        
+        tolerance = float(os.getenv('BACKUP_ROW_COUNT_TOLERANCE', '0.01'))
+        row_differences = {
+            table: {'manifest': rows, 'restored': restored_rows[table]}
+            for table, rows in (manifest or {}).items()
+            if restored_rows[table] != rows
+        }
+        short = sorted(
+            table for table, counts in row_differences.items()
+            if counts['restored'] < counts['manifest'] * (1 - tolerance)
+        )
+        if short:
+            raise RuntimeError(
+                f"Restored database {database} has fewer rows than the backup manifest in: {', '.join(short)}"
+            )
+        
+        if 'django_migrations' not in restored_rows:
+            raise RuntimeError(f"Restored database {database} has no django_migrations table")
+        migrations_sql = "SELECT app || '.' || name FROM django_migrations"
+        applied = set(self._psql(database, migrations_sql, env).splitlines())
+        if not applied:
+            raise RuntimeError(f"Restored database {database} has no applied migrations")
+        try:
+            live_applied = set(self._psql(self.db_config['name'], migrations_sql, env).splitlines())
+        except subprocess.CalledProcessError:
+            # No live database (or no schema yet): nothing to compare against
+            live_applied = set()
+        
+        return {
+            'tables': len(restored_rows),
+            'checked_against': [name for name, used in (('toc', toc_tables), ('manifest', manifest)) if used],
+            'row_count_differences': row_differences,
+            'migrations': len(applied),
+            'missing_migrations': sorted(live_applied - applied),
+        }
+    
+    def swap_database(self, side_database, previous_database, env=None):
+        """
+        Put a restored database in place of the live one by renaming both.
+        New connections to the live database are refused and the open ones
+        terminated (a database cannot be renamed while in use); the renames then
+        run in one transaction, so either the restored copy is live or nothing
+        changed. Clients reconnect by name and land on the restored database.
+        The previous copy is left refusing connections (see `reopen_database`).
+        Returns the seconds the live database was unavailable
+        """
+        env = env or self._env()
+        live = self.db_config['name']
+        maintenance = self._maintenance_db()
+        timeout = float(os.getenv('BACKUP_SWAP_TIMEOUT', '30'))
+        
+        started = time.monotonic()
+        self._psql(maintenance, f"ALTER DATABASE {quote_ident(live)} WITH ALLOW_CONNECTIONS false", env)
+        try:
+            deadline = started + timeout
+            while True:
+                # Signals the remaining backends and counts them; zero once they are all gone
+                remaining = int(self._psql(
+                    maintenance,
+                    f"SELECT count(pg_terminate_backend(pid)) FROM pg_stat_activity WHERE datname = {quote_literal(live)}",
+                    env
+                ))
+                if not remaining:
+                    break
+                if time.monotonic() > deadline:
+                    raise RuntimeError(f"{remaining} connections to {live} still open after {timeout:.0f}s")
+                time.sleep(0.1)
+            
+            self._psql(maintenance, (
+                f"BEGIN; "
+                f"ALTER DATABASE {quote_ident(live)} RENAME TO {quote_ident(previous_database)}; "
+                f"ALTER DATABASE {quote_ident(side_database)} RENAME TO {quote_ident(live)}; "
+                f"COMMIT;"
+            ), env)
+        except BaseException:
+            # Nothing was renamed: give the live database back to its clients
+            try:
+                self._psql(maintenance, f"ALTER DATABASE {quote_ident(live)} WITH ALLOW_CONNECTIONS true", env)
+            except subprocess.CalledProcessError:
+                pass
+            raise
+        return time.monotonic() - started
+    
+    def reopen_database(self, database, env=None):
+        """Let clients connect to a database again (the pre-restore copy, for inspection or to swap back)"""
+        self._psql(self._maintenance_db(), f"ALTER DATABASE {quote_ident(database)} WITH ALLOW_CONNECTIONS true", env)
+    
+    @staticmethod
+    def _maintenance_db():
+        return os.getenv('BACKUP_MAINTENANCE_DB', 'postgres')
+    
+    def database_exists(self, database, env=None):
+        return self._psql(
+            self._maintenance_db(), f"SELECT 1 FROM pg_database WHERE datname = {quote_literal(database)}", env
+        ) == '1'
+    
+    def _drop_database(self, database, env):
+        """Drop a database if it exists; returns the error output on failure, None otherwise"""
+        result = subprocess.run(
+            ['dropdb', *self._connection_args(), '--if-exists', '--force', database],
+            env=env, capture_output=True
+        )
+        if result.returncode:
+            return result.stderr.decode(errors='replace').strip() or f"dropdb exited with {result.returncode}"
+        return None
+    
+    def _drop_previous_databases(self, keep, env):
+        """
+        Keep only the most recent pre-restore copy, so swaps hold at most one extra database
+        Returns the problems found, as warnings: the restore is already live at this point
+        """
+        # LIKE treats '_' as a wildcard; escape it so only our own names match
+        pattern = (self.db_config['name'] + '_previous_').replace('_', r'\_') + '%'
+        try:
+            names = self._psql(
+                self._maintenance_db(),
+                f"SELECT datname FROM pg_database WHERE datname LIKE {quote_literal(pattern)}",
+                env
+            ).splitlines()
+        except subprocess.CalledProcessError as e:
+            return [f"Could not list previous databases: {e.stderr.decode(errors='replace').strip()}"]
+        warnings = []
+        for name in names:
+            if name != keep:
+                error = self._drop_database(name, env)
+                if error:
+                    warnings.append(f"Could not drop {name}: {error}")
+        return warnings
+    
+    def restore_backup(self, backup_filename, progress=None, mode=None):
+        """
+        Restore database from backup file
+        Plain dumps stream through the decompressor into psql; custom and
+        directory archives go to pg_restore with BACKUP_JOBS parallel jobs.
+        Memory use does not grow with the dump, and throughput and ETA are
+        passed to `progress` (default: a line on stderr every few seconds)
+        
+        In 'swap' mode (BACKUP_RESTORE_MODE, the default) the backup is loaded
+        into a side database, validated against the archive TOC and the row
+        counts recorded with the backup, and renamed over the live one, which
+        stays up until the rename: downtime is seconds whatever the dump size.
+        The live database is kept as <name>_previous_<timestamp>; when there is
+        no live database (disaster recovery) the side database simply takes its
+        name. 'replace' drops the live database, if any, and restores in place
+        
+        Once the restored database is live, failures in the cleanup that
+        follows (reopening or dropping previous copies) are returned under
+        'warnings' and do not fail the restore
+        """
+        mode = mode or os.getenv('BACKUP_RESTORE_MODE', 'swap')
+        if mode not in RESTORE_MODES:
+            raise ValueError(f"Unknown restore mode: {mode}")
+        
         backup_path = self.backup_dir / backup_filename
         
         if not backup_path.exists():
@@ -97,80 +731,94 @@ class BackupManager:
                 'error': f'Backup file not found: {backup_filename}'
             }
         
-        # Set environment variable for password
-        env = os.environ.copy()
-        env['PGPASSWORD'] = self.db_config['password']
+        backup_format = backup_format_of(backup_filename)
+        if backup_format is None:
+            return {
+                'success': False,
+                'error': f'Unrecognized backup file: {backup_filename}'
+            }
+        
+        env = self._env()
+        started = time.monotonic()
+        live = self.db_config['name']
+        timestamp = datetime.datetime.now().strftime('%Y%m%d_%H%M%S')
+        target = f"{live}_restore_{timestamp}" if mode == 'swap' else live
+        
+        previous = None
         
         try:
-            # Drop and recreate database
-            drop_cmd = [
-                'dropdb',
-                '-h', self.db_config['host'],
-                '-p', self.db_config['port'],
-                '-U', self.db_config['user'],
-                '--force',
-                self.db_config['name']
-            ]
-            
-            create_cmd = [
-                'createdb',
-                '-h', self.db_config['host'],
-                '-p', self.db_config['port'],
-                '-U', self.db_config['user'],
-                self.db_config['name']
-            ]
+            if mode == 'replace':
+                # Drop and recreate database
+                subprocess.run(
+                    ['dropdb', *self._connection_args(), '--if-exists', '--force', live], env=env, check=True
+                )
+            subprocess.run(['createdb', *self._connection_args(), target], env=env, check=True)
             
-            # Execute drop and create
-            subprocess.run(drop_cmd, env=env, check=True)
-            subprocess.run(create_cmd, env=env, check=True)
-            
-            # Restore from backup
-            restore_cmd = [
-                'psql',
-                '-h', self.db_config['host'],
-                '-p', self.db_config['port'],
-                '-U', self.db_config['user'],
-                '-d', self.db_config['name'],
-                '-f', '-'  # Read from stdin
-            ]
+            toc_tables = self._load_backup(backup_path, backup_format, target, env, progress)
             
-            # Decompress and restore
-            if backup_path.suffix == '.gz':
-                with gzip.open(backup_path, 'rb') as backup_file:
-                    subprocess.run(
-                        restore_cmd,
-                        env=env,
-                        input=backup_file.read(),
-                        check=True
-                    )
-            else:
-                with open(backup_path, 'rb') as backup_file:
-                    subprocess.run(
-                        restore_cmd,
-                        env=env,
-                        input=backup_file.read(),
-                        check=True
-                    )
-            
-            return {
+            result = {
                 'success': True,
-                'message': f'Database restored successfully from {backup_filename}'
+                'message': f'Database restored successfully from {backup_filename}',
+                'format': backup_format,
+                'mode': mode,
+                'jobs': 1 if backup_format == 'plain' else self.jobs,
             }
             
-        except subprocess.CalledProcessError as e:
+            if mode == 'swap':
+                result['validation'] = self.validate_database(
+                    target, env, toc_tables, self.read_manifest(backup_filename)
+                )
+                # Neither psql nor pg_restore collects planner statistics; do it before going live
+                self._psql(target, 'ANALYZE', env)
+                if self.database_exists(live, env):
+                    previous = f"{live}_previous_{timestamp}"
+                    result['downtime_seconds'] = round(self.swap_database(target, previous, env), 3)
+                else:
+                    # Disaster recovery: nothing to swap with, the restored copy takes the live name
+                    self._psql(
+                        self._maintenance_db(),
+                        f"ALTER DATABASE {quote_ident(target)} RENAME TO {quote_ident(live)}",
+                        env
+                    )
+                    result['downtime_seconds'] = 0.0
+                result['previous_database'] = previous
+            
+        except (subprocess.CalledProcessError, OSError, RuntimeError) as e:
+            if mode == 'swap':
+                # The live database was not touched; only the side copy goes away
+                self._drop_database(target, env)
+            stderr = getattr(e, 'stderr', None)
             return {
                 'success': False,
-                'error': e.stderr.decode() if e.stderr else str(e)
+                'error': stderr.decode(errors='replace') if isinstance(stderr, bytes) else (stderr or str(e))
             }
+        
+        # The restored database is live from here on: cleanup problems are warnings
+        warnings = []
+        if previous:
+            try:
+                self.reopen_database(previous, env)
+            except subprocess.CalledProcessError as e:
+                warnings.append(f"Could not reopen {previous}: {e.stderr.decode(errors='replace').strip()}")
+            warnings.extend(self._drop_previous_databases(previous, env))
+        if warnings:
+            result['warnings'] = warnings
+        
+        elapsed = time.monotonic() - started
+        result['seconds'] = round(elapsed, 3)
+        try:
+            result['mb_per_sec'] = round(self._artifact_size(backup_path) / elapsed / 1e6, 2) if elapsed else None
+        except OSError:
+            result['mb_per_sec'] = None
+        return result
     
     def list_backups(self):
         """List all available backups"""
         backups = []
-        for file in self.backup_dir.glob('backup_*.sql.gz'):
-            metadata_file = file.with_suffix('.json')
-            if metadata_file.exists():
-                with open(metadata_file, 'r') as f:
-                    metadata = json.load(f)
+        for metadata_file in self.backup_dir.glob('backup_*.json'):
+            with open(metadata_file, 'r') as f:
+                metadata = json.load(f)
+            if (self.backup_dir / metadata['filename']).exists():
                 backups.append(metadata)
         
         return sorted(backups, key=lambda x: x['timestamp'], reverse=True)
@@ -179,13 +827,22 @@ class BackupManager:
         """Clean backups older than specified days"""
         cutoff_date = datetime.datetime.now() - datetime.timedelta(days=days_to_keep)
         
-        for file in self.backup_dir.glob('backup_*.sql.gz'):
+        for metadata_file in self.backup_dir.glob('backup_*.json'):
+            file_date = datetime.datetime.fromtimestamp(metadata_file.stat().st_mtime)
+            if file_date < cutoff_date:
+                with open(metadata_file, 'r') as f:
+                    filename = json.load(f).get('filename')
+                if filename:
+                    self._remove_artifact(self.backup_dir / filename)
+                metadata_file.unlink()
+        
+        # Dumps without metadata (interrupted runs, older layouts)
+        for file in self.backup_dir.glob('backup_*'):
+            if file.suffix == '.json':
+                continue
             file_date = datetime.datetime.fromtimestamp(file.stat().st_mtime)
             if file_date < cutoff_date:
-                file.unlink()
-                metadata_file = file.with_suffix('.json')
-                if metadata_file.exists():
-                    metadata_file.unlink()
+                self._remove_artifact(file)
 
 
 def create_daily_backup():
@@ -213,20 +870,28 @@ if __name__ == '__main__':
     parser = argparse.ArgumentParser(description='Database Backup and Restore Manager')
     parser.add_argument('action', choices=['backup', 'restore', 'list'], help='Action to perform')
     parser.add_argument('--filename', help='Backup filename for restore')
+    parser.add_argument('--format', choices=FORMATS, help='Dump format (default: BACKUP_FORMAT or plain)')
+    parser.add_argument('--compressor', choices=[*COMPRESSORS, 'python', 'auto'],
+                        help='Compressor for plain/custom dumps (default: BACKUP_COMPRESSOR or auto)')
+    parser.add_argument('--jobs', type=int, help='Parallel jobs/threads (default: BACKUP_JOBS or CPU count)')
+    parser.add_argument('--mode', choices=RESTORE_MODES,
+                        help='Restore into a side database and swap, or drop and replace (default: BACKUP_RESTORE_MODE or swap)')
     
     args = parser.parse_args()
     
-    manager = BackupManager()
+    manager = BackupManager(backup_format=args.format, compressor=args.compressor, jobs=args.jobs)
     
     if args.action == 'backup':
         result = manager.create_backup()
         print(json.dumps(result, indent=2))
+        exit(0 if result['success'] else 1)
     elif args.action == 'restore':
         if not args.filename:
             print("Error: --filename required for restore")
             exit(1)
-        result = manager.restore_backup(args.filename)
+        result = manager.restore_backup(args.filename, mode=args.mode)
         print(json.dumps(result, indent=2))
+        exit(0 if result['success'] else 1)
     elif args.action == 'list':
         backups = manager.list_backups()
         print(json.dumps(backups, indent=2))
\ No newline at end of file
@@ -0,0 +1,167 @@
+#!/usr/bin/env python3
+"""
+ASGI vs WSGI benchmark for the authenticated request path
+Starts gunicorn (core.wsgi, with the gunicorn.conf.py that entrypoint.sh ships)
+and uvicorn (core.asgi, async JWT middleware) with the same number of workers
+and compares requests/sec for requests carrying a Bearer token
+"""
+
+import os
+import sys
+import json
+import time
+import socket
+import argparse
+import threading
+import subprocess
+import http.client
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+SERVERS = {
+    'gunicorn': lambda port, workers: [
+        'gunicorn', 'core.wsgi:application',
+        '--config', 'gunicorn.conf.py',
+        '--bind', f'127.0.0.1:{port}',
+        '--workers', str(workers),
+        '--log-level', 'warning'
+    ],
+    'uvicorn': lambda port, workers: [
+        'uvicorn', 'core.asgi:application',
+        '--host', '127.0.0.1',
+        '--port', str(port),
+        '--workers', str(workers),
+        '--log-level', 'warning'
+    ],
+}
+
+
+def issue_token():
+    """Create (or reuse) a benchmark user and return a fresh access token"""
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
+
+    import django
+    django.setup()
+
+    from django.contrib.auth import get_user_model
+    from core.services import JWTService
+
+    User = get_user_model()
+    user, created = User.objects.get_or_create(
+        email='bench@example.com',
+        defaults={'username': 'bench'}
+    )
+    return JWTService.generate_tokens(user)['access']
+
+
+def wait_for_port(port, timeout=30):
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout=0.5):
+                return True
+        except OSError:
+            time.sleep(0.2)
+    return False
+
+
+def run_load(port, path, token, concurrency, duration):
+    """Hammer the server with keep-alive connections and collect latencies"""
+    headers = {'Authorization': f'Bearer {token}'}
+    deadline = time.monotonic() + duration
+    latencies = []
+    errors = [0]
+    lock = threading.Lock()
+
+    def worker():
+        conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+        local_latencies = []
+        local_errors = 0
+        while time.monotonic() < deadline:
+            started = time.perf_counter()
+            try:
+                conn.request('GET', path, headers=headers)
+                response = conn.getresponse()
+                response.read()
+                if response.status >= 400:
+                    local_errors += 1
+            except (OSError, http.client.HTTPException):
+                local_errors += 1
+                conn.close()
+                conn = http.client.HTTPConnection('127.0.0.1', port, timeout=10)
+                continue
+            local_latencies.append(time.perf_counter() - started)
+        conn.close()
+        with lock:
+            latencies.extend(local_latencies)
+            errors[0] += local_errors
+
+    threads = [threading.Thread(target=worker) for _ in range(concurrency)]
+    started = time.monotonic()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.monotonic() - started
+
+    latencies.sort()
+
+    def percentile(p):
+        if not latencies:
+            return None
+        return round(latencies[min(len(latencies) - 1, int(len(latencies) * p))] * 1000, 3)
+
+    return {
+        'requests': len(latencies),
+        'errors': errors[0],
+        'requests_per_sec': round(len(latencies) / elapsed, 2),
+        'p50_ms': percentile(0.50),
+        'p95_ms': percentile(0.95),
+        'p99_ms': percentile(0.99),
+    }
+
+
+def benchmark_server(name, args, token):
+    cmd = SERVERS[name](args.port, args.workers)
+    process = subprocess.Popen(cmd, cwd=BASE_DIR, env=os.environ.copy())
+    try:
+        if not wait_for_port(args.port):
+            return {'error': f'{name} did not start on port {args.port}'}
+
+        # Warm-up: loads code, key ring and caches in every worker
+        run_load(args.port, args.path, token, args.concurrency, args.warmup)
+        result = run_load(args.port, args.path, token, args.concurrency, args.duration)
+        result['command'] = ' '.join(cmd)
+        return result
+    finally:
+        process.terminate()
+        try:
+            process.wait(timeout=10)
+        except subprocess.TimeoutExpired:
+            process.kill()
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare gunicorn (WSGI) and uvicorn (ASGI) on the JWT auth path')
+    parser.add_argument('--servers', nargs='+', choices=sorted(SERVERS), default=['gunicorn', 'uvicorn'])
+    parser.add_argument('--workers', type=int, default=3, help='Worker processes per server (gunicorn.conf.py ships 3)')
+    parser.add_argument('--concurrency', type=int, default=32, help='Concurrent client connections')
+    parser.add_argument('--duration', type=float, default=15, help='Measured seconds per server')
+    parser.add_argument('--warmup', type=float, default=3, help='Warm-up seconds per server')
+    parser.add_argument('--path', default='/api/health/', help='Endpoint requested with the Bearer token')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--token', help='Access token to use instead of issuing one')
+
+    args = parser.parse_args()
+
+    token = args.token or issue_token()
+    results = {name: benchmark_server(name, args, token) for name in args.servers}
+
+    gunicorn_rate = results.get('gunicorn', {}).get('requests_per_sec')
+    uvicorn_rate = results.get('uvicorn', {}).get('requests_per_sec')
+    if gunicorn_rate and uvicorn_rate:
+        results['uvicorn_vs_gunicorn'] = round(uvicorn_rate / gunicorn_rate, 3)
+
+    print(json.dumps(results, indent=2))
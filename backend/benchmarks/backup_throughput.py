@@ -0,0 +1,79 @@
+#!/usr/bin/env python3
+"""
+Backup throughput: the legacy pg_dump | gzip.open path against the streaming
+and parallel modes of BackupManager.create_backup
+Each mode dumps the POSTGRES_* database into a throwaway directory and reports
+wall time, archive size, compression ratio and MB/s of database size as JSON
+
+    python benchmarks/backup_throughput.py
+    python benchmarks/backup_throughput.py --modes plain:python,directory --jobs 8 --repeat 3
+
+Modes are format[:compressor]; the compressor defaults to auto. Needs
+pg_dump/psql on PATH and a reachable database; seed it with realistic data
+(pgbench -i -s 100 gives about 1.5 GB) for numbers worth comparing
+"""
+
+import sys
+import json
+import argparse
+import tempfile
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from backup_manager import BackupManager  # noqa: E402
+
+DEFAULT_MODES = 'plain:python,plain,custom,directory'
+
+
+def run_mode(mode, jobs, repeat):
+    backup_format, _, compressor = mode.partition(':')
+    runs = []
+    for _ in range(repeat):
+        with tempfile.TemporaryDirectory(prefix='bench-backup-') as backup_dir:
+            manager = BackupManager(
+                backup_format=backup_format, compressor=compressor or None, jobs=jobs, backup_dir=backup_dir
+            )
+            result = manager.create_backup()
+            if not result['success']:
+                return {'mode': mode, 'error': result['error'][-500:]}
+            runs.append(result['metadata'])
+
+    best = min(runs, key=lambda run: run['seconds'])
+    database_size = best['database_size']
+    return {
+        'mode': mode,
+        'compressor': best['compressor'],
+        'jobs': best['jobs'],
+        'seconds': best['seconds'],
+        'seconds_all': [run['seconds'] for run in runs],
+        'size_mb': round(best['size'] / 1e6, 2),
+        'database_mb': round(database_size / 1e6, 2) if database_size else None,
+        'ratio': round(database_size / best['size'], 2) if database_size and best['size'] else None,
+        'mb_per_sec': best['mb_per_sec'],
+    }
+
+
+def main(args):
+    results = [run_mode(mode.strip(), args.jobs, args.repeat) for mode in args.modes.split(',') if mode.strip()]
+
+    baseline = next((r for r in results if r['mode'] == 'plain:python' and 'error' not in r), None)
+    for result in results:
+        if baseline and 'error' not in result:
+            result['speedup'] = round(baseline['seconds'] / result['seconds'], 2) if result['seconds'] else None
+
+    report = {'jobs': args.jobs, 'repeat': args.repeat, 'results': results}
+    print(json.dumps(report, indent=2))
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+    return 0 if all('error' not in r for r in results) else 1
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Compare BackupManager dump modes on the POSTGRES_* database')
+    parser.add_argument('--modes', default=DEFAULT_MODES, help='Comma-separated format[:compressor] list')
+    parser.add_argument('--jobs', type=int, help='Parallel jobs/threads (default: BACKUP_JOBS or CPU count)')
+    parser.add_argument('--repeat', type=int, default=1, help='Runs per mode; the fastest is reported')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+    sys.exit(main(parser.parse_args()))
@@ -0,0 +1,71 @@
+"""
+Auth views end to end through the Django test client (middleware, DRF, serializers)
+Login and register are dominated by password hashing, so they run a tenth
+of the iterations
+"""
+
+import itertools
+
+import pytest
+from django.test import Client
+
+from core.services import JWTService
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def client():
+    return Client()
+
+
+def test_login_view(bench, client, user):
+    def login():
+        response = client.post(
+            '/api/auth/login/',
+            {'email': 'bench@example.com', 'password': 'bench-password-123', 'device_id': 'bench'},
+            content_type='application/json'
+        )
+        assert response.status_code == 200, response.content
+
+    bench(login, iterations=max(1, bench.iterations // 10))
+
+
+def test_register_view(bench, client):
+    counter = itertools.count()
+
+    def payload():
+        n = next(counter)
+        return ({
+            'email': f'bench{n}@example.com',
+            'username': f'bench{n}',
+            'password': 'bench-password-123',
+            'password_confirm': 'bench-password-123',
+        },)
+
+    def register(data):
+        response = client.post('/api/auth/register/', data, content_type='application/json')
+        assert response.status_code == 201, response.content
+
+    bench(register, setup=payload, iterations=max(1, bench.iterations // 10))
+
+
+def test_refresh_token_view(bench, client, user):
+    def issue():
+        return (JWTService.generate_tokens(user, device_id='bench')['refresh'],)
+
+    def refresh(token):
+        response = client.post('/api/auth/refresh/', {'refresh': token}, content_type='application/json')
+        assert response.status_code == 200, response.content
+
+    bench(refresh, setup=issue)
+
+
+def test_me_view(bench, client, user):
+    token = JWTService.generate_tokens(user)['access']
+
+    def me():
+        response = client.get('/api/auth/me/', HTTP_AUTHORIZATION=f'Bearer {token}')
+        assert response.status_code == 200, response.content
+
+    bench(me)
@@ -0,0 +1,124 @@
+"""
+Email delivery throughput against the local SMTP stand-in (benchmarks/smtp_sink.py)
+One connection per send_mail versus a batch over one reused connection, and a
+full outbox drain (claim, send, settle); items/sec is emails/sec. Rendering
+compares render_to_string per message with render_many over the cached
+compiled template
+"""
+
+import pytest
+from django.core.mail import send_mail
+
+from core import mail_queue
+from core.models import EmailOutbox
+from core.tasks import send_queued_emails
+from smtp_sink import SMTPSink
+
+BATCH = 50
+# Connection setup against a real relay (TCP + TLS handshake, AUTH) is a few round trips
+CONNECT_DELAY = 0.005
+
+
+@pytest.fixture(scope='module')
+def sink():
+    with SMTPSink(connect_delay=CONNECT_DELAY) as sink:
+        yield sink
+
+
+@pytest.fixture
+def smtp(settings, sink):
+    settings.EMAIL_BACKEND = 'django.core.mail.backends.smtp.EmailBackend'
+    settings.EMAIL_HOST = sink.host
+    settings.EMAIL_PORT = sink.port
+    settings.EMAIL_USE_TLS = False
+    settings.EMAIL_HOST_USER = ''
+    settings.EMAIL_HOST_PASSWORD = ''
+    sink.reset()
+    return sink
+
+
+def messages(count):
+    return [
+        EmailOutbox(
+            kind='bench',
+            subject='Bench',
+            html=f'<p>message {n}</p>',
+            from_email='bench@example.com',
+            recipients=[f'bench{n}@example.com']
+        )
+        for n in range(count)
+    ]
+
+
+def test_send_mail_per_message(bench, smtp):
+    def send():
+        send_mail('Bench', '', 'bench@example.com', ['bench@example.com'], html_message='<p>message</p>')
+
+    result = bench(send, items=1)
+    assert smtp.connections == smtp.count == result['iterations'] + min(bench.warmup, result['iterations'])
+
+
+def test_send_batch_reused_connection(bench, smtp):
+    def send(batch):
+        sent, failed = mail_queue.send_batch(batch)
+        assert len(sent) == BATCH and not failed
+
+    iterations = max(1, bench.iterations // 10)
+    bench(send, setup=lambda: (messages(BATCH),), iterations=iterations, items=BATCH)
+    assert smtp.count == smtp.connections * BATCH
+
+
+@pytest.mark.django_db
+def test_drain_outbox(bench, smtp, settings):
+    settings.EMAIL_BATCH_SIZE = BATCH
+    settings.EMAIL_DRAIN_WORKERS = 1
+
+    def fill():
+        EmailOutbox.objects.bulk_create(messages(BATCH * 4))
+        return ()
+
+    def drain():
+        result = send_queued_emails()
+        assert result['sent'] == BATCH * 4, result
+
+    bench(drain, setup=fill, iterations=max(1, bench.iterations // 20), items=BATCH * 4)
+    assert not EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).exists()
+
+
+class Recipient:
+    def __init__(self, n):
+        self.pk = n
+        self.username = f'bench{n}'
+        self.first_name = f'Bench {n}'
+        self.email = f'bench{n}@example.com'
+
+
+RENDER_BATCH = 1000
+
+
+def verification_context(n):
+    return {
+        'user': Recipient(n),
+        'verification_url': f'https://example.com/verify-email/{n}',
+        'expires_in': 24,
+    }
+
+
+def test_render_to_string(bench):
+    from django.template.loader import render_to_string
+
+    def render():
+        for n in range(RENDER_BATCH):
+            render_to_string('emails/verification.html', verification_context(n))
+
+    bench(render, iterations=max(1, bench.iterations // 20), items=RENDER_BATCH)
+
+
+def test_render_many_compiled(bench):
+    from core.email_templates import email_templates
+
+    def render():
+        for _ in email_templates.render_many('verification', (verification_context(n) for n in range(RENDER_BATCH))):
+            pass
+
+    bench(render, iterations=max(1, bench.iterations // 20), items=RENDER_BATCH)
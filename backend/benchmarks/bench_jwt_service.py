@@ -0,0 +1,53 @@
+"""
+JWTService hot path: token issue, verification, refresh and revocation
+"""
+
+import pytest
+
+from core.services import JWTService
+
+pytestmark = pytest.mark.django_db
+
+
+def test_generate_tokens(bench, user):
+    # Same device every time: measures the session upsert, not table growth
+    bench(lambda: JWTService.generate_tokens(user, device_id='bench'))
+
+
+def test_verify_token(bench, user):
+    token = JWTService.generate_tokens(user)['access']
+    bench(lambda: JWTService.verify_token(token))
+
+
+def test_verify_token_uncached(bench, user):
+    from core.services import payload_cache
+
+    token = JWTService.generate_tokens(user)['access']
+
+    def verify():
+        payload_cache.clear()
+        JWTService.verify_token(token)
+
+    bench(verify)
+
+
+def test_refresh_access_token(bench, user):
+    def issue():
+        return (JWTService.generate_tokens(user, device_id='bench')['refresh'],)
+
+    def refresh(token):
+        result, error = JWTService.refresh_access_token(token)
+        assert error is None, error
+
+    bench(refresh, setup=issue)
+
+
+def test_blacklist_token(bench, user):
+    def issue():
+        return (JWTService.encode_token(JWTService.build_access_payload(user.id, user.email, 0)),)
+
+    def blacklist(token):
+        ok, error = JWTService.blacklist_token(token)
+        assert ok, error
+
+    bench(blacklist, setup=issue)
@@ -0,0 +1,50 @@
+"""
+EmailRateLimiter with and without the in-process tier
+The Redis-backed runs need a reachable Redis (REDIS_HOST/REDIS_PORT) and are
+skipped otherwise; the degraded run opens the tier's Redis circuit and needs none
+"""
+
+import itertools
+import time
+
+import pytest
+import redis
+
+from core.email_service import EmailRateLimiter, local_rate_tier
+from core.redis_clients import redis_pools
+
+# Large enough that most hits are clear local allows
+BULK_LIMIT = 1000
+
+
+@pytest.fixture
+def tier():
+    local_rate_tier.clear()
+    yield local_rate_tier
+    local_rate_tier.clear()
+
+
+@pytest.fixture
+def redis_up():
+    try:
+        redis_pools.client('rate_limit').ping()
+    except redis.RedisError:
+        pytest.skip('needs Redis')
+
+
+def identifiers(count):
+    cycle = itertools.cycle([f'bench{n}@example.com' for n in range(count)])
+    return lambda: (next(cycle),)
+
+
+@pytest.mark.parametrize('local', [False, True], ids=['redis_only', 'two_tier'])
+def test_rate_limit_hit(bench, tier, redis_up, local):
+    limiter = EmailRateLimiter(local=local)
+    bench(lambda identifier: limiter.hit('bench', identifier, max_attempts=BULK_LIMIT), setup=identifiers(50))
+
+
+def test_rate_limit_hit_redis_down(bench, tier):
+    limiter = EmailRateLimiter(local=True)
+    # As after a failed Redis call: the tier decides alone until the retry time
+    tier.redis_down_until = time.monotonic() + 3600
+    bench(lambda identifier: limiter.hit('bench', identifier, max_attempts=BULK_LIMIT), setup=identifiers(50))
@@ -0,0 +1,168 @@
+"""
+Benchmark harness for the auth hot path
+Each benchmark times a callable over a fixed number of iterations, reports
+ops/sec and p50/p95/p99 and compares them with the stored baseline, failing
+when throughput drops or p95 grows by more than the threshold
+
+    pytest -c benchmarks/pytest.ini benchmarks                # compare with baseline.json
+    pytest -c benchmarks/pytest.ini benchmarks --bench-save   # record a new baseline
+
+Baselines are machine-specific: record one on the machine that runs the comparison
+"""
+
+import json
+import time
+from pathlib import Path
+
+import pytest
+
+BENCH_DIR = Path(__file__).resolve().parent
+
+RESULTS = {}
+
+
+def pytest_addoption(parser):
+    group = parser.getgroup('bench', 'auth benchmarks')
+    group.addoption('--bench-iterations', type=int, default=200, help='Timed iterations per benchmark')
+    group.addoption('--bench-warmup', type=int, default=20, help='Untimed warm-up iterations per benchmark')
+    group.addoption('--bench-baseline', default=str(BENCH_DIR / 'baseline.json'), help='Baseline JSON file')
+    group.addoption('--bench-threshold', type=float, default=0.25,
+                    help='Allowed regression against the baseline (0.25 = 25%%)')
+    group.addoption('--bench-save', action='store_true', help='Write the results as the new baseline')
+    group.addoption('--bench-report', help='Also write the results to this JSON file')
+
+
+def load_baseline(path):
+    try:
+        with open(path) as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return {}
+
+
+def percentile(samples, p):
+    return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+
+def measure(func, setup, iterations, warmup, items=None):
+    """
+    Time `func(*setup())` per iteration; setup runs outside the timed region
+    When each call handles several items (a batch of emails), `items` adds items/sec
+    """
+    for _ in range(warmup):
+        func(*(setup() if setup else ()))
+
+    samples = []
+    for _ in range(iterations):
+        args = setup() if setup else ()
+        started = time.perf_counter()
+        func(*args)
+        samples.append(time.perf_counter() - started)
+
+    total = sum(samples)
+    samples.sort()
+    result = {
+        'iterations': iterations,
+        'ops_per_sec': round(iterations / total, 2),
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+    }
+    if items:
+        result['items_per_sec'] = round(iterations * items / total, 2)
+    return result
+
+
+def find_regressions(result, reference, threshold):
+    problems = []
+    if result['ops_per_sec'] < reference['ops_per_sec'] * (1 - threshold):
+        problems.append(f"ops/sec {result['ops_per_sec']} < baseline {reference['ops_per_sec']}")
+    if result['p95_ms'] > reference['p95_ms'] * (1 + threshold):
+        problems.append(f"p95 {result['p95_ms']}ms > baseline {reference['p95_ms']}ms")
+    return problems
+
+
+class Bench:
+    def __init__(self, config, name):
+        self.name = name
+        self.iterations = config.getoption('bench_iterations')
+        self.warmup = config.getoption('bench_warmup')
+        self.threshold = config.getoption('bench_threshold')
+        self.save = config.getoption('bench_save')
+        self.baseline = config.bench_baseline
+
+    def __call__(self, func, setup=None, iterations=None, items=None):
+        iterations = iterations or self.iterations
+        result = measure(func, setup, iterations, min(self.warmup, iterations), items)
+        RESULTS[self.name] = result
+
+        reference = self.baseline.get(self.name)
+        if reference and not self.save:
+            problems = find_regressions(result, reference, self.threshold)
+            if problems:
+                pytest.fail(f"{self.name} regressed: " + '; '.join(problems), pytrace=False)
+        return result
+
+
+def pytest_configure(config):
+    config.bench_baseline = load_baseline(config.getoption('bench_baseline'))
+
+
+@pytest.fixture
+def bench(request):
+    return Bench(request.config, request.node.name)
+
+
+@pytest.fixture(autouse=True)
+def clean_caches():
+    """Every benchmark starts with empty shared and per-worker caches"""
+    from django.core.cache import cache
+    from core.services import payload_cache
+
+    cache.clear()
+    payload_cache.clear()
+    yield
+
+
+@pytest.fixture
+def user(django_user_model):
+    return django_user_model.objects.create_user(
+        username='bench',
+        email='bench@example.com',
+        password='bench-password-123'
+    )
+
+
+def pytest_terminal_summary(terminalreporter, config):
+    if not RESULTS:
+        return
+    baseline = config.bench_baseline
+    terminalreporter.section('auth benchmarks')
+    terminalreporter.write_line(
+        f"{'benchmark':<32}{'ops/sec':>12}{'items/sec':>12}{'p50 ms':>10}{'p95 ms':>10}{'p99 ms':>10}{'vs base':>10}"
+    )
+    for name, result in sorted(RESULTS.items()):
+        reference = baseline.get(name)
+        change = f"{result['ops_per_sec'] / reference['ops_per_sec'] - 1:+.1%}" if reference else '-'
+        terminalreporter.write_line(
+            f"{name:<32}{result['ops_per_sec']:>12}{result.get('items_per_sec', '-'):>12}{result['p50_ms']:>10}"
+            f"{result['p95_ms']:>10}{result['p99_ms']:>10}{change:>10}"
+        )
+
+
+def pytest_sessionfinish(session):
+    config = session.config
+    if not RESULTS:
+        return
+
+    if config.getoption('bench_save'):
+        # Merge so a partial run (-k) keeps the other entries
+        baseline = dict(config.bench_baseline)
+        baseline.update(RESULTS)
+        with open(config.getoption('bench_baseline'), 'w') as f:
+            json.dump(baseline, f, indent=2, sort_keys=True)
+
+    report = config.getoption('bench_report')
+    if report:
+        with open(report, 'w') as f:
+            json.dump(RESULTS, f, indent=2, sort_keys=True)
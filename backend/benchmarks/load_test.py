@@ -0,0 +1,516 @@
+#!/usr/bin/env python3
+"""
+Load generator for the REST and GraphQL endpoints
+Drives core.wsgi / core.asgi in-process (no server, no sockets) or a running
+server over HTTP with a weighted mix of login, refresh, me, health and
+GraphQL requests at a fixed concurrency, and prints throughput, latency
+histograms, error rates and (in-process only) SQL queries per request as JSON
+
+    python benchmarks/load_test.py --target wsgi --concurrency 16 --duration 20
+    python benchmarks/load_test.py --target asgi --mix me=8,refresh=1,graphql=1
+    python benchmarks/load_test.py --target http://127.0.0.1:8000 --concurrency 64
+
+In-process runs default to benchmarks.settings on a throwaway SQLite file;
+use BENCH_DATABASE=postgres (and BENCH_REDIS_URL) for numbers worth comparing
+"""
+
+import os
+import io
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import threading
+import contextvars
+import http.client
+from collections import Counter, defaultdict
+from pathlib import Path
+from urllib.parse import urlsplit
+
+BASE_DIR = Path(__file__).resolve().parent.parent
+
+PASSWORD = 'load-password-123'
+
+HISTOGRAM_BUCKETS_MS = (1, 2, 5, 10, 25, 50, 100, 250, 500, 1000, 2500, 5000)
+
+DEFAULT_MIX = 'login=1,refresh=2,me=5,health=1,graphql=1'
+
+
+class Session:
+    """Per-worker client state: credentials and the current token pair"""
+
+    def __init__(self, index):
+        self.email = f'load{index}@example.com'
+        self.username = f'load{index}'
+        self.device_id = f'load-test-{index}'
+        self.access = None
+        self.refresh = None
+
+    def build(self, endpoint):
+        """Return (method, path, query, body, headers) for one request"""
+        auth = {'Authorization': f'Bearer {self.access}'} if self.access else {}
+        if endpoint == 'register':
+            return 'POST', '/api/auth/register/', '', {
+                'email': self.email,
+                'username': self.username,
+                'password': PASSWORD,
+                'password_confirm': PASSWORD,
+            }, {}
+        if endpoint == 'login':
+            return 'POST', '/api/auth/login/', '', {
+                'email': self.email,
+                'password': PASSWORD,
+                'device_id': self.device_id,
+            }, {}
+        if endpoint == 'refresh':
+            return 'POST', '/api/auth/refresh/', '', {'refresh': self.refresh}, {}
+        if endpoint == 'me':
+            return 'GET', '/api/auth/me/', '', None, auth
+        if endpoint == 'health':
+            return 'GET', '/api/health/', '', None, {}
+        if endpoint == 'graphql':
+            return 'GET', '/graphql/', 'query=%7Bhello%7D', None, auth
+        raise ValueError(f'Unknown endpoint {endpoint}')
+
+    def update(self, endpoint, status, body):
+        """Keep the newest tokens: login and refresh both rotate the session"""
+        if status != 200 or endpoint not in ('login', 'refresh'):
+            return
+        data = json.loads(body)
+        tokens = data.get('tokens', data)
+        self.access = tokens.get('access', self.access)
+        self.refresh = tokens.get('refresh', self.refresh)
+
+
+def encode_request(body, headers):
+    headers = dict(headers)
+    headers['Accept'] = 'application/json'
+    payload = b''
+    if body is not None:
+        payload = json.dumps(body).encode()
+        headers['Content-Type'] = 'application/json'
+        headers['Content-Length'] = str(len(payload))
+    return payload, headers
+
+
+class WSGIDriver:
+    """Calls the WSGI callable directly from each worker thread"""
+
+    concurrency_model = 'threads'
+
+    def __init__(self):
+        from core.wsgi import application
+        self.app = application
+
+    def request(self, method, path, query, body, headers):
+        payload, headers = encode_request(body, headers)
+        environ = {
+            'REQUEST_METHOD': method,
+            'PATH_INFO': path,
+            'QUERY_STRING': query,
+            'SCRIPT_NAME': '',
+            'SERVER_NAME': 'testserver',
+            'SERVER_PORT': '80',
+            'SERVER_PROTOCOL': 'HTTP/1.1',
+            'REMOTE_ADDR': '127.0.0.1',
+            'wsgi.version': (1, 0),
+            'wsgi.url_scheme': 'http',
+            'wsgi.input': io.BytesIO(payload),
+            'wsgi.errors': sys.stderr,
+            'wsgi.multithread': True,
+            'wsgi.multiprocess': False,
+            'wsgi.run_once': False,
+        }
+        for name, value in headers.items():
+            key = name.upper().replace('-', '_')
+            if key in ('CONTENT_TYPE', 'CONTENT_LENGTH'):
+                environ[key] = value
+            else:
+                environ[f'HTTP_{key}'] = value
+
+        status = []
+
+        def start_response(status_line, response_headers, exc_info=None):
+            status.append(int(status_line.split()[0]))
+
+        result = self.app(environ, start_response)
+        try:
+            content = b''.join(result)
+        finally:
+            if hasattr(result, 'close'):
+                result.close()
+        return status[0], content
+
+
+class ASGIDriver:
+    """Calls the ASGI callable directly from coroutines on one event loop"""
+
+    concurrency_model = 'asyncio'
+
+    def __init__(self):
+        from core.asgi import application
+        self.app = application
+
+    async def request(self, method, path, query, body, headers):
+        payload, headers = encode_request(body, headers)
+        scope = {
+            'type': 'http',
+            'asgi': {'version': '3.0'},
+            'http_version': '1.1',
+            'method': method,
+            'scheme': 'http',
+            'path': path,
+            'raw_path': path.encode(),
+            'query_string': query.encode(),
+            'root_path': '',
+            'headers': [(b'host', b'testserver')] + [
+                (name.lower().encode(), value.encode()) for name, value in headers.items()
+            ],
+            'client': ('127.0.0.1', 0),
+            'server': ('testserver', 80),
+        }
+        response = {'status': None, 'body': []}
+        finished = asyncio.Event()
+        request_sent = False
+
+        async def receive():
+            nonlocal request_sent
+            if not request_sent:
+                request_sent = True
+                return {'type': 'http.request', 'body': payload, 'more_body': False}
+            # Django listens for a disconnect while the view runs
+            await finished.wait()
+            return {'type': 'http.disconnect'}
+
+        async def send(message):
+            if message['type'] == 'http.response.start':
+                response['status'] = message['status']
+            elif message['type'] == 'http.response.body':
+                response['body'].append(message.get('body', b''))
+                if not message.get('more_body'):
+                    finished.set()
+
+        await self.app(scope, receive, send)
+        finished.set()
+        return response['status'], b''.join(response['body'])
+
+
+class HTTPDriver:
+    """Keep-alive HTTP connection per worker thread against a running server"""
+
+    concurrency_model = 'threads'
+
+    def __init__(self, url):
+        parts = urlsplit(url)
+        self.host = parts.hostname
+        self.port = parts.port or 80
+        self.prefix = parts.path.rstrip('/')
+        self.local = threading.local()
+
+    def connection(self):
+        if getattr(self.local, 'conn', None) is None:
+            self.local.conn = http.client.HTTPConnection(self.host, self.port, timeout=30)
+        return self.local.conn
+
+    def request(self, method, path, query, body, headers):
+        payload, headers = encode_request(body, headers)
+        url = self.prefix + path + (f'?{query}' if query else '')
+        conn = self.connection()
+        try:
+            conn.request(method, url, body=payload or None, headers=headers)
+            response = conn.getresponse()
+            return response.status, response.read()
+        except (OSError, http.client.HTTPException):
+            conn.close()
+            self.local.conn = None
+            raise
+
+
+class QueryCounter:
+    """
+    Counts SQL queries per request via a wrapper on every DB connection
+    The counter travels in a context variable, which asgiref copies into the
+    threads that run sync views under ASGI
+    """
+
+    def __init__(self):
+        self.current = contextvars.ContextVar('load_test_queries', default=None)
+
+    def install(self):
+        from django.db import connections
+        from django.db.backends.signals import connection_created
+
+        for conn in connections.all(initialized_only=True):
+            conn.execute_wrappers.append(self)
+        connection_created.connect(self.on_connection_created, weak=False)
+
+    def on_connection_created(self, sender, connection, **kwargs):
+        if self not in connection.execute_wrappers:
+            connection.execute_wrappers.append(self)
+
+    def start(self):
+        queries = [0]
+        return queries, self.current.set(queries)
+
+    def stop(self, token):
+        self.current.reset(token)
+
+    def __call__(self, execute, sql, params, many, context):
+        queries = self.current.get()
+        if queries is not None:
+            queries[0] += 1
+        return execute(sql, params, many, context)
+
+
+class Recorder:
+    """Latency samples and status codes per endpoint"""
+
+    def __init__(self):
+        self.latencies = defaultdict(list)
+        self.statuses = defaultdict(Counter)
+        self.queries = defaultdict(list)
+        self.lock = threading.Lock()
+
+    def record(self, endpoint, status, elapsed, queries=None):
+        with self.lock:
+            self.latencies[endpoint].append(elapsed)
+            self.statuses[endpoint][status] += 1
+            if queries is not None:
+                self.queries[endpoint].append(queries)
+
+
+def parse_mix(value):
+    mix = {}
+    for item in value.split(','):
+        name, _, weight = item.partition('=')
+        mix[name.strip()] = float(weight or 1)
+    unknown = set(mix) - {'login', 'refresh', 'me', 'health', 'graphql'}
+    if unknown:
+        raise argparse.ArgumentTypeError(f"Unknown endpoints in mix: {', '.join(sorted(unknown))}")
+    return mix
+
+
+def percentile(samples, p):
+    if not samples:
+        return None
+    return round(samples[min(len(samples) - 1, int(len(samples) * p))] * 1000, 3)
+
+
+def histogram(samples):
+    buckets = {f'le_{bound}ms': 0 for bound in HISTOGRAM_BUCKETS_MS}
+    buckets['le_inf'] = 0
+    for sample in samples:
+        ms = sample * 1000
+        for bound in HISTOGRAM_BUCKETS_MS:
+            if ms <= bound:
+                buckets[f'le_{bound}ms'] += 1
+                break
+        else:
+            buckets['le_inf'] += 1
+    return buckets
+
+
+def summarize(samples, statuses, elapsed):
+    samples = sorted(samples)
+    requests = len(samples)
+    errors = sum(count for status, count in statuses.items() if status is None or status >= 400)
+    return {
+        'requests': requests,
+        'errors': errors,
+        'error_rate': round(errors / requests, 4) if requests else 0.0,
+        'requests_per_sec': round(requests / elapsed, 2),
+        'p50_ms': percentile(samples, 0.50),
+        'p95_ms': percentile(samples, 0.95),
+        'p99_ms': percentile(samples, 0.99),
+        'max_ms': round(samples[-1] * 1000, 3) if samples else None,
+        'status_codes': {str(status): count for status, count in sorted(statuses.items(), key=str)},
+        'histogram': histogram(samples),
+    }
+
+
+class LoadTest:
+    def __init__(self, driver, mix, concurrency, duration, warmup, seed, query_counter=None):
+        self.driver = driver
+        self.endpoints = list(mix)
+        self.weights = [mix[name] for name in self.endpoints]
+        self.concurrency = concurrency
+        self.duration = duration
+        self.warmup = warmup
+        self.seed = seed
+        self.query_counter = query_counter
+        self.recorder = Recorder()
+
+    # Register may answer 400 when the user already exists; login always runs
+    prime_steps = ('register', 'login')
+
+    def pick(self, rng, session):
+        endpoint = rng.choices(self.endpoints, self.weights)[0]
+        # A failed refresh leaves no usable token: log in again instead
+        if endpoint == 'refresh' and not session.refresh:
+            endpoint = 'login'
+        return endpoint
+
+    def start_call(self):
+        if self.query_counter is None:
+            return None, None
+        return self.query_counter.start()
+
+    def finish_call(self, session, endpoint, status, body, elapsed, queries, token, measuring):
+        if token is not None:
+            self.query_counter.stop(token)
+        session.update(endpoint, status, body)
+        if endpoint == 'refresh' and status != 200:
+            session.refresh = None
+        if measuring:
+            self.recorder.record(endpoint, status, elapsed, queries[0] if queries else None)
+
+    # -- thread workers (WSGI in-process, HTTP) -----------------------------
+
+    def run_threads(self):
+        sessions = [Session(i) for i in range(self.concurrency)]
+        for session in sessions:
+            for step in self.prime_steps:
+                status, body = self.driver.request(*session.build(step))
+                session.update(step, status, body)
+
+        measure_from = time.monotonic() + self.warmup
+        deadline = measure_from + self.duration
+
+        def worker(index, session):
+            rng = random.Random(self.seed + index)
+            while time.monotonic() < deadline:
+                endpoint = self.pick(rng, session)
+                measuring = time.monotonic() >= measure_from
+                queries, token = self.start_call()
+                started = time.perf_counter()
+                try:
+                    status, body = self.driver.request(*session.build(endpoint))
+                except Exception:
+                    status, body = None, b''
+                elapsed = time.perf_counter() - started
+                self.finish_call(session, endpoint, status, body, elapsed, queries, token, measuring)
+
+        threads = [threading.Thread(target=worker, args=(i, s)) for i, s in enumerate(sessions)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+    # -- asyncio workers (ASGI in-process) ----------------------------------
+
+    async def run_async(self):
+        sessions = [Session(i) for i in range(self.concurrency)]
+        for session in sessions:
+            for step in self.prime_steps:
+                status, body = await self.driver.request(*session.build(step))
+                session.update(step, status, body)
+
+        measure_from = time.monotonic() + self.warmup
+        deadline = measure_from + self.duration
+
+        async def worker(index, session):
+            rng = random.Random(self.seed + index)
+            while time.monotonic() < deadline:
+                endpoint = self.pick(rng, session)
+                measuring = time.monotonic() >= measure_from
+                queries, token = self.start_call()
+                started = time.perf_counter()
+                try:
+                    status, body = await self.driver.request(*session.build(endpoint))
+                except Exception:
+                    status, body = None, b''
+                elapsed = time.perf_counter() - started
+                self.finish_call(session, endpoint, status, body, elapsed, queries, token, measuring)
+
+        await asyncio.gather(*(worker(i, s) for i, s in enumerate(sessions)))
+
+    def run(self):
+        if self.driver.concurrency_model == 'asyncio':
+            asyncio.run(self.run_async())
+        else:
+            self.run_threads()
+        return self.report()
+
+    def report(self):
+        endpoints = {}
+        all_samples = []
+        all_statuses = Counter()
+        for endpoint in sorted(self.recorder.latencies):
+            samples = self.recorder.latencies[endpoint]
+            statuses = self.recorder.statuses[endpoint]
+            endpoints[endpoint] = summarize(samples, statuses, self.duration)
+            queries = self.recorder.queries.get(endpoint)
+            endpoints[endpoint]['sql_queries_per_request'] = (
+                round(sum(queries) / len(queries), 2) if queries else None
+            )
+            all_samples.extend(samples)
+            all_statuses.update(statuses)
+
+        return {
+            'total': summarize(all_samples, all_statuses, self.duration),
+            'endpoints': endpoints,
+        }
+
+
+def setup_django(args):
+    sys.path.insert(0, str(BASE_DIR))
+    os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'benchmarks.settings')
+    temporary_db = (
+        os.environ['DJANGO_SETTINGS_MODULE'] == 'benchmarks.settings'
+        and os.environ.get('BENCH_DATABASE', 'sqlite') != 'postgres'
+        and not os.environ.get('BENCH_SQLITE_NAME')
+    )
+    if temporary_db:
+        os.environ['BENCH_SQLITE_NAME'] = os.path.join(tempfile.mkdtemp(prefix='load-test-'), 'db.sqlite3')
+
+    import django
+    django.setup()
+
+    if temporary_db or args.migrate:
+        from django.core.management import call_command
+        call_command('migrate', verbosity=0)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser(description='Load test the REST and GraphQL endpoints in-process or over HTTP')
+    parser.add_argument('--target', default='wsgi',
+                        help="'wsgi' or 'asgi' to drive core.wsgi/core.asgi in-process, or a server URL")
+    parser.add_argument('--mix', type=parse_mix, default=parse_mix(DEFAULT_MIX),
+                        help=f'Endpoint weights (default {DEFAULT_MIX})')
+    parser.add_argument('--concurrency', type=int, default=16, help='Concurrent clients')
+    parser.add_argument('--duration', type=float, default=15, help='Measured seconds')
+    parser.add_argument('--warmup', type=float, default=3, help='Warm-up seconds, not recorded')
+    parser.add_argument('--seed', type=int, default=0, help='Seed for the request mix')
+    parser.add_argument('--migrate', action='store_true', help='Run migrations before an in-process run')
+    parser.add_argument('--output', help='Also write the JSON report to this file')
+
+    args = parser.parse_args()
+
+    query_counter = None
+    if args.target in ('wsgi', 'asgi'):
+        setup_django(args)
+        query_counter = QueryCounter()
+        query_counter.install()
+        driver = WSGIDriver() if args.target == 'wsgi' else ASGIDriver()
+    else:
+        driver = HTTPDriver(args.target)
+
+    load_test = LoadTest(driver, args.mix, args.concurrency, args.duration, args.warmup, args.seed, query_counter)
+    result = load_test.run()
+    result['config'] = {
+        'target': args.target,
+        'mix': args.mix,
+        'concurrency': args.concurrency,
+        'duration': args.duration,
+        'warmup': args.warmup,
+        'settings': os.environ.get('DJANGO_SETTINGS_MODULE'),
+    }
+
+    output = json.dumps(result, indent=2)
+    if args.output:
+        with open(args.output, 'w') as f:
+            f.write(output)
+    print(output)
@@ -0,0 +1,73 @@
+"""
+Settings for the benchmark suite (benchmarks/bench_*.py) and benchmarks/load_test.py
+Builds on core.settings with a SQLite database (in memory unless
+BENCH_SQLITE_NAME is set) and a local-memory cache. Set
+BENCH_DATABASE=postgres to run against the POSTGRES_* database and
+BENCH_REDIS_URL to use a real Redis cache
+"""
+
+import os
+import tempfile
+
+from core.settings import *  # noqa: F401,F403
+from core.settings import INSTALLED_APPS, MIDDLEWARE
+from key_manager import KeyManager
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+SECURE_SSL_REDIRECT = False
+STATICFILES_DIRS = []
+
+INSTALLED_APPS = [app for app in INSTALLED_APPS if app not in ('debug_toolbar', 'django_extensions')]
+MIDDLEWARE = [m for m in MIDDLEWARE if not m.startswith('debug_toolbar')]
+
+if os.environ.get('BENCH_DATABASE', 'sqlite') != 'postgres':
+    # A file (BENCH_SQLITE_NAME) is needed when several threads share the database
+    DATABASES = {
+        'default': {
+            'ENGINE': 'django.db.backends.sqlite3',
+            'NAME': os.environ.get('BENCH_SQLITE_NAME', ':memory:'),
+            'OPTIONS': {
+                'timeout': 30,
+            },
+        }
+    }
+
+if os.environ.get('BENCH_REDIS_URL'):
+    CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': os.environ['BENCH_REDIS_URL'],
+            'OPTIONS': {
+                'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            }
+        }
+    }
+else:
+    CACHES = {
+        'default': {
+            'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+        }
+    }
+
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_TASK_ALWAYS_EAGER = True
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Password hashing is limited per process: the shared limit lives on REDIS_HOST
+PASSWORD_HASH_SHARED_LIMIT = False
+
+# Fresh RSA signing key per run unless a directory is given. The key ring only reads
+# keys, so they are provisioned here as `manage.py check_keys` does at container start
+JWT_KEYS_DIR = os.environ.get('BENCH_JWT_KEYS_DIR') or tempfile.mkdtemp(prefix='bench-keys-')
+KeyManager(JWT_KEYS_DIR).ensure_keys()
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'root': {
+        'level': 'WARNING',
+    },
+}
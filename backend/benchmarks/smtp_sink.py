@@ -0,0 +1,121 @@
+"""
+Local SMTP stand-in for the email benchmarks
+Speaks just enough SMTP (EHLO/HELO, MAIL, RCPT, DATA, RSET, NOOP, QUIT) for
+Django's SMTP backend, keeps the received messages in memory and counts the
+connections, so batching and connection reuse can be measured without a mail
+server. Optional delays stand in for connection setup (TCP/TLS handshake and
+AUTH with a real relay) and for a slow relay accepting each message
+
+    with SMTPSink() as sink:
+        settings.EMAIL_HOST, settings.EMAIL_PORT = sink.host, sink.port
+        ...
+        assert sink.connections == 1
+"""
+
+import socketserver
+import threading
+import time
+
+
+class _Handler(socketserver.StreamRequestHandler):
+    def reply(self, line):
+        self.wfile.write(f'{line}\r\n'.encode())
+
+    def handle(self):
+        sink = self.server.sink
+        with sink.lock:
+            sink.connections += 1
+        if sink.connect_delay:
+            time.sleep(sink.connect_delay)
+        self.reply('220 smtp-sink ready')
+
+        envelope = None
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            command = line.decode('utf-8', 'replace').strip()
+            verb = command[:4].upper()
+
+            if verb == 'EHLO':
+                self.wfile.write(b'250-smtp-sink\r\n250-8BITMIME\r\n250 SMTPUTF8\r\n')
+            elif verb == 'HELO':
+                self.reply('250 smtp-sink')
+            elif verb == 'MAIL':
+                envelope = {'from': command[10:].strip(' <>'), 'to': []}
+                self.reply('250 OK')
+            elif verb == 'RCPT':
+                if envelope is None:
+                    self.reply('503 need MAIL first')
+                    continue
+                envelope['to'].append(command[8:].strip(' <>'))
+                self.reply('250 OK')
+            elif verb == 'DATA':
+                self.reply('354 end data with <CR><LF>.<CR><LF>')
+                data = []
+                for raw in self.rfile:
+                    if raw in (b'.\r\n', b'.\n'):
+                        break
+                    data.append(raw[1:] if raw.startswith(b'..') else raw)
+                if sink.delay:
+                    time.sleep(sink.delay)
+                sink.received(dict(envelope or {}, data=b''.join(data)))
+                envelope = None
+                self.reply('250 OK queued')
+            elif verb == 'RSET':
+                envelope = None
+                self.reply('250 OK')
+            elif verb == 'NOOP':
+                self.reply('250 OK')
+            elif verb == 'QUIT':
+                self.reply('221 bye')
+                return
+            else:
+                self.reply('502 command not implemented')
+
+
+class _Server(socketserver.ThreadingTCPServer):
+    daemon_threads = True
+    allow_reuse_address = True
+
+
+class SMTPSink:
+    def __init__(self, host='127.0.0.1', port=0, connect_delay=0.0, delay=0.0, keep_messages=False):
+        self.connect_delay = connect_delay
+        self.delay = delay
+        self.keep_messages = keep_messages
+        self.lock = threading.Lock()
+        self.connections = 0
+        self.count = 0
+        self.messages = []
+        self._server = _Server((host, port), _Handler)
+        self._server.sink = self
+        self.host, self.port = self._server.server_address[:2]
+        self._thread = None
+
+    def received(self, message):
+        with self.lock:
+            self.count += 1
+            if self.keep_messages:
+                self.messages.append(message)
+
+    def reset(self):
+        with self.lock:
+            self.connections = 0
+            self.count = 0
+            self.messages = []
+
+    def start(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, name='smtp-sink', daemon=True)
+        self._thread.start()
+        return self
+
+    def stop(self):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *exc):
+        self.stop()
@@ -0,0 +1,18 @@
+from django.apps import AppConfig
+
+
+class CoreConfig(AppConfig):
+    name = 'core'
+
+    def ready(self):
+        # Registra os sinais de invalidação do cache de usuários
+        from . import signals  # noqa: F401
+
+        # Pendências do outbox de emails no /metrics, lidas do banco a cada scrape
+        from prometheus_client import REGISTRY
+        from .mail_queue import OutboxCollector
+        try:
+            REGISTRY.register(OutboxCollector())
+        except ValueError:
+            # Já registrado (ready() chamado de novo, p.ex. em testes)
+            pass
@@ -0,0 +1,69 @@
+from rest_framework.authentication import BaseAuthentication
+from .services import JWTService, AsyncJWTService
+from .instrumentation import jwt_timer
+
+# Atributo do HttpRequest onde o resultado da autenticação fica memorizado
+JWT_AUTH_ATTR = '_jwt_auth'
+
+
+def get_bearer_token(request):
+    """Extrai o token do cabeçalho `Authorization: Bearer <token>`."""
+    auth_header = request.META.get('HTTP_AUTHORIZATION', '')
+    if auth_header.startswith('Bearer '):
+        return auth_header.replace('Bearer ', '')
+    return None
+
+
+def _remember(request, token, user, error):
+    setattr(request, JWT_AUTH_ATTR, (token, user, error))
+    if error:
+        request.auth_error = error
+    return user, error
+
+
+def authenticate_request(request, token):
+    """Resolve o usuário do token no máximo uma vez por request."""
+    cached = getattr(request, JWT_AUTH_ATTR, None)
+    if cached is not None and cached[0] == token:
+        return cached[1], cached[2]
+    with jwt_timer():
+        user, error = JWTService.get_user_from_token(token)
+    return _remember(request, token, user, error)
+
+
+async def aauthenticate_request(request, token):
+    """Versão assíncrona de `authenticate_request`."""
+    cached = getattr(request, JWT_AUTH_ATTR, None)
+    if cached is not None and cached[0] == token:
+        return cached[1], cached[2]
+    with jwt_timer():
+        user, error = await AsyncJWTService.get_user_from_token(token)
+    return _remember(request, token, user, error)
+
+
+class JWTAuthentication(BaseAuthentication):
+    """
+    Autenticação do DRF sobre o JWTService.
+
+    Reaproveita o resultado já obtido pelo JWTAuthenticationMiddleware, de
+    modo que o token é decodificado e o usuário resolvido uma única vez por
+    request. Tokens inválidos deixam a request anônima (com `auth_error`),
+    como no middleware, para que endpoints públicos como login e refresh
+    continuem funcionando com um access token vencido no cabeçalho.
+    """
+
+    keyword = 'Bearer'
+
+    def authenticate(self, request):
+        django_request = request._request
+        token = get_bearer_token(django_request)
+        if not token:
+            return None
+
+        user, error = authenticate_request(django_request, token)
+        if error:
+            return None
+        return user, token
+
+    def authenticate_header(self, request):
+        return f'{self.keyword} realm="api"'
@@ -1,6 +1,7 @@
 import os
 from celery import Celery
 from celery.schedules import crontab
+from celery.signals import worker_process_init
 
 # Set the default Django settings module
 os.environ.setdefault('DJANGO_SETTINGS_MODULE', 'core.settings')
@@ -32,6 +33,18 @@ app.conf.beat_schedule = {
         'task': 'core.tasks.check_key_rotation',
         'schedule': crontab(hour=1, minute=0),  # Daily at 1 AM
     },
+    'token-revocation-index-rebuild': {
+        'task': 'core.tasks.rebuild_token_revocation_index',
+        'schedule': crontab(minute='*/30'),  # Every 30 minutes
+    },
+    'purge-expired-tokens': {
+        'task': 'core.tasks.purge_expired_tokens',
+        'schedule': crontab(hour='0-5', minute=15),  # Hourly, off business hours
+    },
+    'drain-mail-queue': {
+        'task': 'core.tasks.send_queued_emails',
+        'schedule': crontab(minute='*'),  # Retries and drains whose scheduling failed
+    },
 }
 
 # Configure task routing
@@ -40,6 +53,9 @@ app.conf.task_routes = {
     'core.tasks.cleanup_backups': {'queue': 'maintenance'},
     'core.tasks.health_check': {'queue': 'monitoring'},
     'core.tasks.check_key_rotation': {'queue': 'security'},
+    'core.tasks.rebuild_token_revocation_index': {'queue': 'security'},
+    'core.tasks.purge_expired_tokens': {'queue': 'maintenance'},
+    'core.tasks.send_queued_emails': {'queue': 'mail'},
 }
 
 # Configure task settings
@@ -54,6 +70,13 @@ app.conf.update(
     worker_max_tasks_per_child=1000,
 )
 
+@worker_process_init.connect
+def warm_email_templates(**kwargs):
+    # Compile the email templates before the first drain in each worker process
+    from core.email_templates import email_templates
+    email_templates.warm()
+
+
 @app.task(bind=True)
 def debug_task(self):
     print(f'Request: {self.request!r}')
\ No newline at end of file
@@ -1,136 +1,650 @@
+import math
+import time
+import threading
 import redis
 from django.conf import settings
-from django.core.mail import send_mail
-from django.template.loader import render_to_string
+from django.db import transaction
 from django.utils import timezone
 from datetime import timedelta
+from collections import namedtuple, deque, OrderedDict
 import uuid
+import secrets
+from itertools import islice
 import logging
+from prometheus_client import Counter
+from .redis_clients import redis_pools
+from . import mail_queue
+from .email_templates import email_templates
+from .models import EmailVerificationToken
 
 logger = logging.getLogger(__name__)
 
-class EmailRateLimiter:
+# Validade do link de verificação de email
+VERIFICATION_TOKEN_HOURS = 24
+
+RateLimitResult = namedtuple('RateLimitResult', ['allowed', 'remaining', 'retry_after'])
+
+# Janela deslizante: um sorted set por identificador com o timestamp (ms) de
+# cada envio. Limpa, conta e registra atomicamente, usando o relógio do Redis.
+# KEYS[1] = chave; ARGV = janela (ms), limite, membro único, registrar, quantidade.
+# Registrar: 0 só consulta, 1 registra se permitido, 2 registra `quantidade`
+# envios incondicionalmente (sincronização do nível local, já permitidos)
+SLIDING_WINDOW_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local window = tonumber(ARGV[1])
+local limit = tonumber(ARGV[2])
+
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - window)
+local count = redis.call('ZCARD', KEYS[1])
+
+if ARGV[4] == '2' then
+    for i = 1, tonumber(ARGV[5]) do
+        redis.call('ZADD', KEYS[1], now, ARGV[3] .. ':' .. i)
+    end
+    redis.call('PEXPIRE', KEYS[1], window)
+    count = count + tonumber(ARGV[5])
+elseif count < limit and ARGV[4] == '1' then
+    redis.call('ZADD', KEYS[1], now, ARGV[3])
+    redis.call('PEXPIRE', KEYS[1], window)
+    return {1, limit - count - 1, 0}
+end
+
+if count < limit then
+    return {1, limit - count, 0}
+end
+
+-- Libera quando sair da janela o envio que deixa a contagem abaixo do limite
+local oldest = redis.call('ZRANGE', KEYS[1], count - limit, count - limit, 'WITHSCORES')
+local retry_after = 0
+if oldest[2] then
+    retry_after = tonumber(oldest[2]) + window - now
+end
+return {0, 0, retry_after}
+"""
+
+# Token bucket: hash com os tokens disponíveis e o instante da última recarga.
+# KEYS[1] = chave; ARGV = capacidade, recarga (tokens/ms), custo, registrar.
+# Registrar como no script acima; com 2 o custo é descontado incondicionalmente
+TOKEN_BUCKET_SCRIPT = """
+local now_parts = redis.call('TIME')
+local now = tonumber(now_parts[1]) * 1000 + math.floor(tonumber(now_parts[2]) / 1000)
+local capacity = tonumber(ARGV[1])
+local rate = tonumber(ARGV[2])
+local cost = tonumber(ARGV[3])
+
+local state = redis.call('HMGET', KEYS[1], 'tokens', 'ts')
+local tokens = tonumber(state[1])
+local ts = tonumber(state[2])
+if tokens == nil or ts == nil then
+    tokens = capacity
+    ts = now
+end
+tokens = math.min(capacity, tokens + math.max(0, now - ts) * rate)
+
+if ARGV[4] == '2' then
+    tokens = math.max(0, tokens - cost)
+    redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+    redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+    cost = 1
+end
+
+local allowed = 0
+local retry_after = 0
+if tokens >= cost then
+    allowed = 1
+    if ARGV[4] == '1' then
+        tokens = tokens - cost
+        redis.call('HSET', KEYS[1], 'tokens', tostring(tokens), 'ts', now)
+        redis.call('PEXPIRE', KEYS[1], math.ceil(capacity / rate))
+    end
+else
+    retry_after = math.ceil((cost - tokens) / rate)
+end
+return {allowed, math.floor(tokens), retry_after}
+"""
+
+RATE_LIMIT_DECISIONS = Counter(
+    'email_rate_limit_decisions_total',
+    'Decisões do rate limiting de emails por nível',
+    ['tier', 'result']
+)
+
+
+class _KeyState:
+    __slots__ = ('hits', 'synced', 'limit', 'window', 'remote_count', 'remote_at', 'blocked_until')
+
+    def __init__(self, limit, window):
+        # Envios permitidos por este processo dentro da janela (instantes monotônicos)
+        self.hits = deque()
+        # Quantos dos `hits` (os mais antigos) já foram registrados no Redis
+        self.synced = 0
+        self.limit = limit
+        self.window = window
+        # Contagem global vista no Redis na última ida até lá
+        self.remote_count = 0
+        self.remote_at = None
+        self.blocked_until = 0.0
+
+
+class LocalRateTier:
+    """
+    Nível local do rate limiting, compartilhado pelo processo.
+
+    Responde sem ir ao Redis os casos claros: um identificador negado pelo
+    Redis continua negado até o `retry_after` informado, e, com a contagem
+    global vista há menos de `EMAIL_RATE_LIMIT_SYNC_INTERVAL` segundos, um
+    envio que deixa a estimativa (global + envios locais ainda não
+    sincronizados) abaixo de `EMAIL_RATE_LIMIT_LOCAL_FRACTION` do limite é
+    permitido localmente. Os envios permitidos aqui vão ao Redis em lote, no
+    máximo uma vez por intervalo. Perto do limite a decisão é sempre do Redis.
+
+    Se o Redis falha, o nível passa a decidir sozinho por
+    `EMAIL_RATE_LIMIT_REDIS_RETRY` segundos, com uma janela deslizante local
+    por processo: o limite vira aproximado (por processo), mas a request não
+    recebe o erro nem espera pelo Redis.
+    """
+
     def __init__(self):
-        self.redis_client = redis.Redis(
-            host=settings.REDIS_HOST,
-            port=settings.REDIS_PORT,
-            db=1,  # DB separado para rate limiting
-            decode_responses=True
+        self.max_keys = getattr(settings, 'EMAIL_RATE_LIMIT_LOCAL_KEYS', 10000)
+        self.sync_interval = getattr(settings, 'EMAIL_RATE_LIMIT_SYNC_INTERVAL', 1.0)
+        self.local_fraction = getattr(settings, 'EMAIL_RATE_LIMIT_LOCAL_FRACTION', 0.5)
+        self.redis_retry = getattr(settings, 'EMAIL_RATE_LIMIT_REDIS_RETRY', 5.0)
+        self._keys = OrderedDict()
+        self._lock = threading.Lock()
+        self.last_sync = time.monotonic()
+        self.redis_down_until = 0.0
+
+    def _state(self, key, limit, window):
+        state = self._keys.get(key)
+        if state is None:
+            state = self._keys[key] = _KeyState(limit, window)
+            if len(self._keys) > self.max_keys:
+                # Envios não sincronizados da chave descartada se perdem (contagem aproximada)
+                self._keys.popitem(last=False)
+        else:
+            self._keys.move_to_end(key)
+            state.limit, state.window = limit, window
+        return state
+
+    @staticmethod
+    def _prune(state, now):
+        while state.hits and state.hits[0] <= now - state.window:
+            state.hits.popleft()
+            state.synced = max(0, state.synced - 1)
+
+    def redis_available(self, now=None):
+        return (now or time.monotonic()) >= self.redis_down_until
+
+    def decide(self, key, limit, window, record):
+        """RateLimitResult decidido localmente, ou None quando é preciso consultar o Redis."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(key, limit, window)
+            self._prune(state, now)
+            
+            if state.blocked_until > now:
+                RATE_LIMIT_DECISIONS.labels(tier='local', result='deny').inc()
+                return RateLimitResult(False, 0, math.ceil(state.blocked_until - now))
+            
+            if not self.redis_available(now):
+                return self._decide_local_only(state, now, record)
+            
+            if state.remote_at is None or now - state.remote_at >= self.sync_interval:
+                return None
+            estimate = state.remote_count + len(state.hits) - state.synced
+            if record and estimate + 1 <= limit * self.local_fraction:
+                state.hits.append(now)
+                RATE_LIMIT_DECISIONS.labels(tier='local', result='allow').inc()
+                return RateLimitResult(True, limit - estimate - 1, 0)
+            if not record and estimate < limit:
+                RATE_LIMIT_DECISIONS.labels(tier='local', result='allow').inc()
+                return RateLimitResult(True, limit - estimate, 0)
+            return None
+
+    def _decide_local_only(self, state, now, record):
+        if len(state.hits) < state.limit:
+            if record:
+                state.hits.append(now)
+            RATE_LIMIT_DECISIONS.labels(tier='fallback', result='allow').inc()
+            return RateLimitResult(True, state.limit - len(state.hits), 0)
+        RATE_LIMIT_DECISIONS.labels(tier='fallback', result='deny').inc()
+        retry_after = state.hits[len(state.hits) - state.limit] + state.window - now
+        return RateLimitResult(False, 0, math.ceil(retry_after))
+
+    def take_pending(self, key):
+        """Marca como sincronizados os envios locais da chave; devolve quantos eram."""
+        with self._lock:
+            state = self._keys.get(key)
+            if state is None:
+                return 0
+            pending = len(state.hits) - state.synced
+            state.synced = len(state.hits)
+            return pending
+
+    def take_all_pending(self):
+        """Envios locais ainda não sincronizados, por chave: {chave: (quantidade, limite, janela)}."""
+        with self._lock:
+            self.last_sync = time.monotonic()
+            batch = {}
+            for key, state in self._keys.items():
+                pending = len(state.hits) - state.synced
+                if pending > 0:
+                    batch[key] = (pending, state.limit, state.window)
+                    state.synced = len(state.hits)
+            return batch
+
+    def restore_pending(self, pending_by_key):
+        """Desfaz `take_pending`/`take_all_pending` quando o Redis não recebeu os envios."""
+        with self._lock:
+            for key, pending in pending_by_key.items():
+                state = self._keys.get(key)
+                if state is not None:
+                    state.synced = max(0, state.synced - pending)
+
+    def sync_due(self):
+        now = time.monotonic()
+        return now - self.last_sync >= self.sync_interval and self.redis_available(now)
+
+    def record_remote(self, key, result, limit, window, recorded):
+        """Guarda a resposta do Redis para a chave (contagem global e bloqueio)."""
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(key, limit, window)
+            if recorded and result.allowed:
+                state.hits.append(now)
+                state.synced += 1
+            state.remote_count = limit - result.remaining
+            state.remote_at = now
+            state.blocked_until = now + result.retry_after if not result.allowed else 0.0
+
+    def redis_failed(self, error):
+        with self._lock:
+            if self.redis_available():
+                logger.warning(
+                    f"Redis indisponível para o rate limiting de emails; limitando só localmente "
+                    f"por {self.redis_retry:.0f}s: {str(error)}"
+                )
+            self.redis_down_until = time.monotonic() + self.redis_retry
+
+    def decide_local_only(self, key, limit, window, record):
+        now = time.monotonic()
+        with self._lock:
+            state = self._state(key, limit, window)
+            self._prune(state, now)
+            return self._decide_local_only(state, now, record)
+
+    def clear(self):
+        with self._lock:
+            self._keys.clear()
+            self.redis_down_until = 0.0
+
+
+local_rate_tier = LocalRateTier()
+
+
+class EmailRateLimiter:
+    """
+    Rate limiting de emails no Redis, com checagem e registro atômicos.
+
+    Cada verificação é um único script Lua (EVALSHA): uma ida ao Redis, sem
+    corrida entre requests concorrentes. O modo `sliding_window` conta os
+    envios dentro da janela; `token_bucket` libera `max_attempts` envios por
+    janela com recarga contínua.
+
+    Com `EMAIL_RATE_LIMIT_LOCAL` (padrão), o nível local do processo
+    (`LocalRateTier`) responde os casos claros sem ir ao Redis e assume
+    sozinho quando o Redis está fora.
+    """
+
+    MODES = ('sliding_window', 'token_bucket')
+
+    def __init__(self, mode=None, local=None):
+        self.mode = mode or getattr(settings, 'EMAIL_RATE_LIMIT_MODE', 'sliding_window')
+        if self.mode not in self.MODES:
+            raise ValueError(f"Modo de rate limiting inválido: {self.mode}")
+        if local is None:
+            local = getattr(settings, 'EMAIL_RATE_LIMIT_LOCAL', True)
+        self.local = local_rate_tier if local else None
+        # Pool compartilhado do processo (DB lógico próprio): criar o limiter não abre conexões
+        self.redis_client = redis_pools.client('rate_limit', decode_responses=True)
+        self.script = self.redis_client.register_script(
+            SLIDING_WINDOW_SCRIPT if self.mode == 'sliding_window' else TOKEN_BUCKET_SCRIPT
         )
     
-    def can_send_email(self, email_type, identifier, max_attempts=3, window_hours=1):
-        """Verifica se pode enviar email baseado no rate limiting."""
-        key = f"email_rate_limit:{email_type}:{identifier}"
-        current_attempts = self.redis_client.get(key)
+    def _key(self, email_type, identifier):
+        return f"email_rate_limit:{self.mode}:{email_type}:{identifier}"
+    
+    def _args(self, max_attempts, window_hours, record, count=1):
+        window_ms = int(window_hours * 3600 * 1000)
+        flag = {False: '0', True: '1', 'sync': '2'}[record]
+        if self.mode == 'sliding_window':
+            return [window_ms, max_attempts, uuid.uuid4().hex, flag, count]
+        return [max_attempts, max_attempts / window_ms, count, flag]
+    
+    @staticmethod
+    def _result(raw):
+        allowed, remaining, retry_after_ms = raw
+        return RateLimitResult(bool(allowed), int(remaining), -(-int(retry_after_ms) // 1000))
+    
+    def _run_pipeline(self, calls):
+        """Executa [(chave, args), ...] do script em um único pipeline; devolve as respostas cruas."""
+        def run():
+            with redis_pools.pipeline('rate_limit', decode_responses=True) as pipe:
+                for key, args in calls:
+                    pipe.evalsha(self.script.sha, 1, key, *args)
+                return pipe.execute(raise_on_error=False)
         
-        if current_attempts is None:
-            return True
+        results = run()
+        if any(isinstance(raw, redis.exceptions.NoScriptError) for raw in results):
+            # Script ainda não carregado (Redis reiniciado ou novo): nada foi executado
+            self.redis_client.script_load(self.script.script)
+            results = run()
+        
+        for raw in results:
+            if isinstance(raw, Exception):
+                raise raw
+        return results
+    
+    def _limit(self, email_type, identifier, max_attempts, window_hours, record):
+        key = self._key(email_type, identifier)
+        window = window_hours * 3600
+        if self.local is None:
+            raw = self.script(keys=[key], args=self._args(max_attempts, window_hours, record))
+            return self._result(raw)
+        
+        result = self.local.decide(key, max_attempts, window, record)
+        if result is not None:
+            self.sync()
+            return result
         
-        return int(current_attempts) < max_attempts
+        # Decisão do Redis; os envios locais pendentes da chave vão junto, no mesmo pipeline
+        pending = self.local.take_pending(key)
+        calls = [(key, self._args(max_attempts, window_hours, record))]
+        if pending:
+            calls.insert(0, (key, self._args(max_attempts, window_hours, 'sync', pending)))
+        try:
+            raw = self._run_pipeline(calls)[-1]
+        except redis.RedisError as e:
+            self.local.restore_pending({key: pending})
+            self.local.redis_failed(e)
+            return self.local.decide_local_only(key, max_attempts, window, record)
+        
+        result = self._result(raw)
+        self.local.record_remote(key, result, max_attempts, window, recorded=record)
+        RATE_LIMIT_DECISIONS.labels(tier='redis', result='allow' if result.allowed else 'deny').inc()
+        self.sync()
+        return result
+    
+    def sync(self):
+        """
+        Registra no Redis, em um pipeline, os envios permitidos localmente desde
+        a última sincronização (no máximo uma vez por EMAIL_RATE_LIMIT_SYNC_INTERVAL).
+        """
+        if self.local is None or not self.local.sync_due():
+            return 0
+        batch = self.local.take_all_pending()
+        if not batch:
+            return 0
+        
+        keys = list(batch)
+        calls = [
+            (key, self._args(limit, window / 3600, 'sync', pending))
+            for key, (pending, limit, window) in batch.items()
+        ]
+        try:
+            results = self._run_pipeline(calls)
+        except redis.RedisError as e:
+            self.local.restore_pending({key: batch[key][0] for key in keys})
+            self.local.redis_failed(e)
+            return 0
+        
+        for key, raw in zip(keys, results):
+            _, limit, window = batch[key]
+            self.local.record_remote(key, self._result(raw), limit, window, recorded=False)
+        return len(keys)
     
-    def record_email_attempt(self, email_type, identifier, window_hours=1):
+    def hit(self, email_type, identifier, max_attempts=3, window_hours=1):
+        """Verifica e, se permitido, registra um envio (no Redis ou no nível local)."""
+        return self._limit(email_type, identifier, max_attempts, window_hours, record=True)
+    
+    def check(self, email_type, identifier, max_attempts=3, window_hours=1):
+        """Verifica o limite sem registrar um envio."""
+        return self._limit(email_type, identifier, max_attempts, window_hours, record=False)
+    
+    def hit_many(self, email_type, identifiers, max_attempts=3, window_hours=1):
+        """
+        Versão em lote de `hit` para envios em massa: todos os identificadores
+        vão em um único pipeline. Retorna {identificador: RateLimitResult}.
+        """
+        identifiers = list(identifiers)
+        if not identifiers:
+            return {}
+        
+        keys = [self._key(email_type, identifier) for identifier in identifiers]
+        window = window_hours * 3600
+        if self.local is not None and not self.local.redis_available():
+            return {
+                identifier: self.local.decide_local_only(key, max_attempts, window, record=True)
+                for identifier, key in zip(identifiers, keys)
+            }
+        
+        try:
+            results = self._run_pipeline([
+                (key, self._args(max_attempts, window_hours, record=True)) for key in keys
+            ])
+        except redis.RedisError as e:
+            if self.local is None:
+                raise
+            self.local.redis_failed(e)
+            return self.hit_many(email_type, identifiers, max_attempts, window_hours)
+        
+        limits = {}
+        for identifier, key, raw in zip(identifiers, keys, results):
+            limits[identifier] = self._result(raw)
+            if self.local is not None:
+                self.local.record_remote(key, limits[identifier], max_attempts, window, recorded=True)
+            RATE_LIMIT_DECISIONS.labels(
+                tier='redis', result='allow' if limits[identifier].allowed else 'deny'
+            ).inc()
+        return limits
+    
+    def can_send_email(self, email_type, identifier, max_attempts=3, window_hours=1):
+        """Verifica se pode enviar email baseado no rate limiting."""
+        return self.check(email_type, identifier, max_attempts, window_hours).allowed
+    
+    def record_email_attempt(self, email_type, identifier, max_attempts=3, window_hours=1):
         """Registra uma tentativa de envio de email."""
-        key = f"email_rate_limit:{email_type}:{identifier}"
-        self.redis_client.incr(key)
-        self.redis_client.expire(key, window_hours * 3600)
+        return self.hit(email_type, identifier, max_attempts, window_hours)
     
-    def get_remaining_time(self, email_type, identifier):
+    def get_remaining_time(self, email_type, identifier, max_attempts=3, window_hours=1):
         """Retorna o tempo restante para poder enviar novo email."""
-        key = f"email_rate_limit:{email_type}:{identifier}"
-        ttl = self.redis_client.ttl(key)
-        return max(0, ttl)
+        return self.check(email_type, identifier, max_attempts, window_hours).retry_after
 
 
 class EmailService:
+    """
+    Emails transacionais. O envio não acontece na request: as mensagens são
+    gravadas no outbox (core.mail_queue), na transação de quem as origina, e
+    drenadas em lotes pelo Celery.
+    """
+    
     def __init__(self):
         self.rate_limiter = EmailRateLimiter()
     
-    def send_verification_email(self, user, verification_token):
+    @staticmethod
+    def verification_context(user, verification_token):
+        return {
+            'user': user,
+            'verification_url': f"{settings.FRONTEND_URL}/verify-email/{verification_token}",
+            'expires_in': VERIFICATION_TOKEN_HOURS
+        }
+    
+    def render_verification(self, user, verification_token, locale=None):
+        return email_templates.render('verification', self.verification_context(user, verification_token), locale)
+    
+    def send_verification_email(self, user, verification_token, locale=None):
         """Envia email de verificação com rate limiting."""
-        if not self.rate_limiter.can_send_email('verification', user.email):
-            remaining_time = self.rate_limiter.get_remaining_time('verification', user.email)
-            raise Exception(f"Muitas tentativas. Tente novamente em {remaining_time} segundos.")
-        
-        verification_url = f"{settings.FRONTEND_URL}/verify-email/{verification_token}"
+        # Checa e registra a tentativa de uma vez: envios concorrentes não furam o limite
+        limit = self.rate_limiter.hit('verification', user.email)
+        if not limit.allowed:
+            raise Exception(f"Muitas tentativas. Tente novamente em {limit.retry_after} segundos.")
         
         subject = "Verifique seu email - Sistema"
-        html_message = render_to_string('emails/verification.html', {
-            'user': user,
-            'verification_url': verification_url,
-            'expires_in': 24  # horas
-        })
+        html_message = self.render_verification(user, verification_token, locale)
         
         try:
-            send_mail(
-                subject=subject,
-                message="",
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False
+            message = mail_queue.enqueue(
+                subject, html_message, [user.email], kind='verification', dedup_key=f"verification:{verification_token}"
             )
             
-            self.rate_limiter.record_email_attempt('verification', user.email)
-            logger.info(f"Email de verificação enviado para {user.email}")
+            logger.info(f"Email de verificação {message.id} enfileirado para {user.email}")
             return True
             
         except Exception as e:
-            logger.error(f"Erro ao enviar email de verificação: {str(e)}")
+            logger.error(f"Erro ao enfileirar email de verificação: {str(e)}")
             raise e
     
-    def send_password_reset_email(self, user, reset_token):
+    def queue_verification_email(self, user, locale=None):
+        """
+        Cria o token de verificação de um usuário recém-criado e grava o email
+        no outbox na mesma transação. Sem rate limiting: é o primeiro envio.
+        """
+        with transaction.atomic():
+            verification = EmailVerificationToken.objects.create(
+                user=user,
+                token=secrets.token_urlsafe(32),
+                expires_at=timezone.now() + timedelta(hours=VERIFICATION_TOKEN_HOURS)
+            )
+            mail_queue.enqueue(
+                "Verifique seu email - Sistema",
+                self.render_verification(user, verification.token, locale),
+                [user.email],
+                kind='verification',
+                dedup_key=f"verification:{verification.token}"
+            )
+        return verification
+    
+    def send_password_reset_email(self, user, reset_token, locale=None):
         """Envia email de recuperação de senha com rate limiting."""
-        if not self.rate_limiter.can_send_email('password_reset', user.email):
-            remaining_time = self.rate_limiter.get_remaining_time('password_reset', user.email)
-            raise Exception(f"Muitas tentativas. Tente novamente em {remaining_time} segundos.")
+        # Checa e registra a tentativa de uma vez: envios concorrentes não furam o limite
+        limit = self.rate_limiter.hit('password_reset', user.email)
+        if not limit.allowed:
+            raise Exception(f"Muitas tentativas. Tente novamente em {limit.retry_after} segundos.")
         
         reset_url = f"{settings.FRONTEND_URL}/reset-password/{reset_token}"
         
         subject = "Recuperação de senha - Sistema"
-        html_message = render_to_string('emails/password_reset.html', {
+        html_message = email_templates.render('password_reset', {
             'user': user,
             'reset_url': reset_url,
             'expires_in': 1  # hora
-        })
+        }, locale)
         
         try:
-            send_mail(
-                subject=subject,
-                message="",
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False
+            message = mail_queue.enqueue(
+                subject, html_message, [user.email], kind='password_reset', dedup_key=f"password_reset:{reset_token}"
             )
             
-            self.rate_limiter.record_email_attempt('password_reset', user.email)
-            logger.info(f"Email de recuperação enviado para {user.email}")
+            logger.info(f"Email de recuperação {message.id} enfileirado para {user.email}")
             return True
             
         except Exception as e:
-            logger.error(f"Erro ao enviar email de recuperação: {str(e)}")
+            logger.error(f"Erro ao enfileirar email de recuperação: {str(e)}")
             raise e
     
-    def send_welcome_email(self, user):
+    def send_welcome_email(self, user, locale=None):
         """Envia email de boas-vindas após verificação."""
         subject = "Bem-vindo ao Sistema!"
-        html_message = render_to_string('emails/welcome.html', {
+        html_message = email_templates.render('welcome', {
             'user': user
-        })
+        }, locale)
         
         try:
-            send_mail(
-                subject=subject,
-                message="",
-                from_email=settings.DEFAULT_FROM_EMAIL,
-                recipient_list=[user.email],
-                html_message=html_message,
-                fail_silently=False
+            message = mail_queue.enqueue(
+                subject, html_message, [user.email], kind='welcome', dedup_key=f"welcome:{user.pk}"
             )
             
-            logger.info(f"Email de boas-vindas enviado para {user.email}")
+            logger.info(f"Email de boas-vindas {message.id} enfileirado para {user.email}")
             return True
             
         except Exception as e:
-            logger.error(f"Erro ao enviar email de boas-vindas: {str(e)}")
-            raise e
\ No newline at end of file
+            logger.error(f"Erro ao enfileirar email de boas-vindas: {str(e)}")
+            raise e
+    
+    def queue_campaign(self, template, subject, users, kind, locale=None, common=None,
+                       context_for=None, dedup_key=None):
+        """
+        Envio em massa de um template para muitos usuários (campanhas).
+        
+        `users` é consumido em blocos (use `queryset.iterator()` para milhares
+        de usuários): cada bloco é renderizado com o template compilado em
+        cache (`render_many`) e gravado no outbox de uma vez, então memória e
+        CPU por mensagem ficam constantes. `context_for(user)` acrescenta
+        variáveis por usuário; com `dedup_key`, repetir a campanha não reenvia
+        para quem já a recebeu. Retorna quantas mensagens foram gravadas.
+        """
+        def messages(chunk):
+            contexts = (dict(context_for(user) if context_for else {}, user=user) for user in chunk)
+            bodies = email_templates.render_many(template, contexts, locale, common)
+            for user, html_message in zip(chunk, bodies):
+                yield {
+                    'kind': kind,
+                    'subject': subject,
+                    'html_message': html_message,
+                    'recipients': [user.email],
+                    'dedup_key': f"{kind}:{dedup_key}:{user.pk}" if dedup_key else None,
+                }
+        
+        users = iter(users)
+        total = 0
+        while True:
+            chunk = list(islice(users, settings.EMAIL_BATCH_SIZE))
+            if not chunk:
+                break
+            total += mail_queue.enqueue_many(messages(chunk))
+        logger.info(f"Campanha {kind}: {total} emails enfileirados")
+        return total
+    
+    def queue_reverification(self, users, locale=None):
+        """
+        Reverificação em massa: um token novo e um email por usuário, em blocos.
+        Cada bloco (tokens + outbox) é gravado em uma transação; endereços que
+        estouraram o rate limit de verificação são pulados. Retorna quantos
+        emails foram enfileirados.
+        """
+        users = iter(users)
+        total = 0
+        while True:
+            chunk = list(islice(users, settings.EMAIL_BATCH_SIZE))
+            if not chunk:
+                break
+            limits = self.rate_limiter.hit_many('verification', [user.email for user in chunk])
+            chunk = [user for user in chunk if limits[user.email].allowed]
+            if not chunk:
+                continue
+            
+            expires_at = timezone.now() + timedelta(hours=VERIFICATION_TOKEN_HOURS)
+            tokens = [
+                EmailVerificationToken(user=user, token=secrets.token_urlsafe(32), expires_at=expires_at)
+                for user in chunk
+            ]
+            bodies = email_templates.render_many(
+                'verification',
+                (self.verification_context(token.user, token.token) for token in tokens),
+                locale
+            )
+            with transaction.atomic():
+                EmailVerificationToken.objects.bulk_create(tokens)
+                total += mail_queue.enqueue_many(
+                    {
+                        'kind': 'verification',
+                        'subject': "Verifique seu email - Sistema",
+                        'html_message': html_message,
+                        'recipients': [token.user.email],
+                        'dedup_key': f"verification:{token.token}",
+                    }
+                    for token, html_message in zip(tokens, bodies)
+                )
+        logger.info(f"Reverificação: {total} emails enfileirados")
+        return total
@@ -0,0 +1,112 @@
+import logging
+import threading
+from django.conf import settings
+from django.template import Context, engines
+from django.template.exceptions import TemplateDoesNotExist
+from django.utils import translation
+from django.utils.autoreload import file_changed
+
+logger = logging.getLogger(__name__)
+
+# Templates dos emails transacionais; `emails/<locale>/<nome>.html` sobrepõe o padrão
+EMAIL_TEMPLATES = ('verification', 'password_reset', 'welcome')
+
+
+def _candidates(name, locale):
+    """Caminhos procurados para um locale: 'pt-br' tenta pt-br, depois pt, depois o padrão."""
+    paths = []
+    if locale:
+        locale = locale.lower()
+        paths.append(f"emails/{locale}/{name}.html")
+        language = locale.split('-')[0]
+        if language != locale:
+            paths.append(f"emails/{language}/{name}.html")
+    paths.append(f"emails/{name}.html")
+    return paths
+
+
+class EmailTemplateCache:
+    """
+    Templates de email compilados uma vez por processo, por (nome, locale).
+
+    `render_to_string` refaz a busca nos loaders e monta um contexto novo a
+    cada mensagem; aqui a busca acontece só na primeira vez e a renderização
+    usa o Template já compilado. `render_many` reaproveita também o contexto
+    para renderizar milhares de mensagens personalizadas de um mesmo template.
+    """
+
+    def __init__(self):
+        self._templates = {}
+        self._lock = threading.Lock()
+
+    def get(self, name, locale=None):
+        locale = (locale or translation.get_language() or settings.LANGUAGE_CODE).lower()
+        key = (name, locale)
+        template = self._templates.get(key)
+        if template is not None:
+            return template
+
+        with self._lock:
+            template = self._templates.get(key)
+            if template is None:
+                engine = engines['django'].engine
+                for path in _candidates(name, locale):
+                    try:
+                        template = engine.get_template(path)
+                        break
+                    except TemplateDoesNotExist:
+                        continue
+                else:
+                    raise TemplateDoesNotExist(', '.join(_candidates(name, locale)))
+                self._templates[key] = template
+        return template
+
+    def warm(self, locales=None):
+        """Compila os templates de email antes do primeiro envio (p.ex. ao iniciar o worker)."""
+        for locale in locales or [settings.LANGUAGE_CODE]:
+            for name in EMAIL_TEMPLATES:
+                self.get(name, locale)
+
+    def clear(self):
+        with self._lock:
+            self._templates.clear()
+
+    def render(self, name, context, locale=None):
+        """Renderiza uma mensagem; equivale a render_to_string('emails/<nome>.html', context)."""
+        template = self.get(name, locale)
+        with translation.override(locale or translation.get_language()):
+            return template.render(Context(context, autoescape=True))
+
+    def render_many(self, name, contexts, locale=None, common=None):
+        """
+        Renderiza uma mensagem por contexto de `contexts` (iterável, consumido
+        sob demanda) com um único template compilado e um único Context: cada
+        mensagem só empilha as próprias variáveis sobre `common`. Devolve um
+        gerador, então milhares de mensagens seguem para o outbox sem ficar em
+        memória; o idioma e as variáveis valem só durante cada renderização,
+        nunca entre um item e outro, de modo que quem consome o gerador (p.ex.
+        junto com outro iterável em um `zip`) não herda o locale da mensagem.
+        """
+        template = self.get(name, locale)
+        # Resolvido agora, e não na primeira iteração do gerador
+        language = locale or translation.get_language()
+        return self._render_each(template, Context(common or {}, autoescape=True), contexts, language)
+
+    @staticmethod
+    def _render_each(template, context, contexts, language):
+        for values in contexts:
+            with translation.override(language), context.push(values):
+                body = template.render(context)
+            yield body
+
+
+email_templates = EmailTemplateCache()
+
+
+def _template_changed(sender, file_path, **kwargs):
+    # Em desenvolvimento o autoreload não reinicia o processo ao mudar um template
+    if file_path.suffix == '.html':
+        email_templates.clear()
+
+
+file_changed.connect(_template_changed, dispatch_uid='core.email_templates.template_changed')
@@ -0,0 +1,197 @@
+import time
+import uuid
+import socket
+import threading
+import logging
+import redis
+from django.conf import settings
+from django.contrib.auth import hashers
+from prometheus_client import Counter, Histogram
+from .redis_clients import redis_pools
+from .instrumentation import record_password_hash
+
+logger = logging.getLogger(__name__)
+
+PASSWORD_HASH_QUEUE_WAIT = Histogram(
+    'auth_password_hash_queue_wait_seconds',
+    'Tempo de espera por uma vaga de hashing de senha',
+    buckets=(0.001, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+PASSWORD_HASH_DURATION = Histogram(
+    'auth_password_hash_seconds',
+    'Tempo de cálculo do hash de senha',
+    ['operation'],
+    buckets=(0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+)
+PASSWORD_HASH_REJECTED = Counter(
+    'auth_password_hash_rejected_total',
+    'Operações de hashing recusadas por falta de capacidade',
+    ['reason']
+)
+
+# Semáforo com expiração: KEYS[1] é um sorted set de portadores (score = início, ms).
+# ARGV: agora (ms), ttl (ms), limite, id do portador. Retorna 1 se a vaga foi obtida
+SEMAPHORE_ACQUIRE_SCRIPT = """
+local now = tonumber(ARGV[1])
+local ttl = tonumber(ARGV[2])
+redis.call('ZREMRANGEBYSCORE', KEYS[1], '-inf', now - ttl)
+if redis.call('ZCARD', KEYS[1]) < tonumber(ARGV[3]) then
+    redis.call('ZADD', KEYS[1], now, ARGV[4])
+    redis.call('PEXPIRE', KEYS[1], ttl)
+    return 1
+end
+return 0
+"""
+
+
+class PasswordHashBusy(Exception):
+    """Não há capacidade de hashing no host; a request deve ser recusada (503)."""
+
+
+class PasswordHashLimiter:
+    """
+    Limite de hashes de senha simultâneos por host, compartilhado por todos
+    os processos (workers do gunicorn) via Redis.
+
+    No máximo `max_workers` hashes rodam ao mesmo tempo no host e
+    `max_queue` aguardam por uma vaga; acima disso a operação é recusada na
+    hora. Quem espera mais que `queue_timeout` também é recusado, já que o
+    cliente provavelmente desistiu. O hash roda na própria thread da request
+    (PBKDF2 libera o GIL), o que pressupõe workers com threads (gthread).
+
+    As vagas são sorted sets com expiração (`slot_ttl`): um processo que
+    morre segurando uma vaga não a prende para sempre. Sem Redis, o limite
+    cai para semáforos do processo até `redis_retry` segundos depois.
+    """
+
+    key_prefix = 'password_hash:'
+
+    def __init__(self, max_workers=2, max_queue=8, queue_timeout=2.0, shared=True,
+                 slot_ttl=30.0, wait_interval=0.01, redis_retry=5.0):
+        self.max_workers = max_workers
+        self.max_queue = max_queue
+        self.queue_timeout = queue_timeout
+        self.shared = shared
+        self.slot_ttl_ms = int(slot_ttl * 1000)
+        self.wait_interval = wait_interval
+        self.redis_retry = redis_retry
+        self.redis_down_until = 0.0
+        host = socket.gethostname()
+        self._admitted_key = f"{self.key_prefix}{host}:admitted"
+        self._running_key = f"{self.key_prefix}{host}:running"
+        self._admitted = threading.BoundedSemaphore(max_workers + max_queue)
+        self._running = threading.BoundedSemaphore(max_workers)
+        self._script = None
+
+    def _redis_available(self):
+        return self.shared and time.monotonic() >= self.redis_down_until
+
+    def _take(self, key, limit, holder):
+        if self._script is None:
+            self._script = redis_pools.client('rate_limit').register_script(SEMAPHORE_ACQUIRE_SCRIPT)
+        now_ms = int(time.time() * 1000)
+        return bool(self._script(keys=[key], args=[now_ms, self.slot_ttl_ms, limit, holder]))
+
+    def _give(self, key, holder):
+        try:
+            redis_pools.client('rate_limit').zrem(key, holder)
+        except redis.RedisError as e:
+            # A vaga expira sozinha após slot_ttl
+            logger.warning(f"Falha ao liberar vaga de hashing no Redis: {str(e)}")
+
+    def _acquire_remote(self):
+        holder = uuid.uuid4().hex
+        if not self._take(self._admitted_key, self.max_workers + self.max_queue, holder):
+            PASSWORD_HASH_REJECTED.labels(reason='queue_full').inc()
+            raise PasswordHashBusy('Password hash queue is full')
+        try:
+            deadline = time.monotonic() + self.queue_timeout
+            while not self._take(self._running_key, self.max_workers, holder):
+                if time.monotonic() >= deadline:
+                    PASSWORD_HASH_REJECTED.labels(reason='queue_timeout').inc()
+                    raise PasswordHashBusy('Password hash queue wait exceeded')
+                time.sleep(self.wait_interval)
+        except BaseException:
+            self._give(self._admitted_key, holder)
+            raise
+
+        def release():
+            self._give(self._running_key, holder)
+            self._give(self._admitted_key, holder)
+        return release
+
+    def _acquire_local(self):
+        if not self._admitted.acquire(blocking=False):
+            PASSWORD_HASH_REJECTED.labels(reason='queue_full').inc()
+            raise PasswordHashBusy('Password hash queue is full')
+        if not self._running.acquire(timeout=self.queue_timeout):
+            self._admitted.release()
+            PASSWORD_HASH_REJECTED.labels(reason='queue_timeout').inc()
+            raise PasswordHashBusy('Password hash queue wait exceeded')
+
+        def release():
+            self._running.release()
+            self._admitted.release()
+        return release
+
+    def _acquire(self):
+        """Obtém uma vaga (no Redis ou, sem ele, no processo); retorna a função que a libera."""
+        if self._redis_available():
+            try:
+                return self._acquire_remote()
+            except redis.RedisError as e:
+                logger.warning(
+                    f"Redis indisponível para o limite de hashing; limitando por processo "
+                    f"por {self.redis_retry:.0f}s: {str(e)}"
+                )
+                self.redis_down_until = time.monotonic() + self.redis_retry
+        return self._acquire_local()
+
+    def run(self, operation, func, *args):
+        """Executa `func(*args)` ao obter uma vaga de hashing; levanta PasswordHashBusy sem vaga."""
+        submitted = time.perf_counter()
+        release = self._acquire()
+        try:
+            started = time.perf_counter()
+            PASSWORD_HASH_QUEUE_WAIT.observe(started - submitted)
+            try:
+                return func(*args)
+            finally:
+                duration = time.perf_counter() - started
+                PASSWORD_HASH_DURATION.labels(operation=operation).observe(duration)
+                record_password_hash(duration)
+        finally:
+            release()
+
+    def check_password(self, user, password):
+        """
+        Verifica a senha sob o limite. Sem usuário, calcula um hash descartável
+        para que emails inexistentes custem o mesmo tempo.
+        """
+        if user is None:
+            self.run('dummy', hashers.make_password, password)
+            return False
+
+        needs_update = []
+        valid = self.run('check', hashers.check_password, password, user.password, needs_update.append)
+        if valid and needs_update:
+            # Hasher ou número de iterações desatualizado: regrava o hash. A senha
+            # já foi verificada, então sem vaga a regravação fica para o próximo login
+            try:
+                user.password = self.make_password(password)
+            except PasswordHashBusy:
+                logger.info(f"Regravação do hash do usuário {user.pk} adiada: sem capacidade de hashing")
+            else:
+                user.save(update_fields=['password'])
+        return valid
+
+    def make_password(self, password):
+        return self.run('make', hashers.make_password, password)
+
+
+password_hash_limiter = PasswordHashLimiter(
+    max_workers=getattr(settings, 'PASSWORD_HASH_WORKERS', 2),
+    max_queue=getattr(settings, 'PASSWORD_HASH_QUEUE_DEPTH', 8),
+    queue_timeout=getattr(settings, 'PASSWORD_HASH_QUEUE_TIMEOUT', 2.0),
+    shared=getattr(settings, 'PASSWORD_HASH_SHARED_LIMIT', True)
+)
@@ -0,0 +1,243 @@
+import os
+import hmac
+import time
+import uuid
+import random
+import cProfile
+import logging
+import threading
+import contextvars
+from contextlib import contextmanager
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.db.backends.signals import connection_created
+from prometheus_client import Histogram
+
+logger = logging.getLogger(__name__)
+
+# Rótulo `view` vem do nome da rota resolvida (conjunto fechado); requests sem
+# rota caem em um único valor para não explodir a cardinalidade
+UNRESOLVED_VIEW = '<unresolved>'
+
+# cProfile admite um profiler ativo por vez: requests concorrentes não são perfiladas
+_profiling = threading.Lock()
+
+# Caches instrumentados (rótulo `cache`)
+CACHE_NAMES = ('jwt_payload', 'jwt_generation', 'user_record')
+
+COUNT_BUCKETS = (0, 1, 2, 3, 5, 8, 13, 21, 34, 55, 100)
+SECONDS_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5)
+
+VIEW_SQL_QUERIES = Histogram(
+    'django_view_sql_queries',
+    'Queries SQL executadas por request',
+    ['view'],
+    buckets=COUNT_BUCKETS
+)
+VIEW_SQL_SECONDS = Histogram(
+    'django_view_sql_seconds',
+    'Tempo total em queries SQL por request',
+    ['view'],
+    buckets=SECONDS_BUCKETS
+)
+VIEW_CACHE_HITS = Histogram(
+    'django_view_cache_hits',
+    'Hits de cache por request',
+    ['view', 'cache'],
+    buckets=COUNT_BUCKETS
+)
+VIEW_CACHE_MISSES = Histogram(
+    'django_view_cache_misses',
+    'Misses de cache por request',
+    ['view', 'cache'],
+    buckets=COUNT_BUCKETS
+)
+VIEW_JWT_SECONDS = Histogram(
+    'django_view_jwt_seconds',
+    'Tempo de decodificação e verificação do JWT por request',
+    ['view'],
+    buckets=SECONDS_BUCKETS
+)
+VIEW_PASSWORD_HASH_SECONDS = Histogram(
+    'django_view_password_hash_seconds',
+    'Tempo de hashing de senha por request',
+    ['view'],
+    buckets=SECONDS_BUCKETS
+)
+
+
+class RequestStats:
+    """Contadores do caminho quente acumulados durante uma request."""
+
+    __slots__ = ('sql_queries', 'sql_seconds', 'jwt_seconds', 'password_hash_seconds', 'cache_hits', 'cache_misses')
+
+    def __init__(self):
+        self.sql_queries = 0
+        self.sql_seconds = 0.0
+        self.jwt_seconds = 0.0
+        self.password_hash_seconds = 0.0
+        self.cache_hits = dict.fromkeys(CACHE_NAMES, 0)
+        self.cache_misses = dict.fromkeys(CACHE_NAMES, 0)
+
+
+# A variável de contexto acompanha a request inclusive nas threads do
+# sync_to_async (asgiref copia o contexto), então views síncronas sob ASGI
+# também são contabilizadas
+_current = contextvars.ContextVar('request_stats', default=None)
+
+
+def record_cache(name, hit):
+    """Registra um hit ou miss de cache na request atual, se houver."""
+    stats = _current.get()
+    if stats is not None:
+        if hit:
+            stats.cache_hits[name] += 1
+        else:
+            stats.cache_misses[name] += 1
+
+
+def record_password_hash(seconds):
+    stats = _current.get()
+    if stats is not None:
+        stats.password_hash_seconds += seconds
+
+
+@contextmanager
+def jwt_timer():
+    """Mede o tempo de decodificação/verificação do JWT na request atual."""
+    stats = _current.get()
+    if stats is None:
+        yield
+        return
+    started = time.perf_counter()
+    try:
+        yield
+    finally:
+        stats.jwt_seconds += time.perf_counter() - started
+
+
+def _count_query(execute, sql, params, many, context):
+    stats = _current.get()
+    if stats is None:
+        return execute(sql, params, many, context)
+    started = time.perf_counter()
+    try:
+        return execute(sql, params, many, context)
+    finally:
+        stats.sql_queries += 1
+        stats.sql_seconds += time.perf_counter() - started
+
+
+def _install_query_counter(sender, connection, **kwargs):
+    if _count_query not in connection.execute_wrappers:
+        connection.execute_wrappers.append(_count_query)
+
+
+def install_query_counter():
+    """Instala o contador de queries em todas as conexões, atuais e futuras."""
+    for connection in connections.all(initialized_only=True):
+        _install_query_counter(None, connection)
+    connection_created.connect(_install_query_counter, dispatch_uid='core.instrumentation.query_counter')
+
+
+def view_label(request):
+    match = getattr(request, 'resolver_match', None)
+    if match is None:
+        return UNRESOLVED_VIEW
+    return match.view_name or match.route or UNRESOLVED_VIEW
+
+
+def observe(view, stats):
+    VIEW_SQL_QUERIES.labels(view=view).observe(stats.sql_queries)
+    VIEW_SQL_SECONDS.labels(view=view).observe(stats.sql_seconds)
+    VIEW_JWT_SECONDS.labels(view=view).observe(stats.jwt_seconds)
+    if stats.password_hash_seconds:
+        VIEW_PASSWORD_HASH_SECONDS.labels(view=view).observe(stats.password_hash_seconds)
+    for name in CACHE_NAMES:
+        hits, misses = stats.cache_hits[name], stats.cache_misses[name]
+        if hits or misses:
+            VIEW_CACHE_HITS.labels(view=view, cache=name).observe(hits)
+            VIEW_CACHE_MISSES.labels(view=view, cache=name).observe(misses)
+
+
+class RequestInstrumentationMiddleware:
+    """
+    Métricas por view do caminho quente (SQL, caches, JWT, hashing de senha).
+
+    Opcionalmente grava um cProfile da request em `REQUEST_PROFILE_DIR`: por
+    amostragem (`REQUEST_PROFILE_SAMPLE_RATE`) ou quando o cabeçalho
+    `X-Profile-Request` traz o `REQUEST_PROFILE_TOKEN`. Sob ASGI o profile
+    cobre apenas a thread do event loop (e as demais corrotinas dela).
+    """
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sample_rate = getattr(settings, 'REQUEST_PROFILE_SAMPLE_RATE', 0.0)
+        self.profile_token = getattr(settings, 'REQUEST_PROFILE_TOKEN', '')
+        self.profile_dir = getattr(settings, 'REQUEST_PROFILE_DIR', None)
+        install_query_counter()
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def start_profile(self, request):
+        """Retorna um profiler se esta request deve ser perfilada."""
+        if not self.profile_dir:
+            return None
+        header = request.META.get('HTTP_X_PROFILE_REQUEST')
+        requested = bool(header and self.profile_token and hmac.compare_digest(header, self.profile_token))
+        sampled = self.sample_rate > 0 and random.random() < self.sample_rate
+        if not (requested or sampled) or not _profiling.acquire(blocking=False):
+            return None
+        return cProfile.Profile()
+
+    def save_profile(self, profiler, request):
+        view = view_label(request).replace(':', '-').replace('/', '_').strip('<>')
+        name = f"{time.strftime('%Y%m%d-%H%M%S')}-{view}-{uuid.uuid4().hex[:8]}.prof"
+        try:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            profiler.dump_stats(os.path.join(self.profile_dir, name))
+        except OSError as e:
+            logger.warning(f"Não foi possível gravar o profile da request: {str(e)}")
+        finally:
+            _profiling.release()
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiler = self.start_profile(request)
+        try:
+            if profiler is None:
+                response = self.get_response(request)
+            else:
+                response = profiler.runcall(self.get_response, request)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                self.save_profile(profiler, request)
+
+        observe(view_label(request), stats)
+        return response
+
+    async def __acall__(self, request):
+        stats = RequestStats()
+        token = _current.set(stats)
+        profiler = self.start_profile(request)
+        try:
+            if profiler is not None:
+                profiler.enable()
+            response = await self.get_response(request)
+        finally:
+            _current.reset(token)
+            if profiler is not None:
+                profiler.disable()
+                self.save_profile(profiler, request)
+
+        observe(view_label(request), stats)
+        return response
@@ -0,0 +1,125 @@
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+from django.conf import settings
+from cryptography.hazmat.primitives import serialization
+from jwt.algorithms import RSAAlgorithm
+
+from key_manager import KeyManager, KeysUnavailable
+
+logger = logging.getLogger(__name__)
+
+
+def jwk_thumbprint(jwk):
+    """Calcula o thumbprint RFC 7638 de uma JWK RSA, usado como `kid`."""
+    canonical = json.dumps(
+        {'e': jwk['e'], 'kty': jwk['kty'], 'n': jwk['n']},
+        separators=(',', ':'),
+        sort_keys=True
+    )
+    digest = hashlib.sha256(canonical.encode()).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b'=').decode()
+
+
+class JWTKeyRing:
+    """
+    Chaves de assinatura dos JWTs indexadas por `kid`.
+
+    A chave privada atual e as públicas aposentadas do `KeyManager` são
+    lidas e parseadas uma vez por processo, somente leitura: gerar, rotacionar
+    e podar chaves é feito sob lock por `manage.py check_keys` e pela task
+    `check_key_rotation`. Sem chaves válidas a primeira assinatura falha com
+    `KeysUnavailable`. As chaves são relidas a cada `reload_interval`
+    segundos, de modo que após uma rotação todos os workers passam a assinar
+    com a mesma chave nova; um `kid` desconhecido antecipa a releitura.
+    """
+
+    def __init__(self, keys_dir=None, algorithm='RS256', reload_interval=60, miss_reload_interval=5):
+        self.keys_dir = keys_dir
+        self.algorithm = algorithm
+        self.reload_interval = reload_interval
+        self.miss_reload_interval = miss_reload_interval
+        self._lock = threading.Lock()
+        self._loaded_at = 0
+        self._signing = None
+        self._public_keys = {}
+        self._jwks = None
+
+    def _load(self):
+        manager = KeyManager(self.keys_dir)
+        signing_pem = manager.load_keys()['signing_key']
+        private_key = serialization.load_pem_private_key(signing_pem, password=None)
+
+        public_keys = {}
+        jwks = []
+        candidates = [private_key.public_key()] + [
+            serialization.load_pem_public_key(pem)
+            for pem in manager.get_retired_public_keys()
+        ]
+        for public_key in candidates:
+            jwk = RSAAlgorithm.to_jwk(public_key, as_dict=True)
+            kid = jwk_thumbprint(jwk)
+            jwk.update({'kid': kid, 'use': 'sig', 'alg': self.algorithm})
+            public_keys[kid] = public_key
+            jwks.append(jwk)
+
+        body = json.dumps({'keys': jwks}, separators=(',', ':'), sort_keys=True)
+        etag = '"%s"' % hashlib.sha256(body.encode()).hexdigest()[:32]
+
+        # Publica as chaves novas antes de passar a assinar com elas
+        self._public_keys = public_keys
+        self._jwks = (body, etag)
+        self._signing = (jwks[0]['kid'], private_key)
+        self._loaded_at = time.monotonic()
+
+    def _ensure_loaded(self):
+        if self._signing is None:
+            with self._lock:
+                if self._signing is None:
+                    self._load()
+        elif time.monotonic() - self._loaded_at >= self.reload_interval:
+            self._reload()
+
+    def _reload(self):
+        # Só uma thread relê; as demais seguem com as chaves atuais
+        if not self._lock.acquire(blocking=False):
+            return
+        try:
+            self._load()
+        except (KeysUnavailable, OSError, ValueError) as e:
+            # Arquivos em meio a uma rotação: mantém as chaves em uso e tenta de novo depois
+            logger.warning(f"Falha ao recarregar as chaves JWT: {str(e)}")
+            self._loaded_at = time.monotonic()
+        finally:
+            self._lock.release()
+
+    def signing_key(self):
+        """Retorna `(kid, chave_privada)` para assinar novos tokens."""
+        self._ensure_loaded()
+        return self._signing
+
+    def verification_key(self, kid):
+        """Retorna a chave pública do `kid`, ou None se ele não pertence ao ring."""
+        self._ensure_loaded()
+        public_key = self._public_keys.get(kid)
+        if public_key is None and time.monotonic() - self._loaded_at >= self.miss_reload_interval:
+            # Rotação recente feita por outro processo; kids inventados releem no máximo
+            # uma vez por `miss_reload_interval` segundos
+            logger.info(f"kid desconhecido ({kid}), recarregando as chaves JWT")
+            self._reload()
+            public_key = self._public_keys.get(kid)
+        return public_key
+
+    def jwks(self):
+        """Retorna o documento JWKS serializado e o seu ETag."""
+        self._ensure_loaded()
+        return self._jwks
+
+
+key_ring = JWTKeyRing(
+    keys_dir=getattr(settings, 'JWT_KEYS_DIR', None),
+    algorithm=getattr(settings, 'JWT_ALGORITHM', 'RS256')
+)
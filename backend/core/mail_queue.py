@@ -0,0 +1,270 @@
+import random
+import logging
+from datetime import timedelta
+from django.conf import settings
+from django.core.cache import cache
+from django.core.mail import EmailMultiAlternatives, get_connection
+from django.db import transaction
+from django.db.models import F, Min, Count
+from django.utils import timezone
+from prometheus_client import Counter, Histogram
+from prometheus_client.core import GaugeMetricFamily
+from .models import EmailOutbox
+
+logger = logging.getLogger(__name__)
+
+# Presente enquanto há uma drenagem agendada que ainda não começou
+DRAIN_SCHEDULED_KEY = 'mail:drain_scheduled'
+
+EMAIL_DELIVERY_SECONDS = Histogram(
+    'email_outbox_delivery_seconds',
+    'Tempo entre a gravação no outbox e o envio do email',
+    ['kind'],
+    buckets=(0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 900, 3600)
+)
+EMAIL_BATCH_SECONDS = Histogram(
+    'email_outbox_batch_seconds',
+    'Tempo de envio de um lote do outbox pelo backend de email',
+    buckets=(0.01, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30)
+)
+EMAIL_MESSAGES = Counter(
+    'email_outbox_messages_total',
+    'Resultado das tentativas de envio do outbox',
+    ['kind', 'result']
+)
+
+
+def enqueue(subject, html_message, recipients, text='', from_email=None, kind='', dedup_key=None):
+    """
+    Grava a mensagem no outbox, na transação corrente se houver uma.
+
+    Com `dedup_key`, uma mensagem já gravada com a mesma chave é devolvida em
+    vez de criar outra. A drenagem é agendada só depois do commit: se a
+    transação for desfeita, nada é enviado.
+    """
+    fields = {
+        'kind': kind,
+        'subject': subject,
+        'text': text,
+        'html': html_message,
+        'from_email': from_email or settings.DEFAULT_FROM_EMAIL,
+        'recipients': list(recipients),
+    }
+    if dedup_key:
+        message, _ = EmailOutbox.objects.get_or_create(dedup_key=dedup_key, defaults=fields)
+    else:
+        message = EmailOutbox.objects.create(**fields)
+    transaction.on_commit(schedule_drain)
+    return message
+
+
+def enqueue_many(messages, chunk_size=None):
+    """
+    Grava mensagens em massa no outbox: `messages` é um iterável de dicts com
+    os campos de `enqueue` (subject, html_message, recipients, ...), consumido
+    em blocos de `EMAIL_BATCH_SIZE` com um INSERT por bloco. Fora de uma
+    transação cada bloco já fica disponível para os workers enquanto os
+    seguintes são gerados. Mensagens cuja `dedup_key` já existe são ignoradas.
+    Retorna quantas foram oferecidas.
+    """
+    chunk_size = chunk_size or settings.EMAIL_BATCH_SIZE
+    total = 0
+    chunk = []
+
+    def flush():
+        EmailOutbox.objects.bulk_create(chunk, ignore_conflicts=True)
+        transaction.on_commit(schedule_drain)
+
+    for message in messages:
+        chunk.append(EmailOutbox(
+            kind=message.get('kind', ''),
+            subject=message['subject'],
+            text=message.get('text', ''),
+            html=message['html_message'],
+            from_email=message.get('from_email') or settings.DEFAULT_FROM_EMAIL,
+            recipients=list(message['recipients']),
+            dedup_key=message.get('dedup_key')
+        ))
+        if len(chunk) >= chunk_size:
+            flush()
+            total += len(chunk)
+            chunk = []
+    if chunk:
+        flush()
+        total += len(chunk)
+    return total
+
+
+def schedule_drain():
+    """
+    Agenda uma drenagem, se nenhuma estiver pendente. O atraso
+    `EMAIL_BATCH_DELAY` deixa as mensagens de requests próximas se acumularem
+    e saírem no mesmo lote. Sem broker a mensagem continua no outbox e a
+    drenagem periódica a envia.
+    """
+    try:
+        if cache.add(DRAIN_SCHEDULED_KEY, 1, settings.EMAIL_DRAIN_SCHEDULE_TTL):
+            from .tasks import send_queued_emails
+            send_queued_emails.apply_async(countdown=settings.EMAIL_BATCH_DELAY)
+    except Exception as e:
+        logger.warning(f"Não foi possível agendar a drenagem do outbox: {str(e)}")
+
+
+def clear_drain_flag():
+    # Feito no início da drenagem: mensagens gravadas a partir daqui agendam outra
+    cache.delete(DRAIN_SCHEDULED_KEY)
+
+
+def claim_batch(size):
+    """
+    Reserva até `size` mensagens disponíveis para este worker.
+
+    SKIP LOCKED faz workers concorrentes pegarem lotes disjuntos sem esperar
+    uns pelos outros. A reserva é um lease (`EMAIL_OUTBOX_LEASE_SECONDS`): o
+    envio acontece fora da transação e, se o worker morrer, a mensagem volta
+    a ficar disponível quando o lease vence.
+    """
+    now = timezone.now()
+    with transaction.atomic():
+        ids = list(
+            EmailOutbox.objects.select_for_update(skip_locked=True)
+            .filter(status=EmailOutbox.STATUS_PENDING, available_at__lte=now)
+            .order_by('available_at')
+            .values_list('id', flat=True)[:size]
+        )
+        if not ids:
+            return []
+        EmailOutbox.objects.filter(id__in=ids).update(
+            attempts=F('attempts') + 1,
+            available_at=now + timedelta(seconds=settings.EMAIL_OUTBOX_LEASE_SECONDS)
+        )
+    return list(EmailOutbox.objects.filter(id__in=ids))
+
+
+def to_email(message, connection):
+    email = EmailMultiAlternatives(
+        subject=message.subject,
+        body=message.text,
+        from_email=message.from_email,
+        to=message.recipients,
+        connection=connection
+    )
+    if message.html:
+        email.attach_alternative(message.html, 'text/html')
+    return email
+
+
+def send_batch(messages, connection=None):
+    """
+    Envia as mensagens por uma única conexão do backend de email.
+
+    Cada mensagem vai em seu próprio `send_messages`, de modo que uma falha
+    não derruba o lote: a conexão é reaberta e o envio segue com a próxima.
+    Retorna (enviadas, [(mensagem, erro), ...]).
+    """
+    connection = connection or get_connection(fail_silently=False)
+    sent = []
+    failed = []
+    try:
+        for message in messages:
+            try:
+                # open() não faz nada se a conexão já está aberta
+                connection.open()
+                if connection.send_messages([to_email(message, connection)]):
+                    sent.append(message)
+                else:
+                    failed.append((message, 'not sent'))
+            except Exception as e:
+                failed.append((message, str(e)))
+                # A conexão pode ter ficado inutilizável; a próxima mensagem abre outra
+                try:
+                    connection.close()
+                except Exception:
+                    pass
+    finally:
+        connection.close()
+    return sent, failed
+
+
+def retry_delay(attempts):
+    """Backoff exponencial com jitter, limitado a EMAIL_RETRY_BACKOFF_MAX segundos."""
+    delay = min(settings.EMAIL_RETRY_BACKOFF * 2 ** (attempts - 1), settings.EMAIL_RETRY_BACKOFF_MAX)
+    return delay * random.uniform(0.8, 1.2)
+
+
+def mark_sent(messages):
+    if not messages:
+        return
+    now = timezone.now()
+    EmailOutbox.objects.filter(id__in=[message.id for message in messages]).update(
+        status=EmailOutbox.STATUS_SENT,
+        sent_at=now,
+        last_error='',
+        expires_at=now + timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+    )
+    for message in messages:
+        EMAIL_DELIVERY_SECONDS.labels(kind=message.kind).observe((now - message.created_at).total_seconds())
+        EMAIL_MESSAGES.labels(kind=message.kind, result='sent').inc()
+
+
+def mark_failed(message, error):
+    """Agenda nova tentativa com backoff ou desiste após EMAIL_MAX_RETRIES."""
+    now = timezone.now()
+    if message.attempts > settings.EMAIL_MAX_RETRIES:
+        logger.error(
+            f"Email {message.id} ({message.kind}) descartado após {message.attempts} tentativas: {error}"
+        )
+        EmailOutbox.objects.filter(id=message.id).update(
+            status=EmailOutbox.STATUS_FAILED,
+            last_error=error,
+            expires_at=now + timedelta(days=settings.EMAIL_OUTBOX_RETENTION_DAYS)
+        )
+        EMAIL_MESSAGES.labels(kind=message.kind, result='failed').inc()
+        return None
+
+    delay = retry_delay(message.attempts)
+    logger.warning(
+        f"Falha ao enviar email {message.id} ({message.kind}), "
+        f"tentativa {message.attempts}; nova tentativa em {delay:.0f}s: {error}"
+    )
+    EmailOutbox.objects.filter(id=message.id).update(
+        last_error=error,
+        available_at=now + timedelta(seconds=delay)
+    )
+    EMAIL_MESSAGES.labels(kind=message.kind, result='retry').inc()
+    return delay
+
+
+class OutboxCollector:
+    """
+    Estado do outbox lido do banco a cada scrape do /metrics: mensagens
+    pendentes e a idade da mais antiga (o atraso de entrega atual).
+    """
+
+    def describe(self):
+        # Nomes declarados: o REGISTRY recusa um segundo registro do coletor
+        return [self.pending_family(), self.oldest_family()]
+
+    def pending_family(self):
+        return GaugeMetricFamily('email_outbox_pending', 'Mensagens aguardando envio no outbox')
+
+    def oldest_family(self):
+        return GaugeMetricFamily(
+            'email_outbox_oldest_pending_seconds',
+            'Idade da mensagem pendente mais antiga do outbox'
+        )
+
+    def collect(self):
+        try:
+            stats = EmailOutbox.objects.filter(status=EmailOutbox.STATUS_PENDING).aggregate(
+                count=Count('id'), oldest=Min('created_at')
+            )
+        except Exception as e:
+            logger.debug(f"Métricas do outbox indisponíveis: {str(e)}")
+            return
+        pending = self.pending_family()
+        pending.add_metric([], stats['count'])
+        oldest = self.oldest_family()
+        oldest.add_metric([], (timezone.now() - stats['oldest']).total_seconds() if stats['oldest'] else 0)
+        yield pending
+        yield oldest
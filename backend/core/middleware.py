@@ -1,15 +1,35 @@
-from django.utils.deprecation import MiddlewareMixin
-from rest_framework.exceptions import AuthenticationFailed
-from .services import JWTService
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from .authentication import get_bearer_token, authenticate_request, aauthenticate_request
 
 
-class JWTAuthenticationMiddleware(MiddlewareMixin):
+class JWTAuthenticationMiddleware:
+    """Autentica o Bearer token; no ASGI roda nativamente assíncrono, sem thread hop."""
+
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        if iscoroutinefunction(self.get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        self.process_request(request)
+        return self.get_response(request)
+
+    async def __acall__(self, request):
+        token = get_bearer_token(request)
+        if token:
+            user, error = await aauthenticate_request(request, token)
+            if user and not error:
+                request.user = user
+        return await self.get_response(request)
+
     def process_request(self, request):
-        auth_header = request.META.get('HTTP_AUTHORIZATION', '')
-        if auth_header.startswith('Bearer '):
-            token = auth_header.replace('Bearer ', '')
-            user, error = JWTService.get_user_from_token(token)
+        token = get_bearer_token(request)
+        if token:
+            user, error = authenticate_request(request, token)
             if user and not error:
                 request.user = user
-            else:
-                request.auth_error = error
\ No newline at end of file
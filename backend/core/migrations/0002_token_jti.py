@@ -0,0 +1,131 @@
+"""
+Troca o JWT completo armazenado em refresh_tokens/blacklisted_tokens por um
+UUID compacto (a claim `jti`), com um único índice por tabela.
+
+A migração não é atômica: as linhas existentes são convertidas em lotes,
+cada um na sua própria transação, e no Postgres as restrições são criadas
+sem bloquear escritas (índice CONCURRENTLY e CHECK NOT VALID + VALIDATE).
+"""
+
+import hashlib
+import uuid
+
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+
+TABLES = (
+    ('refreshtoken', 'refresh_tokens'),
+    ('blacklistedtoken', 'blacklisted_tokens'),
+)
+
+
+def legacy_jti(token):
+    # Tokens emitidos antes da claim `jti` são identificados pelo digest do JWT
+    return uuid.UUID(bytes=hashlib.sha256(token.encode()).digest()[:16])
+
+
+def backfill_jti(apps, schema_editor):
+    # Percorre a chave primária em faixas: `jti` ainda não tem índice, e filtrar
+    # por `jti IS NULL` faria cada lote varrer a tabela de novo
+    for model_name, _ in TABLES:
+        model = apps.get_model('core', model_name)
+        last_pk = None
+        while True:
+            with transaction.atomic():
+                rows = model.objects.order_by('pk').only('id', 'token', 'jti')
+                if last_pk is not None:
+                    rows = rows.filter(pk__gt=last_pk)
+                batch = list(rows[:BATCH_SIZE])
+                if not batch:
+                    break
+                last_pk = batch[-1].pk
+                pending = [row for row in batch if row.jti is None]
+                for row in pending:
+                    row.jti = legacy_jti(row.token)
+                model.objects.bulk_update(pending, ['jti'])
+
+
+def enforce_jti_constraints(apps, schema_editor):
+    if schema_editor.connection.vendor != 'postgresql':
+        for model_name, _ in TABLES:
+            model = apps.get_model('core', model_name)
+            old_field = model._meta.get_field('jti')
+            new_field = models.UUIDField(unique=True)
+            new_field.set_attributes_from_name('jti')
+            new_field.model = model
+            schema_editor.alter_field(model, old_field, new_field)
+        return
+
+    for _, table in TABLES:
+        # SET NOT NULL reaproveita o CHECK já validado e não varre a tabela
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_jti_not_null '
+            f'CHECK (jti IS NOT NULL) NOT VALID'
+        )
+        schema_editor.execute(f'ALTER TABLE {table} VALIDATE CONSTRAINT {table}_jti_not_null')
+        schema_editor.execute(f'ALTER TABLE {table} ALTER COLUMN jti SET NOT NULL')
+        schema_editor.execute(f'ALTER TABLE {table} DROP CONSTRAINT {table}_jti_not_null')
+
+        schema_editor.execute(
+            f'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS {table}_jti_uniq ON {table} (jti)'
+        )
+        schema_editor.execute(
+            f'ALTER TABLE {table} ADD CONSTRAINT {table}_jti_uniq UNIQUE USING INDEX {table}_jti_uniq'
+        )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0001_initial'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='jti',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.AddField(
+            model_name='blacklistedtoken',
+            name='jti',
+            field=models.UUIDField(null=True),
+        ),
+        migrations.RunPython(backfill_jti, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(enforce_jti_constraints, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='refreshtoken',
+                    name='jti',
+                    field=models.UUIDField(unique=True),
+                ),
+                migrations.AlterField(
+                    model_name='blacklistedtoken',
+                    name='jti',
+                    field=models.UUIDField(unique=True),
+                ),
+            ],
+        ),
+        migrations.RemoveIndex(
+            model_name='refreshtoken',
+            name='refresh_tok_token_e21bac_idx',
+        ),
+        migrations.RemoveIndex(
+            model_name='blacklistedtoken',
+            name='blacklisted_token_d070ae_idx',
+        ),
+        migrations.RemoveField(
+            model_name='refreshtoken',
+            name='token',
+        ),
+        migrations.RemoveField(
+            model_name='blacklistedtoken',
+            name='token',
+        ),
+    ]
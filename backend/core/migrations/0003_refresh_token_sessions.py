@@ -0,0 +1,110 @@
+"""
+Transforma refresh_tokens em uma tabela de sessões: uma linha por
+(usuário, dispositivo), rotacionada no lugar.
+
+Segue o mesmo padrão não atômico da 0002: linhas existentes são
+convertidas em lotes (cada refresh token antigo vira a sua própria
+sessão) e, no Postgres, a restrição única é criada sem bloquear escritas.
+"""
+
+import django.utils.timezone
+from django.db import migrations, models, transaction
+
+BATCH_SIZE = 1000
+
+
+def backfill_device_id(apps, schema_editor):
+    # Percorre a chave primária em faixas, como a 0002: `device_id` não tem
+    # índice, e filtrar por `device_id IS NULL` faria cada lote varrer a tabela
+    RefreshToken = apps.get_model('core', 'RefreshToken')
+    last_pk = None
+    while True:
+        with transaction.atomic():
+            rows = RefreshToken.objects.order_by('pk').only('id', 'device_id')
+            if last_pk is not None:
+                rows = rows.filter(pk__gt=last_pk)
+            batch = list(rows[:BATCH_SIZE])
+            if not batch:
+                break
+            last_pk = batch[-1].pk
+            pending = [row for row in batch if row.device_id is None]
+            for row in pending:
+                row.device_id = row.id.hex
+            RefreshToken.objects.bulk_update(pending, ['device_id'])
+
+
+def enforce_session_constraints(apps, schema_editor):
+    RefreshToken = apps.get_model('core', 'RefreshToken')
+    constraint = models.UniqueConstraint(fields=['user', 'device_id'], name='refresh_tokens_user_device_uniq')
+
+    if schema_editor.connection.vendor != 'postgresql':
+        old_field = RefreshToken._meta.get_field('device_id')
+        new_field = models.CharField(max_length=64)
+        new_field.set_attributes_from_name('device_id')
+        new_field.model = RefreshToken
+        schema_editor.alter_field(RefreshToken, old_field, new_field)
+        # add_constraint() no SQLite recria a tabela a partir do estado histórico,
+        # que ainda não tem a restrição; o SQL da própria restrição serve a todos
+        schema_editor.execute(constraint.create_sql(RefreshToken, schema_editor))
+        return
+
+    schema_editor.execute(
+        'ALTER TABLE refresh_tokens ADD CONSTRAINT refresh_tokens_device_id_not_null '
+        'CHECK (device_id IS NOT NULL) NOT VALID'
+    )
+    schema_editor.execute('ALTER TABLE refresh_tokens VALIDATE CONSTRAINT refresh_tokens_device_id_not_null')
+    schema_editor.execute('ALTER TABLE refresh_tokens ALTER COLUMN device_id SET NOT NULL')
+    schema_editor.execute('ALTER TABLE refresh_tokens DROP CONSTRAINT refresh_tokens_device_id_not_null')
+
+    schema_editor.execute(
+        'CREATE UNIQUE INDEX CONCURRENTLY IF NOT EXISTS refresh_tokens_user_device_uniq '
+        'ON refresh_tokens (user_id, device_id)'
+    )
+    schema_editor.execute(
+        'ALTER TABLE refresh_tokens ADD CONSTRAINT refresh_tokens_user_device_uniq '
+        'UNIQUE USING INDEX refresh_tokens_user_device_uniq'
+    )
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0002_token_jti'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='device_id',
+            field=models.CharField(max_length=64, null=True),
+        ),
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='user_agent',
+            field=models.CharField(blank=True, default='', max_length=255),
+        ),
+        migrations.AddField(
+            model_name='refreshtoken',
+            name='last_used_at',
+            field=models.DateTimeField(default=django.utils.timezone.now),
+        ),
+        migrations.RunPython(backfill_device_id, migrations.RunPython.noop),
+        migrations.SeparateDatabaseAndState(
+            database_operations=[
+                migrations.RunPython(enforce_session_constraints, migrations.RunPython.noop),
+            ],
+            state_operations=[
+                migrations.AlterField(
+                    model_name='refreshtoken',
+                    name='device_id',
+                    field=models.CharField(max_length=64),
+                ),
+                migrations.AddConstraint(
+                    model_name='refreshtoken',
+                    constraint=models.UniqueConstraint(fields=('user', 'device_id'), name='refresh_tokens_user_device_uniq'),
+                ),
+            ],
+        ),
+    ]
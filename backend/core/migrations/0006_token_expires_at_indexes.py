@@ -0,0 +1,47 @@
+"""
+Índices avulsos em expires_at para a purga de tokens expirados
+(core.tasks.purge_expired_rows), que percorre cada tabela em ordem de
+expires_at: o índice composto (user, expires_at) não atende essa consulta.
+No Postgres os índices são criados CONCURRENTLY, sem bloquear escritas;
+por isso a migração não é atômica.
+"""
+from django.contrib.postgres.operations import AddIndexConcurrently
+from django.db import migrations, models
+
+
+class AddIndexConcurrentlyOnPostgres(AddIndexConcurrently):
+    """AddIndexConcurrently no Postgres; AddIndex comum nos demais bancos (SQLite dos testes)."""
+
+    def database_forwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_forwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_forwards(self, app_label, schema_editor, from_state, to_state)
+
+    def database_backwards(self, app_label, schema_editor, from_state, to_state):
+        if schema_editor.connection.vendor == 'postgresql':
+            return super().database_backwards(app_label, schema_editor, from_state, to_state)
+        return migrations.AddIndex.database_backwards(self, app_label, schema_editor, from_state, to_state)
+
+
+class Migration(migrations.Migration):
+
+    atomic = False
+
+    dependencies = [
+        ('core', '0005_email_outbox'),
+    ]
+
+    operations = [
+        AddIndexConcurrentlyOnPostgres(
+            model_name='refreshtoken',
+            index=models.Index(fields=['expires_at'], name='refresh_tok_expires_a128d9_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='emailverificationtoken',
+            index=models.Index(fields=['expires_at'], name='email_verif_expires_770728_idx'),
+        ),
+        AddIndexConcurrentlyOnPostgres(
+            model_name='passwordresettoken',
+            index=models.Index(fields=['expires_at'], name='password_re_expires_8e96b7_idx'),
+        ),
+    ]
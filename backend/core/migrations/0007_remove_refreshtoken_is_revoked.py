@@ -0,0 +1,17 @@
+# Generated by Django 5.2 on 2026-10-17 05:30
+
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('core', '0006_token_expires_at_indexes'),
+    ]
+
+    operations = [
+        migrations.RemoveField(
+            model_name='refreshtoken',
+            name='is_revoked',
+        ),
+    ]
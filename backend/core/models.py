@@ -10,37 +10,117 @@ class User(AbstractUser):
     is_email_verified = models.BooleanField(default=False)
     created_at = models.DateTimeField(auto_now_add=True)
     updated_at = models.DateTimeField(auto_now=True)
+    # Claim `gen` dos JWTs; incrementá-la revoga todos os tokens do usuário
+    token_generation = models.PositiveIntegerField(default=0)
     
     USERNAME_FIELD = 'email'
     REQUIRED_FIELDS = ['username']
 
 
+class TokenUser:
+    """
+    Usuário leve construído a partir das claims do access token.
+
+    Atende `request.user` e checagens de permissão sem consultar o banco; os
+    demais atributos (inclusive `is_active`) vêm do registro do usuário no
+    cache compartilhado, carregado uma única vez por request. Um usuário
+    excluído não tem atributos além das claims: o acesso levanta
+    AttributeError em vez de devolver valores vazios.
+    """
+
+    is_authenticated = True
+    is_anonymous = False
+
+    def __init__(self, payload):
+        self.payload = payload
+        self.id = self.pk = uuid.UUID(str(payload['user_id']))
+        self.email = payload.get('email', '')
+        self._user = None
+        self._loaded = False
+
+    def get_user(self):
+        """Carrega (uma única vez) o registro do usuário, via cache compartilhado; None se excluído."""
+        if not self._loaded:
+            from .user_cache import user_cache
+            try:
+                self._user = user_cache.get(self.id)
+            except User.DoesNotExist:
+                self._user = None
+            self._loaded = True
+        return self._user
+
+    async def aget_user(self):
+        """Versão assíncrona de `get_user`."""
+        if not self._loaded:
+            from .user_cache import user_cache
+            try:
+                self._user = await user_cache.aget(self.id)
+            except User.DoesNotExist:
+                self._user = None
+            self._loaded = True
+        return self._user
+
+    @property
+    def is_active(self):
+        user = self.get_user()
+        return user is not None and user.is_active
+
+    def __getattr__(self, name):
+        # Só é chamado para atributos que não vieram nas claims
+        if name.startswith('_'):
+            raise AttributeError(name)
+        user = self.get_user()
+        if user is None:
+            raise AttributeError(f"Usuário {self.id} não existe mais: atributo '{name}' indisponível")
+        return getattr(user, name)
+
+    def get_username(self):
+        return self.email
+
+    def __str__(self):
+        return self.email
+
+    def __eq__(self, other):
+        other_pk = getattr(other, 'pk', None)
+        return other_pk is not None and str(other_pk) == str(self.pk)
+
+    def __hash__(self):
+        return hash(str(self.pk))
+
+
 class RefreshToken(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
     user = models.ForeignKey(User, on_delete=models.CASCADE, related_name='refresh_tokens')
-    token = models.CharField(max_length=255, unique=True)
+    # Claim `jti` do token; o JWT em si nunca é armazenado
+    jti = models.UUIDField(unique=True)
+    # Uma linha por sessão (dispositivo); a rotação troca o jti na mesma linha
+    device_id = models.CharField(max_length=64)
+    user_agent = models.CharField(max_length=255, blank=True, default='')
     expires_at = models.DateTimeField()
     created_at = models.DateTimeField(auto_now_add=True)
-    is_revoked = models.BooleanField(default=False)
+    last_used_at = models.DateTimeField(default=timezone.now)
     
     class Meta:
         db_table = 'refresh_tokens'
         indexes = [
-            models.Index(fields=['token']),
             models.Index(fields=['user', 'expires_at']),
+            # Purga de expirados (core.tasks.purge_expired_rows) em ordem de expires_at
+            models.Index(fields=['expires_at']),
+        ]
+        constraints = [
+            models.UniqueConstraint(fields=['user', 'device_id'], name='refresh_tokens_user_device_uniq'),
         ]
 
 
 class BlacklistedToken(models.Model):
     id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
-    token = models.CharField(max_length=500, unique=True)
+    jti = models.UUIDField(unique=True)
     blacklisted_at = models.DateTimeField(auto_now_add=True)
     expires_at = models.DateTimeField()
     
     class Meta:
         db_table = 'blacklisted_tokens'
         indexes = [
-            models.Index(fields=['token']),
             models.Index(fields=['expires_at']),
         ]
 
@@ -58,6 +138,7 @@ class EmailVerificationToken(models.Model):
         indexes = [
             models.Index(fields=['token']),
             models.Index(fields=['user', 'expires_at']),
+            models.Index(fields=['expires_at']),
         ]
 
 
@@ -74,4 +155,51 @@ class PasswordResetToken(models.Model):
         indexes = [
             models.Index(fields=['token']),
             models.Index(fields=['user', 'expires_at']),
-        ]
\ No newline at end of file
+            models.Index(fields=['expires_at']),
+        ]
+
+class EmailOutbox(models.Model):
+    """
+    Outbox transacional de emails: a linha é gravada na mesma transação que
+    o usuário/token que a originou e drenada pelos workers do Celery
+    (core.mail_queue) com SELECT ... FOR UPDATE SKIP LOCKED.
+    """
+    
+    STATUS_PENDING = 'pending'
+    STATUS_SENT = 'sent'
+    STATUS_FAILED = 'failed'
+    STATUS_CHOICES = [
+        (STATUS_PENDING, 'Pending'),
+        (STATUS_SENT, 'Sent'),
+        (STATUS_FAILED, 'Failed'),
+    ]
+    
+    id = models.UUIDField(primary_key=True, default=uuid.uuid4, editable=False)
+    # Reenfileirar a mesma mensagem (mesma chave) não gera um segundo email
+    dedup_key = models.CharField(max_length=255, unique=True, null=True, blank=True)
+    kind = models.CharField(max_length=50, blank=True, default='')
+    subject = models.CharField(max_length=255)
+    text = models.TextField(blank=True, default='')
+    html = models.TextField(blank=True, default='')
+    from_email = models.CharField(max_length=255)
+    recipients = models.JSONField(default=list)
+    status = models.CharField(max_length=10, choices=STATUS_CHOICES, default=STATUS_PENDING)
+    attempts = models.PositiveIntegerField(default=0)
+    # Próxima tentativa; enquanto um worker envia, é o fim do lease dele
+    available_at = models.DateTimeField(default=timezone.now)
+    last_error = models.TextField(blank=True, default='')
+    created_at = models.DateTimeField(auto_now_add=True)
+    sent_at = models.DateTimeField(null=True, blank=True)
+    # Preenchido ao enviar ou desistir; a limpeza de tokens expirados remove a linha depois
+    expires_at = models.DateTimeField(null=True, blank=True)
+    
+    class Meta:
+        db_table = 'email_outbox'
+        indexes = [
+            models.Index(
+                fields=['available_at'],
+                name='email_outbox_pending_idx',
+                condition=models.Q(status='pending')
+            ),
+            models.Index(fields=['expires_at']),
+        ]
@@ -0,0 +1,195 @@
+import asyncio
+import threading
+import weakref
+import functools
+import redis
+import redis.asyncio
+from django.conf import settings
+from django.core.cache import cache
+from prometheus_client import Gauge
+
+# Uso cujo banco lógico é o do cache padrão (django_redis)
+CACHE_USE = 'cache'
+
+REDIS_POOL_CONNECTIONS = Gauge(
+    'redis_pool_connections',
+    'Conexões dos pools Redis compartilhados do processo',
+    ['use', 'state']
+)
+
+
+class RedisPoolRegistry:
+    """
+    Pools de conexão Redis compartilhados pelo processo, um por uso.
+
+    Cada uso (`rate_limit`, `cache`, ...) tem o seu banco lógico em
+    `REDIS_DATABASES`; host, porta e senha vêm dos settings. O uso `cache`
+    reaproveita o pool do django_redis, de modo que cache e chamadas diretas
+    dividem as mesmas conexões. Conexões ociosas são validadas com PING
+    (`REDIS_HEALTH_CHECK_INTERVAL`) antes de voltar ao uso.
+    """
+
+    def __init__(self):
+        self._pools = {}
+        self._lock = threading.Lock()
+
+    def _connection_kwargs(self, use, decode_responses):
+        databases = getattr(settings, 'REDIS_DATABASES', {})
+        if use not in databases:
+            raise KeyError(f"Uso de Redis desconhecido: {use}")
+        return {
+            'host': settings.REDIS_HOST,
+            'port': settings.REDIS_PORT,
+            'db': databases[use],
+            'password': settings.REDIS_PASSWORD,
+            'decode_responses': decode_responses,
+            'socket_connect_timeout': settings.REDIS_SOCKET_TIMEOUT,
+            'socket_timeout': settings.REDIS_SOCKET_TIMEOUT,
+            'socket_keepalive': True,
+            'health_check_interval': settings.REDIS_HEALTH_CHECK_INTERVAL,
+            'retry_on_timeout': True,
+        }
+
+    def _cache_pool(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection('default').connection_pool
+        except (ImportError, NotImplementedError):
+            # Cache padrão não é o django_redis (testes, desenvolvimento)
+            return None
+
+    def pool(self, use, decode_responses=False):
+        """Retorna o pool do uso, criando-o na primeira chamada."""
+        key = (use, decode_responses)
+        pool = self._pools.get(key)
+        if pool is not None:
+            return pool
+
+        with self._lock:
+            pool = self._pools.get(key)
+            if pool is None:
+                if use == CACHE_USE and not decode_responses:
+                    pool = self._cache_pool()
+                if pool is None:
+                    pool = redis.ConnectionPool(
+                        max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+                        **self._connection_kwargs(use, decode_responses)
+                    )
+                self._pools[key] = pool
+                self._export_metrics(use, decode_responses, pool)
+        return pool
+
+    def client(self, use, decode_responses=False):
+        """Cliente Redis sobre o pool compartilhado; barato de criar a cada uso."""
+        return redis.Redis(connection_pool=self.pool(use, decode_responses))
+
+    def pipeline(self, use, transaction=False, decode_responses=False):
+        """
+        Pipeline sobre o pool do uso; os comandos vão em uma única ida ao Redis.
+
+            with redis_pools.pipeline('rate_limit') as pipe:
+                pipe.incr('a')
+                pipe.expire('a', 60)
+                results = pipe.execute()
+        """
+        return self.client(use, decode_responses).pipeline(transaction=transaction)
+
+    def _export_metrics(self, use, decode_responses, pool):
+        label = use if not decode_responses else f"{use}:decoded"
+        REDIS_POOL_CONNECTIONS.labels(use=label, state='in_use').set_function(
+            lambda: len(getattr(pool, '_in_use_connections', ()))
+        )
+        REDIS_POOL_CONNECTIONS.labels(use=label, state='idle').set_function(
+            lambda: len(getattr(pool, '_available_connections', ()))
+        )
+
+    def stats(self):
+        """Conexões criadas, em uso e ociosas por pool."""
+        with self._lock:
+            pools = dict(self._pools)
+        return {
+            (use if not decoded else f"{use}:decoded"): {
+                'created': getattr(pool, '_created_connections', None),
+                'in_use': len(getattr(pool, '_in_use_connections', ())),
+                'idle': len(getattr(pool, '_available_connections', ())),
+                'max': getattr(pool, 'max_connections', None),
+            }
+            for (use, decoded), pool in pools.items()
+        }
+
+
+redis_pools = RedisPoolRegistry()
+
+
+# Conexões do redis.asyncio ficam presas ao event loop em que foram criadas
+_async_clients = weakref.WeakKeyDictionary()
+
+
+def get_async_redis():
+    """Retorna o cliente redis.asyncio do cache padrão para o event loop atual."""
+    loop = asyncio.get_running_loop()
+    client = _async_clients.get(loop)
+    if client is None:
+        options = settings.CACHES['default'].get('OPTIONS', {})
+        client = redis.asyncio.Redis.from_url(
+            settings.CACHES['default']['LOCATION'],
+            password=options.get('PASSWORD'),
+            max_connections=settings.REDIS_POOL_MAX_CONNECTIONS,
+            health_check_interval=settings.REDIS_HEALTH_CHECK_INTERVAL,
+            socket_connect_timeout=0.5,
+            socket_timeout=0.5
+        )
+        _async_clients[loop] = client
+    return client
+
+
+@functools.lru_cache(maxsize=None)
+def cache_is_django_redis():
+    """True se o cache padrão é o django_redis; verificado uma vez por processo."""
+    return settings.CACHES['default']['BACKEND'].startswith('django_redis.')
+
+
+class AsyncCache:
+    """
+    Acesso assíncrono ao cache padrão.
+
+    Com o django_redis, os comandos vão direto pelo redis.asyncio (sem uma
+    thread por chamada), com o prefixo de chaves e a serialização do
+    django_redis, de modo que os valores são os mesmos lidos e gravados por
+    `cache`. Com outros backends (locmem em testes e benchmarks), usa a API
+    assíncrona do cache do Django.
+    """
+
+    @staticmethod
+    def _decode(raw):
+        return cache.client.decode(raw) if raw is not None else None
+
+    async def get(self, key):
+        if not cache_is_django_redis():
+            return await cache.aget(key)
+        return self._decode(await get_async_redis().get(cache.make_key(key)))
+
+    async def get_many(self, keys):
+        """Valores na ordem de `keys`, com None para as ausentes."""
+        if not cache_is_django_redis():
+            found = await cache.aget_many(keys)
+            return [found.get(key) for key in keys]
+        raws = await get_async_redis().mget([cache.make_key(key) for key in keys])
+        return [self._decode(raw) for raw in raws]
+
+    async def set(self, key, value, timeout):
+        if not cache_is_django_redis():
+            await cache.aset(key, value, timeout)
+            return
+        await get_async_redis().set(cache.make_key(key), cache.client.encode(value), ex=timeout)
+
+    async def add(self, key, value, timeout):
+        """Grava apenas se a chave não existir; True se gravou."""
+        if not cache_is_django_redis():
+            return await cache.aadd(key, value, timeout)
+        return bool(await get_async_redis().set(
+            cache.make_key(key), cache.client.encode(value), ex=timeout, nx=True
+        ))
+
+
+async_cache = AsyncCache()
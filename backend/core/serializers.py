@@ -15,15 +15,18 @@ class UserSerializer(serializers.ModelSerializer):
 class LoginSerializer(serializers.Serializer):
     email = serializers.EmailField()
     password = serializers.CharField(write_only=True)
+    # Identifica a sessão; reaproveitar o mesmo id renova a sessão em vez de abrir outra
+    device_id = serializers.CharField(max_length=64, required=False)
 
 
 class RegisterSerializer(serializers.ModelSerializer):
     password = serializers.CharField(write_only=True, validators=[validate_password])
     password_confirm = serializers.CharField(write_only=True)
+    device_id = serializers.CharField(write_only=True, max_length=64, required=False)
     
     class Meta:
         model = User
-        fields = ('email', 'username', 'first_name', 'last_name', 'password', 'password_confirm')
+        fields = ('email', 'username', 'first_name', 'last_name', 'password', 'password_confirm', 'device_id')
     
     def validate(self, attrs):
         if attrs['password'] != attrs['password_confirm']:
@@ -32,5 +35,16 @@ class RegisterSerializer(serializers.ModelSerializer):
     
     def create(self, validated_data):
         validated_data.pop('password_confirm')
-        user = User.objects.create_user(**validated_data)
+        validated_data.pop('device_id', None)
+        # O hash pode vir pronto da view, calculado sob o limite de hashing (core.hashing)
+        password_hash = validated_data.pop('password_hash', None)
+        if password_hash is None:
+            return User.objects.create_user(**validated_data)
+        
+        validated_data.pop('password')
+        user = User(**validated_data)
+        user.email = User.objects.normalize_email(user.email)
+        user.username = User.normalize_username(user.username)
+        user.password = password_hash
+        user.save()
         return user
\ No newline at end of file
@@ -1,60 +1,616 @@
 import jwt
-from datetime import datetime, timedelta
+import json
+import time
+import base64
+import hashlib
+import logging
+import threading
+import uuid
+from collections import OrderedDict
+from cryptography.fernet import Fernet, InvalidToken
+from datetime import datetime, timedelta, timezone as dt_timezone
 from django.conf import settings
 from django.contrib.auth import get_user_model
-from .models import RefreshToken, BlacklistedToken
+from django.core.cache import cache
+from django.db import connection
+from django.db.models import F
+from django.utils.crypto import salted_hmac
+from django.utils import timezone
+from asgiref.sync import sync_to_async
+from .models import RefreshToken, BlacklistedToken, TokenUser
+from .jwt_keys import key_ring
+from .instrumentation import record_cache
+from .redis_clients import async_cache
+from .user_cache import user_cache
 
 User = get_user_model()
 
+logger = logging.getLogger(__name__)
+
+
+def token_digest(token):
+    """Retorna o digest SHA-256 usado para indexar um token."""
+    return hashlib.sha256(token.encode()).hexdigest()
+
+
+def token_jti(payload, token):
+    """Identificador compacto do token: a claim `jti` ou, em tokens antigos, um UUID derivado do digest."""
+    jti = payload.get('jti')
+    if jti:
+        return uuid.UUID(jti)
+    return uuid.UUID(bytes=hashlib.sha256(token.encode()).digest()[:16])
+
+
+class TokenRevocationIndex:
+    """Índice de tokens revogados no Redis, com o Postgres como fallback durável."""
+
+    key_prefix = 'jwt_revoked:'
+    ready_key = 'jwt_revoked:__ready__'
+
+    def _key(self, jti):
+        return f"{self.key_prefix}{jti.hex}"
+
+    def add(self, jti, exp):
+        """Marca o token como revogado até o seu `exp`."""
+        ttl = int(exp - time.time())
+        if ttl <= 0:
+            return
+        try:
+            cache.set(self._key(jti), 1, ttl)
+        except Exception as e:
+            # O registro no Postgres continua valendo; sem o marcador de índice pronto
+            # as verificações voltam para o banco até o próximo rebuild
+            logger.warning(f"Falha ao indexar token revogado no Redis: {str(e)}")
+            try:
+                cache.delete(self.ready_key)
+            except Exception:
+                pass
+
+    def is_revoked(self, jti):
+        """Verifica a revogação consultando o Postgres apenas se o índice não estiver disponível."""
+        key = self._key(jti)
+        try:
+            found = cache.get_many([key, self.ready_key])
+        except Exception as e:
+            logger.warning(f"Índice de revogação indisponível, usando o banco: {str(e)}")
+            found = None
+
+        if found is not None:
+            if key in found:
+                return True
+            if self.ready_key in found:
+                return False
+            self._schedule_rebuild()
+
+        # Redis fora do ar ou índice ainda não reconstruído
+        return BlacklistedToken.objects.filter(jti=jti).exists()
+
+    async def ais_revoked(self, jti):
+        """Versão assíncrona de `is_revoked`, via cache assíncrono e ORM assíncrono."""
+        key = self._key(jti)
+        try:
+            revoked, ready = await async_cache.get_many([key, self.ready_key])
+        except Exception as e:
+            logger.warning(f"Índice de revogação indisponível, usando o banco: {str(e)}")
+        else:
+            if revoked is not None:
+                return True
+            if ready is not None:
+                return False
+            await sync_to_async(self._schedule_rebuild)()
+
+        return await BlacklistedToken.objects.filter(jti=jti).aexists()
+
+    def rebuild(self):
+        """Reidrata o índice a partir dos tokens ainda não expirados no Postgres."""
+        now = time.time()
+        indexed = 0
+        rows = (
+            BlacklistedToken.objects
+            .filter(expires_at__gt=timezone.now())
+            .values_list('jti', 'expires_at')
+            .iterator(chunk_size=1000)
+        )
+        for jti, expires_at in rows:
+            ttl = int(expires_at.timestamp() - now)
+            if ttl > 0:
+                cache.set(self._key(jti), 1, ttl)
+                indexed += 1
+
+        cache.set(self.ready_key, 1, None)
+        return indexed
+
+    def _schedule_rebuild(self):
+        # Dispara no máximo um rebuild por minuto, independente do número de workers
+        try:
+            if not cache.add(f"{self.ready_key}:lock", 1, 60):
+                return
+            from .tasks import rebuild_token_revocation_index
+            rebuild_token_revocation_index.delay()
+        except Exception as e:
+            logger.warning(f"Não foi possível agendar o rebuild do índice de revogação: {str(e)}")
+
+
+revocation_index = TokenRevocationIndex()
+
+
+# KEYS[1]: chave da geração; ARGV: geração, ttl (s). Só grava valores maiores
+GENERATION_PUBLISH_SCRIPT = """
+local current = tonumber(redis.call('GET', KEYS[1]))
+if current and current >= tonumber(ARGV[1]) then
+    return 0
+end
+redis.call('SET', KEYS[1], ARGV[1], 'EX', ARGV[2])
+return 1
+"""
+
+
+class TokenGenerationStore:
+    """
+    Geração de tokens por usuário, embutida nos JWTs como claim `gen`.
+
+    Incrementá-la invalida de uma vez todos os tokens já emitidos para o
+    usuário. O valor durável fica no Postgres (`User.token_generation`), com
+    cópia no Redis e um cache local curto por worker, de modo que a
+    verificação quase nunca sai do processo; após um incremento, outros
+    workers podem aceitar tokens antigos por até `local_ttl` segundos.
+
+    A cópia no Redis só avança: um miss preenche com `add` e `bump` publica
+    com compare-and-set pelo maior valor, de modo que uma leitura atrasada do
+    banco nunca substitui uma geração mais nova.
+    """
+
+    key_prefix = 'jwt_generation:'
+
+    def __init__(self, local_ttl=5.0, timeout=3600, maxsize=4096):
+        self.local_ttl = local_ttl
+        self.timeout = timeout
+        self.maxsize = maxsize
+        self._local = OrderedDict()
+        self._lock = threading.Lock()
+        self._publish_script = None
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    def _get_local(self, user_id):
+        with self._lock:
+            entry = self._local.get(user_id)
+            if entry is None or entry[1] <= time.monotonic():
+                return None
+            self._local.move_to_end(user_id)
+            return entry[0]
+
+    def _set_local(self, user_id, generation):
+        with self._lock:
+            self._local[user_id] = (generation, time.monotonic() + self.local_ttl)
+            self._local.move_to_end(user_id)
+            while len(self._local) > self.maxsize:
+                self._local.popitem(last=False)
+
+    def _load(self, user_id):
+        return User.objects.filter(pk=user_id).values_list('token_generation', flat=True).first() or 0
+
+    def _publish(self, user_id, generation):
+        """Grava a geração no Redis apenas se for maior que a já publicada."""
+        key = self._key(user_id)
+        try:
+            from django_redis import get_redis_connection
+            client = get_redis_connection('default')
+        except (ImportError, NotImplementedError):
+            # Cache padrão não é o django_redis (testes, desenvolvimento)
+            with self._lock:
+                current = cache.get(key)
+                if current is None or current < generation:
+                    cache.set(key, generation, self.timeout)
+            return
+        if self._publish_script is None:
+            self._publish_script = client.register_script(GENERATION_PUBLISH_SCRIPT)
+        # Inteiros vão crus para o Redis (sem pickle), então o script os compara
+        self._publish_script(keys=[cache.make_key(key)], args=[generation, self.timeout])
+
+    def current(self, user_id):
+        """Geração atual do usuário: cache local, depois Redis e, por último, o banco."""
+        user_id = str(user_id)
+        generation = self._get_local(user_id)
+        record_cache('jwt_generation', generation is not None)
+        if generation is not None:
+            return generation
+
+        key = self._key(user_id)
+        try:
+            generation = cache.get(key)
+        except Exception as e:
+            logger.warning(f"Geração de tokens indisponível no Redis, usando o banco: {str(e)}")
+            generation = self._load(user_id)
+        else:
+            if generation is None:
+                generation = self._load(user_id)
+                try:
+                    # add: um bump concorrente já pode ter publicado uma geração mais nova
+                    cache.add(key, generation, self.timeout)
+                except Exception:
+                    pass
+
+        self._set_local(user_id, generation)
+        return generation
+
+    async def acurrent(self, user_id):
+        """Versão assíncrona de `current`, via cache assíncrono e ORM assíncrono."""
+        user_id = str(user_id)
+        generation = self._get_local(user_id)
+        record_cache('jwt_generation', generation is not None)
+        if generation is not None:
+            return generation
+
+        key = self._key(user_id)
+        try:
+            generation = await async_cache.get(key)
+        except Exception as e:
+            logger.warning(f"Geração de tokens indisponível no Redis, usando o banco: {str(e)}")
+            generation = None
+            redis_ok = False
+        else:
+            redis_ok = True
+
+        if generation is None:
+            generation = await (
+                User.objects.filter(pk=user_id).values_list('token_generation', flat=True).afirst()
+            ) or 0
+            if redis_ok:
+                try:
+                    # add: um bump concorrente já pode ter publicado uma geração mais nova
+                    await async_cache.add(key, generation, self.timeout)
+                except Exception:
+                    pass
+
+        self._set_local(user_id, generation)
+        return generation
+
+    def bump(self, user_id):
+        """Incrementa a geração do usuário, revogando todos os seus tokens."""
+        user_id = str(user_id)
+        User.objects.filter(pk=user_id).update(
+            token_generation=F('token_generation') + 1, updated_at=timezone.now()
+        )
+        try:
+            # update() não dispara post_save: o registro em cache é descartado aqui
+            user_cache.invalidate(user_id)
+        except Exception as e:
+            logger.warning(f"Falha ao invalidar o usuário {user_id} no cache: {str(e)}")
+        generation = self._load(user_id)
+        try:
+            self._publish(user_id, generation)
+        except Exception as e:
+            # Sem Redis os workers já leem do banco; uma cópia antiga volta a ser
+            # lida apenas se o Redis voltar antes de a chave expirar
+            logger.error(f"Falha ao publicar a geração de tokens no Redis: {str(e)}")
+        self._set_local(user_id, generation)
+        return generation
+
+
+token_generations = TokenGenerationStore(
+    local_ttl=getattr(settings, 'JWT_GENERATION_LOCAL_TTL', 5.0),
+    timeout=getattr(settings, 'JWT_GENERATION_CACHE_TIMEOUT', 3600)
+)
+
+
+class TokenPayloadCache:
+    """Cache LRU em memória dos payloads já verificados, por worker."""
+
+    def __init__(self, maxsize=1024):
+        self.maxsize = maxsize
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def get(self, digest):
+        with self._lock:
+            payload = self._entries.get(digest)
+            if payload is not None and payload['exp'] <= time.time():
+                # Expirado: deixa o jwt.decode gerar o erro correto
+                del self._entries[digest]
+                payload = None
+            if payload is None:
+                self.misses += 1
+            else:
+                self._entries.move_to_end(digest)
+                self.hits += 1
+        record_cache('jwt_payload', payload is not None)
+        return payload
+
+    def set(self, digest, payload):
+        with self._lock:
+            self._entries[digest] = payload
+            self._entries.move_to_end(digest)
+            while len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+
+    def discard(self, digest):
+        with self._lock:
+            self._entries.pop(digest, None)
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
+            self.hits = 0
+            self.misses = 0
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                'size': len(self._entries),
+                'maxsize': self.maxsize,
+                'hits': self.hits,
+                'misses': self.misses,
+                'hit_ratio': round(self.hits / total, 4) if total else 0.0,
+            }
+
+
+payload_cache = TokenPayloadCache(getattr(settings, 'JWT_PAYLOAD_CACHE_SIZE', 1024))
+
+
+class _InFlightCall:
+    def __init__(self):
+        self.done = threading.Event()
+        self.result = None
+        self.error = None
+
+
+# Erro devolvido a quem desistiu de esperar a rotação feita por outro worker
+REFRESH_IN_PROGRESS = 'Refresh already in progress'
+
+
+class RefreshSingleFlight:
+    """
+    Coalesce refreshes concorrentes do mesmo refresh token.
+
+    Dentro do worker, chamadas simultâneas esperam a primeira terminar. Entre
+    workers, um lock no Redis elege quem faz a rotação e o resultado bem
+    sucedido fica publicado por `result_ttl` segundos, de modo que abas
+    disparando o mesmo refresh recebem os mesmos tokens em vez de um erro de
+    token já rotacionado. Erros não são publicados.
+
+    O resultado vai cifrado (Fernet) com uma chave derivada do próprio refresh
+    token e da SECRET_KEY; a chave no Redis é só o digest do token, então
+    quem lê o Redis não obtém tokens utilizáveis. Os demais workers esperam
+    no máximo `wait_interval * wait_attempts` segundos e, sem resultado,
+    recebem `REFRESH_IN_PROGRESS` em vez de tentar uma segunda rotação.
+
+    Um resultado publicado só é entregue se `accept(result)` o aprovar (o
+    JWTService exige o device_id da sessão e que ela ainda tenha o jti
+    emitido pela rotação); recusado, quem chegou depois faz a própria
+    rotação, que falha porque o jti antigo já não existe. Quem tem o refresh
+    token antigo e o device_id ainda recebe os novos tokens durante
+    `result_ttl`: é o risco aceito em JWT_REFRESH_COALESCE_SECONDS.
+    """
+
+    key_prefix = 'jwt_refresh:'
+
+    def __init__(self, result_ttl=10, lock_timeout=5, wait_interval=0.02, wait_attempts=10):
+        self.result_ttl = result_ttl
+        self.lock_timeout = lock_timeout
+        self.wait_interval = wait_interval
+        self.wait_attempts = wait_attempts
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def _cipher(self, token):
+        key = salted_hmac(self.key_prefix, token, algorithm='sha256').digest()
+        return Fernet(base64.urlsafe_b64encode(key))
+
+    def _publish(self, result_key, token, result):
+        sealed = self._cipher(token).encrypt(json.dumps(result).encode())
+        cache.set(result_key, sealed, self.result_ttl)
+
+    def _published(self, result_key, token):
+        sealed = cache.get(result_key)
+        if sealed is None:
+            return None
+        try:
+            return json.loads(self._cipher(token).decrypt(sealed))
+        except InvalidToken:
+            return None
+
+    def _accepted(self, result_key, token, accept):
+        result = self._published(result_key, token)
+        if result is None or (accept is not None and not accept(result)):
+            return None
+        return result
+
+    def do(self, token, func, accept=None, scope=''):
+        """
+        Executa `func()` uma única vez por token (e `scope`) e compartilha o
+        resultado (`(result, error)`). Resultados publicados por outro worker
+        só são devolvidos se `accept(result)` for verdadeiro.
+        """
+        digest = token_digest(token)
+        call_key = (digest, scope)
+        with self._lock:
+            call = self._calls.get(call_key)
+            leader = call is None
+            if leader:
+                call = self._calls[call_key] = _InFlightCall()
+
+        if not leader:
+            call.done.wait()
+            if call.error is not None:
+                raise call.error
+            return call.result
+
+        try:
+            call.result = self._do_shared(token, digest, func, accept)
+            return call.result
+        except Exception as e:
+            call.error = e
+            raise
+        finally:
+            with self._lock:
+                self._calls.pop(call_key, None)
+            call.done.set()
+
+    def _do_shared(self, token, digest, func, accept):
+        result_key = f"{self.key_prefix}{digest}"
+        lock_key = f"{result_key}:lock"
+        try:
+            result = self._accepted(result_key, token, accept)
+            leader = result is None and cache.add(lock_key, 1, self.lock_timeout)
+        except Exception as e:
+            logger.warning(f"Coalescência de refresh indisponível no Redis: {str(e)}")
+            return func()
+
+        if result is not None:
+            return result, None
+
+        if leader:
+            try:
+                result, error = func()
+                if error is None:
+                    try:
+                        self._publish(result_key, token, result)
+                    except Exception as e:
+                        logger.warning(f"Falha ao publicar o refresh no Redis: {str(e)}")
+                return result, error
+            finally:
+                cache.delete(lock_key)
+
+        # Outro worker está rotacionando este token: espera curta pelo resultado publicado
+        for _ in range(self.wait_attempts):
+            time.sleep(self.wait_interval)
+            result = self._accepted(result_key, token, accept)
+            if result is not None:
+                return result, None
+
+        return None, REFRESH_IN_PROGRESS
+
+
+refresh_single_flight = RefreshSingleFlight(
+    result_ttl=getattr(settings, 'JWT_REFRESH_COALESCE_SECONDS', 10)
+)
+
 
 class JWTService:
     @staticmethod
-    def generate_tokens(user):
-        """Gera access e refresh tokens para o usuário."""
-        access_payload = {
-            'user_id': str(user.id),
-            'email': user.email,
+    def encode_token(payload):
+        """Assina o payload com a chave atual do key ring, identificada pelo `kid`."""
+        kid, private_key = key_ring.signing_key()
+        return jwt.encode(payload, private_key, algorithm=key_ring.algorithm, headers={'kid': kid})
+    
+    @staticmethod
+    def decode_token(token):
+        """Valida a assinatura usando a chave indicada pelo `kid` do cabeçalho."""
+        kid = jwt.get_unverified_header(token).get('kid')
+        if kid is None:
+            # Tokens HS256 emitidos antes do key ring continuam válidos até expirar
+            if not settings.JWT_ACCEPT_LEGACY_HS256:
+                raise jwt.InvalidTokenError('Missing kid header')
+            return jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+        
+        public_key = key_ring.verification_key(kid)
+        if public_key is None:
+            raise jwt.InvalidTokenError('Unknown signing key')
+        return jwt.decode(token, public_key, algorithms=[key_ring.algorithm])
+    
+    @staticmethod
+    def decode_cached(token):
+        """Decodifica o token, reaproveitando o payload já verificado neste worker."""
+        digest = token_digest(token)
+        payload = payload_cache.get(digest)
+        if payload is None:
+            payload = JWTService.decode_token(token)
+            payload_cache.set(digest, payload)
+        return payload, digest
+    
+    @staticmethod
+    def build_access_payload(user_id, email, generation):
+        return {
+            'user_id': str(user_id),
+            'email': email,
+            'gen': generation,
             'exp': datetime.utcnow() + timedelta(minutes=15),  # 15 minutos
             'iat': datetime.utcnow(),
+            'jti': uuid.uuid4().hex,
             'type': 'access'
         }
-        
-        refresh_payload = {
-            'user_id': str(user.id),
-            'email': user.email,
-            'exp': datetime.utcnow() + timedelta(days=366),  # 366 dias
+    
+    @staticmethod
+    def build_refresh_payload(user_id, email, generation, jti, exp):
+        return {
+            'user_id': str(user_id),
+            'email': email,
+            'gen': generation,
+            'exp': exp,
             'iat': datetime.utcnow(),
+            'jti': jti.hex,
             'type': 'refresh'
         }
+    
+    @staticmethod
+    def generate_tokens(user, device_id=None, user_agent=''):
+        """Gera access e refresh tokens para o usuário, abrindo ou renovando a sessão do dispositivo."""
+        device_id = device_id or uuid.uuid4().hex
+        refresh_jti = uuid.uuid4()
+        now = timezone.now()
+        expires_at = now + timedelta(days=366)  # 366 dias
+        # Lida do próprio registro, que acabou de vir do banco
+        generation = user.token_generation
         
-        access_token = jwt.encode(access_payload, settings.SECRET_KEY, algorithm='HS256')
-        refresh_token = jwt.encode(refresh_payload, settings.SECRET_KEY, algorithm='HS256')
+        access_token = JWTService.encode_token(JWTService.build_access_payload(user.id, user.email, generation))
+        refresh_token = JWTService.encode_token(
+            JWTService.build_refresh_payload(user.id, user.email, generation, refresh_jti, expires_at)
+        )
         
-        # Armazena o refresh token no banco
-        RefreshToken.objects.create(
-            user=user,
-            token=refresh_token,
-            expires_at=datetime.utcnow() + timedelta(days=366)
+        # Upsert da sessão em um único INSERT ... ON CONFLICT; o refresh token
+        # anterior do mesmo dispositivo deixa de existir junto com o seu jti
+        RefreshToken.objects.bulk_create(
+            [RefreshToken(
+                user=user,
+                device_id=device_id,
+                user_agent=user_agent[:255],
+                jti=refresh_jti,
+                expires_at=expires_at,
+                last_used_at=now
+            )],
+            update_conflicts=True,
+            unique_fields=['user', 'device_id'],
+            update_fields=['jti', 'user_agent', 'expires_at', 'last_used_at']
         )
+        JWTService.enforce_session_cap(user.id)
         
         return {
             'access': access_token,
-            'refresh': refresh_token
+            'refresh': refresh_token,
+            'device_id': device_id
         }
     
+    @staticmethod
+    def enforce_session_cap(user_id):
+        """Remove, em um único DELETE, as sessões mais antigas acima do limite por usuário."""
+        sessions = RefreshToken.objects.filter(user_id=user_id)
+        keep = sessions.order_by('-last_used_at').values('pk')[:settings.JWT_MAX_SESSIONS_PER_USER]
+        return sessions.exclude(pk__in=keep).delete()[0]
+    
     @staticmethod
     def verify_token(token, token_type='access'):
-        """Verifica e decodifica um token JWT."""
+        """Verifica e decodifica um token JWT (`token_type=None` aceita qualquer tipo)."""
         try:
-            # Verifica se está na blacklist
-            if BlacklistedToken.objects.filter(token=token).exists():
-                return None, 'Token blacklisted'
-            
-            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=['HS256'])
+            payload, digest = JWTService.decode_cached(token)
             
-            if payload.get('type') != token_type:
+            if token_type and payload.get('type') != token_type:
                 return None, f'Invalid token type, expected {token_type}'
             
+            # Tokens emitidos antes do último "sair de todos os dispositivos" (ou sem `gen`)
+            if payload.get('gen', 0) < token_generations.current(payload['user_id']):
+                payload_cache.discard(digest)
+                return None, 'Token revoked'
+            
+            # Verifica se está na blacklist (Redis; o banco só é consultado como fallback)
+            if revocation_index.is_revoked(token_jti(payload, token)):
+                payload_cache.discard(digest)
+                return None, 'Token blacklisted'
+            
             return payload, None
         except jwt.ExpiredSignatureError:
             return None, 'Token expired'
@@ -62,60 +618,191 @@ class JWTService:
             return None, 'Invalid token'
     
     @staticmethod
-    def refresh_access_token(refresh_token):
-        """Gera um novo access token usando o refresh token."""
-        payload, error = JWTService.verify_token(refresh_token, 'refresh')
-        if error:
-            return None, error
-        
-        # Verifica se o refresh token existe e não foi revogado
+    def refresh_access_token(refresh_token, device_id=None):
+        """
+        Gera um novo access token e rotaciona o refresh token. Refreshes
+        concorrentes do mesmo token só recebem a rotação já feita se enviarem
+        o `device_id` da sessão.
+        """
+        return refresh_single_flight.do(
+            refresh_token,
+            lambda: JWTService.rotate_refresh_token(refresh_token),
+            accept=lambda result: JWTService.session_holds(result, device_id),
+            scope=device_id or ''
+        )
+    
+    @staticmethod
+    def session_holds(result, device_id):
+        """True se `result` é a rotação vigente da sessão do dispositivo `device_id`."""
+        if not device_id or result.get('device_id') != device_id:
+            return False
         try:
-            refresh_obj = RefreshToken.objects.get(token=refresh_token, is_revoked=False)
-            if refresh_obj.expires_at < datetime.utcnow():
-                return None, 'Refresh token expired'
-        except RefreshToken.DoesNotExist:
-            return None, 'Invalid refresh token'
+            payload, _ = JWTService.decode_cached(result['refresh'])
+        except jwt.InvalidTokenError:
+            return False
+        # Sessão encerrada (logout) ou rotacionada de novo desde a publicação
+        return RefreshToken.objects.filter(
+            user_id=payload['user_id'], device_id=device_id, jti=payload['jti']
+        ).exists()
+    
+    @staticmethod
+    def rotate_refresh_token(refresh_token):
+        """Valida a sessão, rotaciona o jti e carrega o usuário em uma única query."""
+        try:
+            payload, digest = JWTService.decode_cached(refresh_token)
+        except jwt.ExpiredSignatureError:
+            return None, 'Token expired'
+        except jwt.InvalidTokenError:
+            return None, 'Invalid token'
         
-        # Gera novo access token
-        user = User.objects.get(id=payload['user_id'])
-        access_payload = {
-            'user_id': str(user.id),
-            'email': user.email,
-            'exp': datetime.utcnow() + timedelta(minutes=15),
-            'iat': datetime.utcnow(),
-            'type': 'access'
-        }
+        if payload.get('type') != 'refresh':
+            return None, 'Invalid token type, expected refresh'
         
-        access_token = jwt.encode(access_payload, settings.SECRET_KEY, algorithm='HS256')
-        return {'access': access_token}, None
+        # Refresh tokens revogados perdem a sessão (não passam pela blacklist) e a
+        # geração é comparada com a do banco, então as checagens de verify_token
+        # ficam todas no UPDATE ... FROM ... RETURNING abaixo
+        new_jti = uuid.uuid4()
+        now = timezone.now()
+        jti_field = RefreshToken._meta.get_field('jti')
+        expires_field = RefreshToken._meta.get_field('expires_at')
+        qn = connection.ops.quote_name
+        sessions, users = qn(RefreshToken._meta.db_table), qn(User._meta.db_table)
+        if connection.vendor == 'postgresql':
+            returning = f"{users}.email, {sessions}.device_id"
+        else:
+            # O SQLite não aceita a tabela do FROM no RETURNING
+            returning = f"(SELECT email FROM {users} WHERE id = {sessions}.user_id), device_id"
+        sql = (
+            f"UPDATE {sessions} SET jti = %s, last_used_at = %s "
+            f"FROM {users} "
+            f"WHERE {users}.id = {sessions}.user_id "
+            f"AND {sessions}.jti = %s AND {sessions}.expires_at > %s "
+            f"AND {users}.is_active = %s AND {users}.token_generation <= %s "
+            f"RETURNING {returning}"
+        )
+        params = [
+            jti_field.get_db_prep_value(new_jti, connection),
+            expires_field.get_db_prep_value(now, connection),
+            jti_field.get_db_prep_value(token_jti(payload, refresh_token), connection),
+            expires_field.get_db_prep_value(now, connection),
+            True,
+            payload.get('gen', 0),
+        ]
+        with connection.cursor() as cursor:
+            cursor.execute(sql, params)
+            row = cursor.fetchone()
+        if row is None:
+            return None, 'Invalid refresh token'
+        payload_cache.discard(digest)
+        
+        email, device_id = row
+        generation = payload.get('gen', 0)
+        access_token = JWTService.encode_token(
+            JWTService.build_access_payload(payload['user_id'], email, generation)
+        )
+        # O novo refresh token mantém a expiração original da sessão
+        refresh_token = JWTService.encode_token(
+            JWTService.build_refresh_payload(payload['user_id'], email, generation, new_jti, payload['exp'])
+        )
+        return {'access': access_token, 'refresh': refresh_token, 'device_id': device_id}, None
     
     @staticmethod
     def blacklist_token(token):
         """Adiciona um token à blacklist."""
-        payload, error = JWTService.verify_token(token)
+        payload, error = JWTService.verify_token(token, token_type=None)
         if error:
             return False, error
         
-        BlacklistedToken.objects.create(
-            token=token,
-            expires_at=datetime.fromtimestamp(payload['exp'])
-        )
+        jti = token_jti(payload, token)
+        payload_cache.discard(token_digest(token))
         
-        # Se for refresh token, marca como revogado
+        # Refresh tokens só valem com a sessão no banco: removê-la basta, sem
+        # ocupar a blacklist por até 366 dias
         if payload.get('type') == 'refresh':
-            RefreshToken.objects.filter(token=token).update(is_revoked=True)
+            RefreshToken.objects.filter(jti=jti).delete()
+            return True, None
+        
+        BlacklistedToken.objects.create(
+            jti=jti,
+            expires_at=datetime.fromtimestamp(payload['exp'], tz=dt_timezone.utc)
+        )
+        revocation_index.add(jti, payload['exp'])
         
         return True, None
     
+    @staticmethod
+    def revoke_all_tokens(user_id):
+        """Revoga todos os access e refresh tokens do usuário com um único incremento."""
+        generation = token_generations.bump(user_id)
+        # As sessões já não rotacionam; removê-las libera o limite por usuário
+        RefreshToken.objects.filter(user_id=user_id).delete()
+        return generation
+    
+    @staticmethod
+    def payload_cache_stats():
+        """Contadores de hit/miss do cache de payloads deste worker."""
+        return payload_cache.stats()
+    
     @staticmethod
     def get_user_from_token(token):
-        """Obtém o usuário a partir de um token válido."""
+        """Obtém o usuário a partir de um token válido; o registro vem do cache de usuários."""
         payload, error = JWTService.verify_token(token)
         if error:
             return None, error
         
+        if not payload.get('user_id'):
+            return None, 'User not found'
+        
+        # O registro vem do cache compartilhado; usuários excluídos ou
+        # desativados não autenticam, mesmo com um token ainda válido
+        user = TokenUser(payload)
+        if user.get_user() is None:
+            return None, 'User not found'
+        if not user.is_active:
+            return None, 'User inactive'
+        return user, None
+
+
+class AsyncJWTService:
+    """Variante assíncrona do JWTService para o deploy ASGI, sem hops sync/async."""
+
+    @staticmethod
+    async def verify_token(token, token_type='access'):
+        """Verifica e decodifica um token JWT."""
         try:
-            user = User.objects.get(id=payload['user_id'])
-            return user, None
-        except User.DoesNotExist:
-            return None, 'User not found'
\ No newline at end of file
+            # Verificar a assinatura é CPU puro e o payload costuma estar em cache
+            payload, digest = JWTService.decode_cached(token)
+            
+            if payload.get('type') != token_type:
+                return None, f'Invalid token type, expected {token_type}'
+            
+            if payload.get('gen', 0) < await token_generations.acurrent(payload['user_id']):
+                payload_cache.discard(digest)
+                return None, 'Token revoked'
+            
+            if await revocation_index.ais_revoked(token_jti(payload, token)):
+                payload_cache.discard(digest)
+                return None, 'Token blacklisted'
+            
+            return payload, None
+        except jwt.ExpiredSignatureError:
+            return None, 'Token expired'
+        except jwt.InvalidTokenError:
+            return None, 'Invalid token'
+    
+    @staticmethod
+    async def get_user_from_token(token):
+        """Obtém o usuário a partir de um token válido; o registro vem do cache de usuários."""
+        payload, error = await AsyncJWTService.verify_token(token)
+        if error:
+            return None, error
+        
+        if not payload.get('user_id'):
+            return None, 'User not found'
+        
+        user = TokenUser(payload)
+        if await user.aget_user() is None:
+            return None, 'User not found'
+        if not user.is_active:
+            return None, 'User inactive'
+        return user, None
@@ -43,14 +43,17 @@ THIRD_PARTY_APPS = [
 if DEBUG:
     THIRD_PARTY_APPS += ['debug_toolbar']
 
+# `core` owns the models (User, tokens) and registers signals in CoreConfig.ready;
+# apps/core only holds the health/root API views and the GraphQL schema, which need no app entry
 LOCAL_APPS = [
-    'apps.core',
+    'core.apps.CoreConfig',
 ]
 
 INSTALLED_APPS = DJANGO_APPS + THIRD_PARTY_APPS + LOCAL_APPS
 
 MIDDLEWARE = [
     'django_prometheus.middleware.PrometheusBeforeMiddleware',
+    'core.instrumentation.RequestInstrumentationMiddleware',
     'corsheaders.middleware.CorsMiddleware',
     'django.middleware.security.SecurityMiddleware',
     'whitenoise.middleware.WhiteNoiseMiddleware',
@@ -58,6 +61,7 @@ MIDDLEWARE = [
     'django.middleware.common.CommonMiddleware',
     'django.middleware.csrf.CsrfViewMiddleware',
     'django.contrib.auth.middleware.AuthenticationMiddleware',
+    'core.middleware.JWTAuthenticationMiddleware',
     'django.contrib.messages.middleware.MessageMiddleware',
     'django.middleware.clickjacking.XFrameOptionsMiddleware',
     'django_prometheus.middleware.PrometheusAfterMiddleware',
@@ -98,17 +102,50 @@ DATABASES = {
     }
 }
 
+# Redis (core.redis_clients): one shared connection pool per use, each on its own logical database
+REDIS_HOST = os.environ.get('REDIS_HOST', 'redis')
+REDIS_PORT = int(os.environ.get('REDIS_PORT', '6379'))
+REDIS_PASSWORD = os.environ.get('REDIS_PASSWORD') or None
+REDIS_DATABASES = {
+    'celery': 0,
+    'cache': 1,
+    'rate_limit': 2,
+}
+REDIS_POOL_MAX_CONNECTIONS = int(os.environ.get('REDIS_POOL_MAX_CONNECTIONS', '50'))
+# Idle connections are PINGed before reuse after this many seconds
+REDIS_HEALTH_CHECK_INTERVAL = int(os.environ.get('REDIS_HEALTH_CHECK_INTERVAL', '30'))
+REDIS_SOCKET_TIMEOUT = float(os.environ.get('REDIS_SOCKET_TIMEOUT', '1.0'))
+
 # Cache
 CACHES = {
     'default': {
         'BACKEND': 'django_redis.cache.RedisCache',
-        'LOCATION': os.environ.get('REDIS_URL', 'redis://redis:6379/1'),
+        'LOCATION': os.environ.get('REDIS_URL', f"redis://{REDIS_HOST}:{REDIS_PORT}/{REDIS_DATABASES['cache']}"),
         'OPTIONS': {
             'CLIENT_CLASS': 'django_redis.client.DefaultClient',
+            'PASSWORD': REDIS_PASSWORD,
+            'CONNECTION_POOL_KWARGS': {
+                'max_connections': REDIS_POOL_MAX_CONNECTIONS,
+                'health_check_interval': REDIS_HEALTH_CHECK_INTERVAL,
+            },
         }
     }
 }
 
+# Seconds a user record stays in the shared user cache
+USER_CACHE_TIMEOUT = int(os.environ.get('USER_CACHE_TIMEOUT', '300'))
+
+# Password hashing limit (core.hashing): concurrent hashes per host, shared by every
+# worker process through Redis, and how many requests may wait for one
+PASSWORD_HASH_WORKERS = int(os.environ.get('PASSWORD_HASH_WORKERS', '2'))
+PASSWORD_HASH_QUEUE_DEPTH = int(os.environ.get('PASSWORD_HASH_QUEUE_DEPTH', '8'))
+PASSWORD_HASH_QUEUE_TIMEOUT = float(os.environ.get('PASSWORD_HASH_QUEUE_TIMEOUT', '2.0'))
+# False limits each process on its own (no Redis round trip)
+PASSWORD_HASH_SHARED_LIMIT = os.environ.get('PASSWORD_HASH_SHARED_LIMIT', 'True').lower() == 'true'
+
+# Custom user model (UUID primary key, login by email)
+AUTH_USER_MODEL = 'core.User'
+
 # Password validation
 AUTH_PASSWORD_VALIDATORS = [
     {
@@ -149,6 +186,8 @@ DEFAULT_AUTO_FIELD = 'django.db.models.BigAutoField'
 # REST Framework
 REST_FRAMEWORK = {
     'DEFAULT_AUTHENTICATION_CLASSES': [
+        # JWT first: Bearer requests never reach the session/authtoken lookups
+        'core.authentication.JWTAuthentication',
         'rest_framework.authentication.SessionAuthentication',
         'rest_framework.authentication.TokenAuthentication',
     ],
@@ -159,6 +198,53 @@ REST_FRAMEWORK = {
     'PAGE_SIZE': 20,
 }
 
+# JWT
+# Tokens are signed with the KeyManager RSA key and published at /.well-known/jwks.json
+JWT_ALGORITHM = 'RS256'
+JWT_KEYS_DIR = os.environ.get('JWT_KEYS_DIR', str(BASE_DIR / 'keys'))
+JWT_JWKS_MAX_AGE = int(os.environ.get('JWT_JWKS_MAX_AGE', '300'))
+# Accept HS256 tokens (no kid) issued before the switch to RS256
+JWT_ACCEPT_LEGACY_HS256 = os.environ.get('JWT_ACCEPT_LEGACY_HS256', 'True').lower() == 'true'
+# Number of verified payloads kept in memory per worker
+JWT_PAYLOAD_CACHE_SIZE = int(os.environ.get('JWT_PAYLOAD_CACHE_SIZE', '1024'))
+# Refresh token sessions (one per device) kept per user; the least recently used are dropped
+JWT_MAX_SESSIONS_PER_USER = int(os.environ.get('JWT_MAX_SESSIONS_PER_USER', '10'))
+# Per-user token generation ("log out everywhere"): seconds a worker trusts its local copy,
+# and TTL of the Redis copy
+JWT_GENERATION_LOCAL_TTL = float(os.environ.get('JWT_GENERATION_LOCAL_TTL', '5'))
+JWT_GENERATION_CACHE_TIMEOUT = int(os.environ.get('JWT_GENERATION_CACHE_TIMEOUT', '3600'))
+# Concurrent refreshes of the same token share one rotation; a successful result is kept
+# (encrypted with a key derived from the refresh token) for this many seconds. It is only
+# handed to requests that send the session's device_id, and only while that session still
+# holds the rotated jti (not after logout or a later rotation). Accepted risk: during this
+# window, whoever holds both the old refresh token and the device_id receives the new pair.
+JWT_REFRESH_COALESCE_SECONDS = int(os.environ.get('JWT_REFRESH_COALESCE_SECONDS', '10'))
+
+# Email rate limiting (core.email_service.EmailRateLimiter): 'sliding_window' or 'token_bucket'
+EMAIL_RATE_LIMIT_MODE = os.environ.get('EMAIL_RATE_LIMIT_MODE', 'sliding_window')
+# In-process tier in front of Redis: clear allow/deny cases are answered locally and the
+# local hits are written to Redis in one pipeline at most every EMAIL_RATE_LIMIT_SYNC_INTERVAL
+# seconds. Below EMAIL_RATE_LIMIT_LOCAL_FRACTION of the limit a hit is allowed without Redis.
+# When Redis fails, limiting is local-only (per process) for EMAIL_RATE_LIMIT_REDIS_RETRY seconds
+EMAIL_RATE_LIMIT_LOCAL = os.environ.get('EMAIL_RATE_LIMIT_LOCAL', 'True').lower() == 'true'
+EMAIL_RATE_LIMIT_SYNC_INTERVAL = float(os.environ.get('EMAIL_RATE_LIMIT_SYNC_INTERVAL', '1'))
+EMAIL_RATE_LIMIT_LOCAL_FRACTION = float(os.environ.get('EMAIL_RATE_LIMIT_LOCAL_FRACTION', '0.5'))
+EMAIL_RATE_LIMIT_REDIS_RETRY = float(os.environ.get('EMAIL_RATE_LIMIT_REDIS_RETRY', '5'))
+EMAIL_RATE_LIMIT_LOCAL_KEYS = int(os.environ.get('EMAIL_RATE_LIMIT_LOCAL_KEYS', '10000'))
+
+# Per-request profiling (core.instrumentation): a cProfile dump is written to REQUEST_PROFILE_DIR
+# for a sampled fraction of requests, or when the X-Profile-Request header carries REQUEST_PROFILE_TOKEN
+REQUEST_PROFILE_DIR = os.environ.get('REQUEST_PROFILE_DIR', str(BASE_DIR / 'profiles'))
+REQUEST_PROFILE_SAMPLE_RATE = float(os.environ.get('REQUEST_PROFILE_SAMPLE_RATE', '0'))
+REQUEST_PROFILE_TOKEN = os.environ.get('REQUEST_PROFILE_TOKEN', '')
+
+# Expired token purge (core.tasks.purge_expired_tokens)
+TOKEN_PURGE_CHUNK_SIZE = int(os.environ.get('TOKEN_PURGE_CHUNK_SIZE', '1000'))
+TOKEN_PURGE_PAUSE_SECONDS = float(os.environ.get('TOKEN_PURGE_PAUSE_SECONDS', '0.5'))
+TOKEN_PURGE_MAX_SECONDS = int(os.environ.get('TOKEN_PURGE_MAX_SECONDS', '600'))
+# Business hours (local time, [start, end)) during which the purge does not run
+TOKEN_PURGE_BUSINESS_HOURS = (8, 20)
+
 # CORS
 CORS_ALLOWED_ORIGINS = [
     "http://localhost:3000",
@@ -185,6 +271,27 @@ EMAIL_PORT = int(os.environ.get('EMAIL_PORT', '587'))
 EMAIL_USE_TLS = os.environ.get('EMAIL_USE_TLS', 'True').lower() == 'true'
 EMAIL_HOST_USER = os.environ.get('EMAIL_HOST_USER', '')
 EMAIL_HOST_PASSWORD = os.environ.get('EMAIL_HOST_PASSWORD', '')
+DEFAULT_FROM_EMAIL = os.environ.get('DEFAULT_FROM_EMAIL', 'noreply@localhost')
+FRONTEND_URL = os.environ.get('FRONTEND_URL', 'http://localhost:3000')
+
+# Email outbox (core.mail_queue): rows written with the originating transaction and drained
+# in batches over one SMTP connection. A drain starts EMAIL_BATCH_DELAY seconds after the
+# first commit and sends up to EMAIL_DRAIN_MAX_BATCHES batches of EMAIL_BATCH_SIZE
+EMAIL_BATCH_SIZE = int(os.environ.get('EMAIL_BATCH_SIZE', '100'))
+EMAIL_BATCH_DELAY = float(os.environ.get('EMAIL_BATCH_DELAY', '2'))
+EMAIL_DRAIN_MAX_BATCHES = int(os.environ.get('EMAIL_DRAIN_MAX_BATCHES', '50'))
+# Concurrent drains started when the backlog fills a whole batch (SKIP LOCKED keeps them disjoint)
+EMAIL_DRAIN_WORKERS = int(os.environ.get('EMAIL_DRAIN_WORKERS', '4'))
+# Seconds before a scheduled drain that never ran can be scheduled again
+EMAIL_DRAIN_SCHEDULE_TTL = int(os.environ.get('EMAIL_DRAIN_SCHEDULE_TTL', '60'))
+# A claimed message is offered to other workers again if not settled within this many seconds
+EMAIL_OUTBOX_LEASE_SECONDS = int(os.environ.get('EMAIL_OUTBOX_LEASE_SECONDS', '300'))
+# Sent and failed rows are removed by purge_expired_tokens after this many days
+EMAIL_OUTBOX_RETENTION_DAYS = int(os.environ.get('EMAIL_OUTBOX_RETENTION_DAYS', '7'))
+# Failed messages are retried with exponential backoff (seconds), then marked as failed
+EMAIL_MAX_RETRIES = int(os.environ.get('EMAIL_MAX_RETRIES', '5'))
+EMAIL_RETRY_BACKOFF = float(os.environ.get('EMAIL_RETRY_BACKOFF', '30'))
+EMAIL_RETRY_BACKOFF_MAX = float(os.environ.get('EMAIL_RETRY_BACKOFF_MAX', '3600'))
 
 # Security
 SECURE_BROWSER_XSS_FILTER = True
@@ -0,0 +1,29 @@
+import logging
+from django.contrib.auth import get_user_model
+from django.db import transaction
+from django.db.models.signals import post_save, post_delete
+from django.dispatch import receiver
+from .user_cache import user_cache
+
+User = get_user_model()
+
+logger = logging.getLogger(__name__)
+
+
+@receiver(post_save, sender=User)
+def refresh_cached_user(sender, instance, **kwargs):
+    """Atualiza o cache de usuários após o commit da alteração."""
+    def store():
+        try:
+            user_cache.store(instance)
+        except Exception as e:
+            logger.warning(f"Falha ao atualizar o cache do usuário {instance.pk}: {str(e)}")
+            user_cache.invalidate(instance.pk)
+
+    transaction.on_commit(store)
+
+
+@receiver(post_delete, sender=User)
+def invalidate_cached_user(sender, instance, **kwargs):
+    """Remove o usuário do cache após o commit da exclusão."""
+    transaction.on_commit(lambda: user_cache.invalidate(instance.pk))
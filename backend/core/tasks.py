@@ -5,18 +5,39 @@ Includes backup, health check, and maintenance tasks
 
 import os
 import json
+import time
 import logging
 from datetime import datetime, timedelta
+from django.conf import settings
 from django.core.management import call_command
 from django.db import connection
 from django.core.cache import cache
+from django.utils import timezone
 from celery import shared_task
+from prometheus_client import Counter, Histogram
 
 from backup_manager import BackupManager
 from key_manager import KeyManager
 
 logger = logging.getLogger(__name__)
 
+TOKEN_PURGE_DELETED = Counter(
+    'token_purge_deleted_rows_total',
+    'Expired rows deleted by purge_expired_tokens',
+    ['table']
+)
+TOKEN_PURGE_CHUNK_SECONDS = Histogram(
+    'token_purge_chunk_seconds',
+    'Time to delete one chunk of expired rows',
+    ['table'],
+    buckets=(0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5)
+)
+TOKEN_PURGE_RUNS = Counter(
+    'token_purge_runs_total',
+    'purge_expired_tokens runs by outcome',
+    ['status']
+)
+
 
 @shared_task
 def daily_backup():
@@ -135,15 +156,22 @@ def check_database_health():
 
 
 def check_redis_health():
-    """Check Redis connectivity"""
+    """Check Redis connectivity on the shared pools (no new connections per check)"""
+    from core.redis_clients import redis_pools
+    
     try:
-        cache.set('health_check', 'ok', 10)
-        value = cache.get('health_check')
+        results = {}
+        # Same pools the cache and EmailRateLimiter use
+        for use, decode_responses in (('cache', False), ('rate_limit', True)):
+            started = time.perf_counter()
+            redis_pools.client(use, decode_responses).ping()
+            results[use] = round((time.perf_counter() - started) * 1000, 3)
         
-        if value == 'ok':
-            return {'status': 'healthy'}
-        else:
-            return {'status': 'unhealthy', 'error': 'Redis read/write failed'}
+        return {
+            'status': 'healthy',
+            'ping_ms': results,
+            'pools': redis_pools.stats()
+        }
             
     except Exception as e:
         return {'status': 'unhealthy', 'error': str(e)}
@@ -192,34 +220,31 @@ def check_memory_usage():
 def check_key_rotation():
     """Check if keys need rotation and generate new ones if necessary"""
     try:
-        manager = KeyManager()
+        # Generation, rotation and pruning of retired keys run under the keys_dir lock
+        manager = KeyManager(settings.JWT_KEYS_DIR)
+        keys, generated = manager.ensure_keys()
         
-        if not manager.check_key_validity() or not manager.verify_key_integrity():
-            logger.warning("Keys are invalid or corrupted, generating new ones...")
-            keys = manager.generate_new_keys()
-            
+        if generated:
+            logger.warning("Keys were invalid, expired or corrupted; generated new ones")
             return {
                 'status': 'keys_regenerated',
                 'expires_at': keys['expires_at'].isoformat(),
                 'timestamp': datetime.now().isoformat()
             }
-        else:
-            keys = manager.get_keys()
-            days_until_expiry = (keys['expires_at'] - datetime.now()).days
-            
-            if days_until_expiry <= 30:
-                logger.warning(f"Keys will expire in {days_until_expiry} days")
-                return {
-                    'status': 'expiring_soon',
-                    'days_until_expiry': days_until_expiry,
-                    'timestamp': datetime.now().isoformat()
-                }
-            else:
-                return {
-                    'status': 'valid',
-                    'days_until_expiry': days_until_expiry,
-                    'timestamp': datetime.now().isoformat()
-                }
+        
+        days_until_expiry = (keys['expires_at'] - datetime.now(keys['expires_at'].tzinfo)).days
+        if days_until_expiry <= 30:
+            logger.warning(f"Keys will expire in {days_until_expiry} days")
+            return {
+                'status': 'expiring_soon',
+                'days_until_expiry': days_until_expiry,
+                'timestamp': datetime.now().isoformat()
+            }
+        return {
+            'status': 'valid',
+            'days_until_expiry': days_until_expiry,
+            'timestamp': datetime.now().isoformat()
+        }
                 
     except Exception as e:
         logger.error(f"Error in key rotation check: {str(e)}")
@@ -230,6 +255,180 @@ def check_key_rotation():
         }
 
 
+@shared_task
+def rebuild_token_revocation_index():
+    """Rebuild the Redis revocation index from the blacklisted tokens in Postgres"""
+    from core.services import revocation_index
+    
+    try:
+        indexed = revocation_index.rebuild()
+        logger.info(f"Token revocation index rebuilt with {indexed} entries")
+        
+        return {
+            'status': 'success',
+            'indexed': indexed,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error rebuilding token revocation index: {str(e)}")
+        return {
+            'status': 'error',
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }
+
+
+def purge_expired_rows(model, chunk_size, pause, deadline):
+    """
+    Delete expired rows of a token table in small chunks, resuming from the stored cursor
+    Rows deleted and time per chunk are exported as token_purge_* metrics
+    """
+    cursor_key = f"token_purge_cursor:{model._meta.db_table}"
+    cursor = cache.get(cursor_key)
+    expired = model.objects.filter(expires_at__lt=timezone.now())
+    
+    stats = {'deleted': 0, 'chunks': 0, 'chunk_seconds_max': 0.0, 'chunk_seconds_total': 0.0, 'complete': False}
+    
+    while time.monotonic() < deadline:
+        # Resume after the last chunk instead of rescanning dead index entries
+        page = expired.filter(expires_at__gte=cursor) if cursor else expired
+        rows = list(page.order_by('expires_at').values_list('pk', 'expires_at')[:chunk_size])
+        if not rows:
+            cache.delete(cursor_key)
+            stats['complete'] = True
+            break
+        
+        started = time.monotonic()
+        deleted, _ = model.objects.filter(pk__in=[pk for pk, _ in rows]).delete()
+        elapsed = time.monotonic() - started
+        
+        cursor = rows[-1][1]
+        cache.set(cursor_key, cursor, 86400)
+        
+        TOKEN_PURGE_DELETED.labels(table=model._meta.db_table).inc(deleted)
+        TOKEN_PURGE_CHUNK_SECONDS.labels(table=model._meta.db_table).observe(elapsed)
+        stats['deleted'] += deleted
+        stats['chunks'] += 1
+        stats['chunk_seconds_total'] += elapsed
+        stats['chunk_seconds_max'] = max(stats['chunk_seconds_max'], elapsed)
+        logger.debug(f"Purged {deleted} rows from {model._meta.db_table} in {elapsed:.3f}s")
+        
+        if len(rows) < chunk_size:
+            cache.delete(cursor_key)
+            stats['complete'] = True
+            break
+        
+        # Throttle between chunks so autovacuum and WAL shipping keep up
+        time.sleep(pause)
+    
+    stats['chunk_seconds_avg'] = round(stats['chunk_seconds_total'] / stats['chunks'], 4) if stats['chunks'] else 0.0
+    stats['chunk_seconds_total'] = round(stats['chunk_seconds_total'], 4)
+    stats['chunk_seconds_max'] = round(stats['chunk_seconds_max'], 4)
+    return stats
+
+
+@shared_task
+def purge_expired_tokens(force=False):
+    """Purge expired rows from all token tables in bounded, throttled chunks"""
+    from core.models import BlacklistedToken, RefreshToken, EmailVerificationToken, PasswordResetToken, EmailOutbox
+    
+    try:
+        start_hour, end_hour = settings.TOKEN_PURGE_BUSINESS_HOURS
+        if not force and start_hour <= timezone.localtime().hour < end_hour:
+            logger.info("Skipping expired token purge during business hours")
+            TOKEN_PURGE_RUNS.labels(status='skipped').inc()
+            return {
+                'status': 'skipped',
+                'reason': 'business_hours',
+                'timestamp': datetime.now().isoformat()
+            }
+        
+        deadline = time.monotonic() + settings.TOKEN_PURGE_MAX_SECONDS
+        tables = {}
+        for model in (BlacklistedToken, RefreshToken, EmailVerificationToken, PasswordResetToken, EmailOutbox):
+            tables[model._meta.db_table] = purge_expired_rows(
+                model,
+                chunk_size=settings.TOKEN_PURGE_CHUNK_SIZE,
+                pause=settings.TOKEN_PURGE_PAUSE_SECONDS,
+                deadline=deadline
+            )
+        
+        total_deleted = sum(table['deleted'] for table in tables.values())
+        logger.info(f"Expired token purge removed {total_deleted} rows")
+        status = 'success' if all(table['complete'] for table in tables.values()) else 'partial'
+        TOKEN_PURGE_RUNS.labels(status=status).inc()
+        
+        return {
+            'status': status,
+            'deleted': total_deleted,
+            'tables': tables,
+            'timestamp': datetime.now().isoformat()
+        }
+        
+    except Exception as e:
+        logger.error(f"Error purging expired tokens: {str(e)}")
+        TOKEN_PURGE_RUNS.labels(status='error').inc()
+        return {
+            'status': 'error',
+            'error': str(e),
+            'timestamp': datetime.now().isoformat()
+        }
+
+
+@shared_task(ignore_result=True)
+def send_queued_emails(fan_out=True):
+    """
+    Drain the email outbox in batches, each batch over one reused SMTP connection
+    Workers claim disjoint batches with SKIP LOCKED; when the backlog fills a whole
+    batch, up to EMAIL_DRAIN_WORKERS - 1 extra drains are started so idle workers join in
+    """
+    from core import mail_queue
+    
+    mail_queue.clear_drain_flag()
+    started = time.monotonic()
+    sent = failed = batches = 0
+    
+    while batches < settings.EMAIL_DRAIN_MAX_BATCHES:
+        messages = mail_queue.claim_batch(settings.EMAIL_BATCH_SIZE)
+        if not messages:
+            break
+        batches += 1
+        
+        if fan_out and batches == 1 and len(messages) == settings.EMAIL_BATCH_SIZE:
+            for _ in range(settings.EMAIL_DRAIN_WORKERS - 1):
+                send_queued_emails.apply_async(kwargs={'fan_out': False})
+        
+        batch_started = time.monotonic()
+        batch_sent, batch_failed = mail_queue.send_batch(messages)
+        mail_queue.EMAIL_BATCH_SECONDS.observe(time.monotonic() - batch_started)
+        
+        mail_queue.mark_sent(batch_sent)
+        for message, error in batch_failed:
+            mail_queue.mark_failed(message, error)
+        sent += len(batch_sent)
+        failed += len(batch_failed)
+    else:
+        # Limit reached: hand the rest over to a new drain instead of holding the worker
+        send_queued_emails.apply_async(kwargs={'fan_out': fan_out})
+    
+    elapsed = time.monotonic() - started
+    if sent or failed:
+        logger.info(
+            f"Email outbox drained: {sent} sent, {failed} failed in {batches} batches "
+            f"({sent / elapsed if elapsed else 0:.1f} emails/sec)"
+        )
+    
+    return {
+        'status': 'success',
+        'sent': sent,
+        'failed': failed,
+        'batches': batches,
+        'seconds': round(elapsed, 3),
+        'timestamp': datetime.now().isoformat()
+    }
+
+
 @shared_task
 def send_test_email():
     """Send a test email to verify email configuration"""
@@ -0,0 +1,17 @@
+import pytest
+from django.core.management import call_command
+
+
+@pytest.fixture(scope='session', autouse=True)
+def jwt_keys():
+    """Provision the signing keys the way the entrypoint does; the key ring only reads them"""
+    call_command('check_keys', verbosity=0)
+
+
+@pytest.fixture(autouse=True)
+def clear_cache():
+    """Every test starts from an empty shared cache (locmem in the test settings)"""
+    from django.core.cache import cache
+    cache.clear()
+    yield
+    cache.clear()
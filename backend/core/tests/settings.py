@@ -0,0 +1,50 @@
+"""
+Settings for the test suite (core/tests)
+core.settings with only the infrastructure swapped: an in-memory SQLite
+database, a local-memory cache, eager Celery, the locmem email backend and a
+throwaway JWT keys directory. INSTALLED_APPS, MIDDLEWARE and REST_FRAMEWORK
+are the production ones; test_startup.py also boots the unmodified core.settings
+"""
+
+import tempfile
+
+from core.settings import *  # noqa: F401,F403
+
+DEBUG = False
+ALLOWED_HOSTS = ['*']
+SECURE_SSL_REDIRECT = False
+STATICFILES_DIRS = []
+STATIC_ROOT = tempfile.mkdtemp(prefix='test-static-')
+
+DATABASES = {
+    'default': {
+        'ENGINE': 'django.db.backends.sqlite3',
+        'NAME': ':memory:',
+    }
+}
+
+CACHES = {
+    'default': {
+        'BACKEND': 'django.core.cache.backends.locmem.LocMemCache',
+    }
+}
+
+CELERY_BROKER_URL = 'memory://'
+CELERY_RESULT_BACKEND = 'cache+memory://'
+CELERY_TASK_ALWAYS_EAGER = True
+
+EMAIL_BACKEND = 'django.core.mail.backends.locmem.EmailBackend'
+
+# Hashing cost is not under test; the production hashers make every login take ~0.3s
+PASSWORD_HASHERS = ['django.contrib.auth.hashers.MD5PasswordHasher']
+PASSWORD_HASH_SHARED_LIMIT = False
+
+JWT_KEYS_DIR = tempfile.mkdtemp(prefix='test-keys-')
+
+LOGGING = {
+    'version': 1,
+    'disable_existing_loggers': False,
+    'root': {
+        'level': 'WARNING',
+    },
+}
@@ -0,0 +1,100 @@
+"""
+Authentication of Bearer requests: who is (and is not) request.user
+"""
+
+import uuid
+
+import pytest
+from django.contrib.auth import get_user_model
+from rest_framework.request import Request
+from rest_framework.test import APIClient, APIRequestFactory
+
+from core.authentication import JWTAuthentication
+from core.models import TokenUser
+from core.services import JWTService
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='ana@example.com', username='ana', password='s3cret-pass')
+
+
+def bearer_client(user):
+    client = APIClient()
+    tokens = JWTService.generate_tokens(user)
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    return client
+
+
+def test_me_returns_the_token_user(user):
+    response = bearer_client(user).get('/api/auth/me/')
+    assert response.status_code == 200
+    assert response.json()['email'] == 'ana@example.com'
+    assert response.json()['username'] == 'ana'
+
+
+def test_drf_authentication_without_the_middleware(user):
+    tokens = JWTService.generate_tokens(user)
+    request = Request(APIRequestFactory().get('/api/auth/me/', HTTP_AUTHORIZATION=f"Bearer {tokens['access']}"))
+    token_user, token = JWTAuthentication().authenticate(request)
+    assert token_user == user
+    assert token == tokens['access']
+
+
+def test_public_endpoint_ignores_an_invalid_bearer_token(user):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION='Bearer not-a-jwt')
+    response = client.post('/api/auth/login/', {'email': 'ana@example.com', 'password': 's3cret-pass'}, format='json')
+    assert response.status_code == 200
+    assert 'access' in response.json()['tokens']
+
+
+def test_protected_endpoint_challenges_with_bearer():
+    response = APIClient().get('/api/auth/me/')
+    assert response.status_code == 401
+    assert response['WWW-Authenticate'].startswith('Bearer')
+
+
+def test_token_user_id_is_a_uuid(user):
+    tokens = JWTService.generate_tokens(user)
+    token_user, error = JWTService.get_user_from_token(tokens['access'])
+    assert error is None
+    assert isinstance(token_user.pk, uuid.UUID)
+    assert token_user.pk == user.pk
+    assert token_user.is_active is True
+
+
+def test_deactivated_user_is_not_authenticated(user):
+    client = bearer_client(user)
+    assert client.get('/api/auth/me/').status_code == 200
+
+    # The record is already cached: the post_save signal must refresh it
+    user.is_active = False
+    user.save()
+
+    assert client.get('/api/auth/me/').status_code == 401
+
+
+def test_deleted_user_is_not_authenticated(user):
+    client = bearer_client(user)
+    assert client.get('/api/auth/me/').status_code == 200
+
+    user.delete()
+
+    assert client.get('/api/auth/me/').status_code == 401
+
+
+def test_deleted_user_attributes_raise_attribute_error(user):
+    tokens = JWTService.generate_tokens(user)
+    token_user, _ = JWTService.get_user_from_token(tokens['access'])
+    User.objects.filter(pk=user.pk).delete()
+
+    orphan = TokenUser(token_user.payload)
+    assert orphan.get_user() is None
+    assert orphan.is_active is False
+    with pytest.raises(AttributeError):
+        orphan.username
@@ -0,0 +1,287 @@
+"""
+backup_manager: compressor selection, dump and restore arguments, restore streaming and progress
+"""
+
+import gzip
+import json
+
+import pytest
+
+import backup_manager
+from backup_manager import BackupManager
+
+
+@pytest.fixture
+def installed(monkeypatch):
+    """Stand-in for shutil.which: only the named tools are installed"""
+    tools = set()
+    monkeypatch.setattr(backup_manager.shutil, 'which', lambda name: f'/usr/bin/{name}' if name in tools else None)
+    return tools
+
+
+def manager(tmp_path, **kwargs):
+    kwargs.setdefault('jobs', 4)
+    return BackupManager(backup_dir=tmp_path, **kwargs)
+
+
+@pytest.mark.parametrize('tools, expected', [
+    ({'zstd', 'pigz', 'gzip'}, 'zstd'),
+    ({'pigz', 'gzip'}, 'pigz'),
+    ({'gzip'}, 'gzip'),
+    (set(), 'python'),
+])
+def test_auto_picks_the_fastest_installed_compressor(tmp_path, installed, tools, expected):
+    installed.update(tools)
+    assert manager(tmp_path).resolve_compressor() == expected
+
+
+def test_configured_compressor_must_be_installed(tmp_path, installed):
+    with pytest.raises(RuntimeError):
+        manager(tmp_path, compressor='zstd').resolve_compressor()
+    with pytest.raises(ValueError):
+        manager(tmp_path, compressor='lz4').resolve_compressor()
+
+
+def test_unknown_format_is_rejected(tmp_path):
+    with pytest.raises(ValueError):
+        manager(tmp_path, backup_format='tar')
+
+
+def test_compressors_use_every_job(tmp_path):
+    assert manager(tmp_path).compress_command('zstd') == ['zstd', '-q', '-3', '-T4', '-c']
+    assert manager(tmp_path).compress_command('pigz') == ['pigz', '-6', '-p', '4', '-c']
+
+
+def test_dump_arguments_per_format(tmp_path, monkeypatch):
+    plain = manager(tmp_path).dump_command()
+    assert plain[0] == 'pg_dump'
+    assert plain[-2:] == ['--clean', '--if-exists']
+
+    # Custom archives leave compression to the external compressor
+    assert manager(tmp_path, backup_format='custom').dump_command()[-3:] == ['-Fc', '-Z', '0']
+
+    directory = manager(tmp_path, backup_format='directory')
+    monkeypatch.setattr(directory, 'pg_dump_version', lambda: 16)
+    assert directory.dump_command(tmp_path / 'x.dir')[-7:] == [
+        '-Fd', '-j', '4', '--compress', 'zstd:3', '-f', str(tmp_path / 'x.dir')
+    ]
+    monkeypatch.setattr(directory, 'pg_dump_version', lambda: 15)
+    assert directory.dump_command(tmp_path / 'x.dir')[-3] == '6'
+
+
+@pytest.mark.parametrize('filename, expected', [
+    ('backup_app_20240101_000000.sql.zst', 'plain'),
+    ('backup_app_20240101_000000.sql.gz', 'plain'),
+    ('backup_app_20240101_000000.sql', 'plain'),
+    ('backup_app_20240101_000000.dump.zst', 'custom'),
+    ('backup_app_20240101_000000.dump', 'custom'),
+    ('backup_app_20240101_000000.dir', 'directory'),
+    ('backup_app_20240101_000000.tar.gz', None),
+    ('notes.txt', None),
+])
+def test_backup_format_of(filename, expected):
+    assert backup_manager.backup_format_of(filename) == expected
+
+
+@pytest.mark.parametrize('tools, filename, expected', [
+    ({'zstd', 'pigz', 'gzip'}, 'b.sql.zst', ['zstd', '-q', '-d', '-c']),
+    ({'zstd', 'pigz', 'gzip'}, 'b.sql.gz', ['pigz', '-d', '-c']),
+    ({'gzip'}, 'b.dump.gz', ['gzip', '-d', '-c']),
+    # Python's gzip module stands in for a missing tool
+    (set(), 'b.sql.gz', None),
+    ({'zstd'}, 'b.sql', None),
+])
+def test_decompress_command(tmp_path, installed, tools, filename, expected):
+    installed.update(tools)
+    assert manager(tmp_path).decompress_command(tmp_path / filename) == expected
+
+
+def test_zstd_backups_need_zstd(tmp_path, installed):
+    with pytest.raises(RuntimeError):
+        manager(tmp_path).decompress_command(tmp_path / 'b.sql.zst')
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+
+def test_progress_reports_at_most_every_interval(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(backup_manager.time, 'monotonic', clock)
+    reports = []
+    progress = backup_manager.TransferProgress('psql', 1000, report=reports.append, interval=5)
+
+    clock.now += 1
+    progress.update(100)
+    assert reports == []
+
+    clock.now += 4
+    progress.update(150)
+    assert len(reports) == 1
+    assert reports[0]['percent'] == 25.0
+    assert reports[0]['rate'] == 50.0
+    assert reports[0]['eta'] == 15.0
+
+    clock.now += 1
+    progress.update(750)
+    progress.finish()
+    assert len(reports) == 2
+    assert reports[-1]['percent'] == 100.0
+    assert reports[-1]['eta'] == 0
+
+
+def test_progress_without_a_total_has_no_percent_or_eta():
+    reports = []
+    progress = backup_manager.TransferProgress('pg_restore', None, 'items', report=reports.append, interval=60)
+    progress.update(3)
+    progress.finish()
+    assert reports[-1]['percent'] is None
+    assert reports[-1]['eta'] is None
+    assert reports[-1]['done'] == 3
+
+
+DUMP = b'CREATE TABLE t (id int);\n' * 100000
+
+
+def stream(tmp_path, backup_path, sink):
+    reports = []
+    progress = backup_manager.TransferProgress('psql', backup_path.stat().st_size, report=reports.append)
+    with open(tmp_path / 'stderr', 'wb') as stderr:
+        manager(tmp_path)._stream_into(backup_path, sink, None, stderr, progress)
+    return reports[-1]
+
+
+@pytest.mark.parametrize('compress', [None, ['gzip', '-c'], ['zstd', '-q', '-c']])
+def test_stream_into_a_file_decompresses(tmp_path, compress):
+    if compress is None:
+        backup_path = tmp_path / 'b.sql'
+        backup_path.write_bytes(DUMP)
+    else:
+        if not backup_manager.shutil.which(compress[0]):
+            pytest.skip(f'{compress[0]} not installed')
+        backup_path = tmp_path / ('b.sql.gz' if compress[0] == 'gzip' else 'b.sql.zst')
+        with open(backup_path, 'wb') as output:
+            backup_manager.subprocess.run(compress, input=DUMP, stdout=output, check=True)
+
+    with open(tmp_path / 'restored.sql', 'wb') as sink:
+        status = stream(tmp_path, backup_path, sink)
+    assert (tmp_path / 'restored.sql').read_bytes() == DUMP
+    # Progress counts backup file bytes
+    assert status['done'] == backup_path.stat().st_size
+    assert status['percent'] == 100.0
+
+
+def test_stream_into_gzip_without_external_tools(tmp_path, installed):
+    backup_path = tmp_path / 'b.sql.gz'
+    backup_path.write_bytes(gzip.compress(DUMP))
+    with open(tmp_path / 'restored.sql', 'wb') as sink:
+        stream(tmp_path, backup_path, sink)
+    assert (tmp_path / 'restored.sql').read_bytes() == DUMP
+
+
+def test_stream_into_a_restore_command(tmp_path):
+    backup_path = tmp_path / 'b.sql'
+    backup_path.write_bytes(DUMP)
+    output = tmp_path / 'restored.sql'
+    stream(tmp_path, backup_path, ['sh', '-c', f'cat > {output}'])
+    assert output.read_bytes() == DUMP
+
+
+def test_failing_restore_command_is_reported(tmp_path):
+    backup_path = tmp_path / 'b.sql'
+    backup_path.write_bytes(DUMP)
+    # Exits without reading its input: the writer gets a broken pipe, the exit status wins
+    with pytest.raises(backup_manager.subprocess.CalledProcessError) as error:
+        stream(tmp_path, backup_path, ['sh', '-c', 'exit 3'])
+    assert error.value.returncode == 3
+
+
+def test_restore_arguments(tmp_path):
+    restore = manager(tmp_path)
+    assert restore.restore_command('plain', 'app_restore')[0] == 'psql'
+    assert restore.restore_command('plain', 'app_restore')[-7:] == [
+        '-d', 'app_restore', '-v', 'ON_ERROR_STOP=1', '--single-transaction', '-f', '-'
+    ]
+    # One job: pg_restore reads the archive from stdin
+    assert restore.restore_command('custom', 'app_restore')[-2:] == ['-d', 'app_restore']
+    assert restore.restore_command('directory', 'app_restore', tmp_path / 'b.dir')[-6:] == [
+        '-d', 'app_restore', '--verbose', '-j', '4', str(tmp_path / 'b.dir')
+    ]
+
+
+TOC = b"""\
+;
+; Archive created at 2024-01-01 00:00:00 UTC
+;
+215; 1259 16390 TABLE public users postgres
+216; 1259 16398 TABLE public django_migrations postgres
+217; 1259 16405 TABLE audit events postgres
+3310; 0 16390 TABLE DATA public users postgres
+"""
+
+
+def test_toc_tables_lists_public_tables():
+    assert BackupManager.toc_tables(TOC) == {'users', 'django_migrations'}
+
+
+def test_manifest_is_read_from_the_backup_metadata(tmp_path):
+    (tmp_path / 'backup_app_20240101_000000.json').write_text(json.dumps({'tables': {'users': 3}}))
+    restore = manager(tmp_path)
+    assert restore.read_manifest('backup_app_20240101_000000.sql.zst') == {'users': 3}
+    assert restore.read_manifest('backup_app_20240101_000000.dir') == {'users': 3}
+    assert restore.read_manifest('backup_app_20231231_000000.dump') is None
+
+
+@pytest.fixture
+def restored(tmp_path, monkeypatch):
+    """A restored database answering validate_database's queries"""
+    restore = manager(tmp_path)
+    rows = {'users': 100, 'django_migrations': 20}
+
+    def psql(database, sql, env=None):
+        if sql == backup_manager.ROW_COUNTS_SQL:
+            return '\n'.join(f'{table}|{count}' for table, count in rows.items())
+        if 'django_migrations' in sql:
+            return '\n'.join(f'core.{number:04d}' for number in range(rows.get('django_migrations', 0)))
+        raise AssertionError(sql)
+
+    monkeypatch.setattr(restore, '_psql', psql)
+    return restore, rows
+
+
+def test_validation_passes_when_the_restore_matches(restored):
+    restore, rows = restored
+    result = restore.validate_database('app_restore', toc_tables={'users'}, manifest=dict(rows))
+    assert result['tables'] == 2
+    assert result['checked_against'] == ['toc', 'manifest']
+    assert result['row_count_differences'] == {}
+
+
+def test_validation_fails_on_a_table_missing_from_the_toc(restored):
+    restore, _ = restored
+    with pytest.raises(RuntimeError, match='missing tables: sessions'):
+        restore.validate_database('app_restore', toc_tables={'users', 'sessions'})
+
+
+def test_validation_fails_on_rows_missing_from_the_manifest(restored):
+    restore, rows = restored
+    with pytest.raises(RuntimeError, match='fewer rows than the backup manifest in: users'):
+        restore.validate_database('app_restore', manifest={'users': 200, 'django_migrations': 20})
+
+
+def test_small_row_count_drift_is_reported(restored, monkeypatch):
+    restore, _ = restored
+    monkeypatch.setenv('BACKUP_ROW_COUNT_TOLERANCE', '0.05')
+    result = restore.validate_database('app_restore', manifest={'users': 104, 'django_migrations': 20})
+    assert result['row_count_differences'] == {'users': {'manifest': 104, 'restored': 100}}
+
+
+def test_validation_fails_without_migrations(restored):
+    restore, rows = restored
+    del rows['django_migrations']
+    with pytest.raises(RuntimeError, match='no django_migrations table'):
+        restore.validate_database('app_restore')
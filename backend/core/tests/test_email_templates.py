@@ -0,0 +1,34 @@
+"""
+Compiled email templates (core.email_templates)
+"""
+
+from django.utils import translation
+
+from core.email_templates import email_templates
+
+
+def contexts(n):
+    return (
+        {'user': {'first_name': f'user{i}', 'username': f'user{i}'}, 'verification_url': f'https://example.com/v/{i}', 'expires_in': 24}
+        for i in range(n)
+    )
+
+
+def test_render_many_matches_render():
+    bodies = list(email_templates.render_many('verification', contexts(3)))
+    assert bodies == [email_templates.render('verification', context) for context in contexts(3)]
+
+
+def test_render_many_does_not_leak_the_locale_between_items():
+    with translation.override('en-us'):
+        rendered = email_templates.render_many('verification', contexts(3), locale='pt-br')
+        for _ in rendered:
+            # The caller's language is back in place while it holds each item
+            assert translation.get_language() == 'en-us'
+    assert translation.get_language() != 'pt-br'
+
+
+def test_render_many_keeps_each_message_variables_apart():
+    first, second = email_templates.render_many('verification', contexts(2), common={'site': 'x'})
+    assert 'user0' in first and 'user1' not in first
+    assert 'user1' in second and 'user0' not in second
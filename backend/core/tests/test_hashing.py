@@ -0,0 +1,96 @@
+"""
+Password hashing limit (core.hashing)
+"""
+
+import threading
+
+import pytest
+import redis
+from django.contrib.auth import get_user_model
+from django.contrib.auth.hashers import PBKDF2SHA1PasswordHasher
+
+from core.hashing import PasswordHashBusy, PasswordHashLimiter
+
+User = get_user_model()
+
+
+def occupy(limiter, count):
+    """Hold `count` hashing slots until the returned event is set"""
+    release, started = threading.Event(), threading.Barrier(count + 1)
+
+    def hold():
+        started.wait()
+        release.wait()
+
+    threads = [threading.Thread(target=limiter.run, args=('check', hold)) for _ in range(count)]
+    for thread in threads:
+        thread.start()
+    started.wait()
+    return release, threads
+
+
+def test_rejects_when_the_queue_is_full():
+    limiter = PasswordHashLimiter(max_workers=1, max_queue=0, shared=False)
+    release, threads = occupy(limiter, 1)
+    try:
+        with pytest.raises(PasswordHashBusy):
+            limiter.run('check', lambda: None)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+    assert limiter.run('check', lambda: 'ok') == 'ok'
+
+
+def test_rejects_after_waiting_queue_timeout():
+    limiter = PasswordHashLimiter(max_workers=1, max_queue=1, queue_timeout=0.05, shared=False)
+    release, threads = occupy(limiter, 1)
+    try:
+        with pytest.raises(PasswordHashBusy):
+            limiter.run('check', lambda: None)
+    finally:
+        release.set()
+        for thread in threads:
+            thread.join()
+
+
+def test_falls_back_to_process_limit_when_redis_fails(monkeypatch):
+    limiter = PasswordHashLimiter(max_workers=1, max_queue=0, shared=True)
+
+    def redis_down(*args):
+        raise redis.ConnectionError('down')
+
+    monkeypatch.setattr(limiter, '_take', redis_down)
+    assert limiter.run('check', lambda: 'ok') == 'ok'
+    assert not limiter._redis_available()
+
+
+@pytest.mark.django_db
+def test_verified_password_is_never_shed_by_the_rehash(settings):
+    # A legacy hasher after the preferred one makes check_password ask for a rehash
+    settings.PASSWORD_HASHERS = [
+        'django.contrib.auth.hashers.MD5PasswordHasher',
+        'django.contrib.auth.hashers.PBKDF2SHA1PasswordHasher',
+    ]
+    user = User.objects.create(
+        email='davi@example.com', username='davi',
+        password=PBKDF2SHA1PasswordHasher().encode('s3cret-pass', 'salt', iterations=1),
+    )
+    limiter = PasswordHashLimiter(max_workers=1, max_queue=0, shared=False)
+    calls = []
+    original_make_password = limiter.make_password
+
+    def make_password_busy(password):
+        calls.append(password)
+        raise PasswordHashBusy('no capacity')
+
+    limiter.make_password = make_password_busy
+    assert limiter.check_password(user, 's3cret-pass') is True
+    assert calls == ['s3cret-pass']
+    user.refresh_from_db()
+    assert user.password.startswith('md5$') is False
+
+    limiter.make_password = original_make_password
+    assert limiter.check_password(user, 's3cret-pass') is True
+    user.refresh_from_db()
+    assert user.password.startswith('md5$')
@@ -0,0 +1,95 @@
+"""
+RequestInstrumentationMiddleware: per-view labels and opt-in request profiling
+"""
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.http import HttpResponse
+from django.test import RequestFactory
+from prometheus_client import REGISTRY
+from rest_framework.test import APIClient
+
+from core import instrumentation
+from core.instrumentation import UNRESOLVED_VIEW, RequestInstrumentationMiddleware
+from core.services import JWTService
+
+User = get_user_model()
+
+PROFILE_TOKEN = 'profile-me-please'
+
+
+def requests_observed(view):
+    return REGISTRY.get_sample_value('django_view_sql_queries_count', {'view': view}) or 0
+
+
+@pytest.mark.django_db
+def test_labels_use_the_resolved_view_name():
+    user = User.objects.create_user(email='gil@example.com', username='gil', password='s3cret-pass')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {JWTService.generate_tokens(user)['access']}")
+    before = requests_observed('auth-me')
+
+    assert client.get('/api/auth/me/').status_code == 200
+    assert requests_observed('auth-me') == before + 1
+    assert requests_observed('/api/auth/me/') == 0
+
+
+@pytest.mark.django_db
+def test_unmatched_paths_share_one_label():
+    before = requests_observed(UNRESOLVED_VIEW)
+    APIClient().get('/no-such-page-3f1c/')
+    assert requests_observed(UNRESOLVED_VIEW) == before + 1
+    assert requests_observed('/no-such-page-3f1c/') == 0
+
+
+@pytest.fixture
+def profile_dir(settings, tmp_path):
+    settings.REQUEST_PROFILE_DIR = str(tmp_path)
+    settings.REQUEST_PROFILE_TOKEN = PROFILE_TOKEN
+    settings.REQUEST_PROFILE_SAMPLE_RATE = 0.0
+    return tmp_path
+
+
+def run(headers=None):
+    middleware = RequestInstrumentationMiddleware(lambda request: HttpResponse())
+    middleware(RequestFactory().get('/api/health/', **(headers or {})))
+
+
+def profiles(directory):
+    return list(directory.glob('*.prof'))
+
+
+def test_requests_are_not_profiled_by_default(profile_dir):
+    run()
+    assert profiles(profile_dir) == []
+
+
+def test_valid_header_token_profiles_the_request(profile_dir):
+    run({'HTTP_X_PROFILE_REQUEST': PROFILE_TOKEN})
+    assert len(profiles(profile_dir)) == 1
+
+
+def test_invalid_header_token_is_ignored(profile_dir):
+    run({'HTTP_X_PROFILE_REQUEST': 'guessed-token'})
+    assert profiles(profile_dir) == []
+
+
+def test_header_is_ignored_without_a_configured_token(profile_dir, settings):
+    settings.REQUEST_PROFILE_TOKEN = ''
+    run({'HTTP_X_PROFILE_REQUEST': ''})
+    run({'HTTP_X_PROFILE_REQUEST': 'anything'})
+    assert profiles(profile_dir) == []
+
+
+def test_sampling_hit_profiles_the_request(profile_dir, settings, monkeypatch):
+    settings.REQUEST_PROFILE_SAMPLE_RATE = 0.1
+    monkeypatch.setattr(instrumentation.random, 'random', lambda: 0.05)
+    run()
+    assert len(profiles(profile_dir)) == 1
+
+
+def test_sampling_miss_does_not_profile(profile_dir, settings, monkeypatch):
+    settings.REQUEST_PROFILE_SAMPLE_RATE = 0.1
+    monkeypatch.setattr(instrumentation.random, 'random', lambda: 0.5)
+    run()
+    assert profiles(profile_dir) == []
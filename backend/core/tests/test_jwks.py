@@ -0,0 +1,85 @@
+"""
+JWKS publication (/.well-known/jwks.json) and verification of tokens by `kid`
+"""
+
+import jwt
+import pytest
+from django.contrib.auth import get_user_model
+from django.test import Client
+
+from core import services, views
+from core.jwt_keys import JWTKeyRing
+from core.services import JWTService
+from key_manager import KeyManager
+
+User = get_user_model()
+
+
+@pytest.fixture
+def manager(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    manager.ensure_keys()
+    return manager
+
+
+@pytest.fixture
+def ring(manager, monkeypatch):
+    ring = JWTKeyRing(keys_dir=manager.keys_dir, reload_interval=0, miss_reload_interval=0)
+    monkeypatch.setattr(services, 'key_ring', ring)
+    monkeypatch.setattr(views, 'key_ring', ring)
+    return ring
+
+
+def kid_of(token):
+    return jwt.get_unverified_header(token)['kid']
+
+
+def test_jwks_is_cacheable(settings, ring):
+    settings.JWT_JWKS_MAX_AGE = 120
+    response = Client().get('/.well-known/jwks.json')
+
+    assert response.status_code == 200
+    assert response['Content-Type'] == 'application/json'
+    assert response['Cache-Control'] == 'public, max-age=120'
+    assert response['ETag'] == ring.jwks()[1]
+    [key] = response.json()['keys']
+    assert (key['kid'], key['use'], key['alg']) == (ring.signing_key()[0], 'sig', 'RS256')
+
+
+def test_jwks_answers_304_to_a_matching_etag(ring):
+    etag = ring.jwks()[1]
+    response = Client().get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH=etag)
+
+    assert response.status_code == 304
+    assert response.content == b''
+    assert response['ETag'] == etag
+    assert response['Cache-Control'].startswith('public, max-age=')
+
+    assert Client().get('/.well-known/jwks.json', HTTP_IF_NONE_MATCH='"stale"').status_code == 200
+
+
+@pytest.mark.django_db
+def test_tokens_signed_before_a_rotation_stay_valid(manager, ring):
+    user = User.objects.create_user(email='rui@example.com', username='rui', password='s3cret-pass')
+    old = JWTService.generate_tokens(user)['access']
+    old_etag = ring.jwks()[1]
+
+    manager.ensure_keys(force_new=True)
+    new = JWTService.generate_tokens(user)['access']
+
+    assert kid_of(new) != kid_of(old)
+    assert JWTService.verify_token(old)[1] is None
+    assert JWTService.verify_token(new)[1] is None
+    # Both keys are published, under a new ETag
+    assert ring.jwks()[1] != old_etag
+    assert {kid_of(old), kid_of(new)} <= {key['kid'] for key in Client().get('/.well-known/jwks.json').json()['keys']}
+
+
+def test_unknown_kid_is_rejected(ring, tmp_path_factory):
+    foreign_dir = str(tmp_path_factory.mktemp('foreign-keys'))
+    KeyManager(foreign_dir).ensure_keys()
+    kid, private_key = JWTKeyRing(keys_dir=foreign_dir).signing_key()
+    token = jwt.encode({'user_id': 'x', 'type': 'access'}, private_key, algorithm='RS256', headers={'kid': kid})
+
+    assert ring.verification_key(kid) is None
+    assert JWTService.verify_token(token) == (None, 'Invalid token')
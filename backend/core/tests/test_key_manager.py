@@ -0,0 +1,97 @@
+import multiprocessing
+import os
+
+import pytest
+
+from core.jwt_keys import JWTKeyRing
+from key_manager import KeyManager, KeysUnavailable
+
+
+def ensure_and_report(keys_dir, queue):
+    keys, generated = KeyManager(keys_dir).ensure_keys()
+    queue.put((keys['signing_key'], generated))
+
+
+def test_load_keys_is_read_only(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    with pytest.raises(KeysUnavailable):
+        manager.load_keys()
+    assert os.listdir(tmp_path) == []
+
+
+def test_key_ring_fails_fast_without_keys(tmp_path):
+    ring = JWTKeyRing(keys_dir=str(tmp_path))
+    with pytest.raises(KeysUnavailable):
+        ring.signing_key()
+    assert os.listdir(tmp_path) == []
+
+
+def test_ensure_keys_generates_once(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    first, generated = manager.ensure_keys()
+    assert generated
+    second, generated = manager.ensure_keys()
+    assert not generated
+    assert second['signing_key'] == first['signing_key']
+
+
+def test_concurrent_processes_generate_a_single_key(tmp_path):
+    context = multiprocessing.get_context('spawn')
+    queue = context.Queue()
+    processes = [context.Process(target=ensure_and_report, args=(str(tmp_path), queue)) for _ in range(4)]
+    for process in processes:
+        process.start()
+    results = [queue.get(timeout=60) for _ in processes]
+    for process in processes:
+        process.join()
+
+    assert len({signing_key for signing_key, _ in results}) == 1
+    assert sum(generated for _, generated in results) == 1
+
+
+def test_rotations_in_the_same_second_keep_every_retired_key(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    signing_keys = []
+    for _ in range(3):
+        manager.generate_new_keys()
+        signing_keys.append(manager.load_keys()['signing_key'])
+
+    retired = manager.get_retired_public_keys()
+    assert len(retired) == 2
+    assert set(retired) == {manager.get_public_key_pem(key) for key in signing_keys[:2]}
+
+
+def test_retiring_the_same_key_twice_is_a_no_op(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    manager.generate_new_keys()
+    assert manager.retire_signing_key() == manager.retire_signing_key()
+    assert len(manager.get_retired_public_keys()) == 1
+
+
+def test_reading_retired_keys_never_deletes(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    manager.generate_new_keys()
+    manager.generate_new_keys()
+    path = os.path.join(manager.retired_keys_dir, os.listdir(manager.retired_keys_dir)[0])
+    os.utime(path, (0, 0))
+
+    assert len(manager.get_retired_public_keys()) == 1
+    assert os.path.exists(path)
+
+    assert manager.prune_retired_keys(max_age_days=400) == 1
+    assert manager.get_retired_public_keys() == []
+
+
+def test_key_ring_picks_up_a_rotation(tmp_path):
+    manager = KeyManager(str(tmp_path))
+    manager.ensure_keys()
+    ring = JWTKeyRing(keys_dir=str(tmp_path), reload_interval=0)
+    old_kid, _ = ring.signing_key()
+
+    manager.ensure_keys(force_new=True)
+    new_kid, _ = ring.signing_key()
+
+    assert new_kid != old_kid
+    # Tokens signed before the rotation stay verifiable
+    assert ring.verification_key(old_kid) is not None
+    assert ring.verification_key(new_kid) is not None
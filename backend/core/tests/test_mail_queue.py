@@ -0,0 +1,78 @@
+"""
+Email outbox (core.mail_queue): retries with backoff and giving up
+"""
+
+from datetime import timedelta
+
+import pytest
+from django.core import mail
+from django.core.mail.backends.base import BaseEmailBackend
+from django.utils import timezone
+
+from core import mail_queue
+from core.models import EmailOutbox
+from core.tasks import send_queued_emails
+
+pytestmark = pytest.mark.django_db
+
+
+class FailingEmailBackend(BaseEmailBackend):
+    """Email backend whose SMTP server rejects everything"""
+
+    def send_messages(self, email_messages):
+        raise ConnectionRefusedError('smtp down')
+
+
+@pytest.fixture
+def message():
+    return mail_queue.enqueue('Olá', '<p>Olá</p>', ['gil@example.com'], text='Olá', kind='test')
+
+
+def test_drain_sends_pending_messages(message):
+    send_queued_emails(fan_out=False)
+    message.refresh_from_db()
+    assert message.status == EmailOutbox.STATUS_SENT
+    assert message.attempts == 1
+    assert [email.to for email in mail.outbox] == [['gil@example.com']]
+
+
+def test_failed_send_is_retried_with_backoff(message, settings):
+    settings.EMAIL_BACKEND = 'core.tests.test_mail_queue.FailingEmailBackend'
+    before = timezone.now()
+    send_queued_emails(fan_out=False)
+
+    message.refresh_from_db()
+    assert message.status == EmailOutbox.STATUS_PENDING
+    assert message.attempts == 1
+    assert 'smtp down' in message.last_error
+    # First retry after EMAIL_RETRY_BACKOFF (30s) +-20% jitter, not on the next drain
+    assert before + timedelta(seconds=23) < message.available_at < before + timedelta(seconds=37)
+    assert mail_queue.claim_batch(10) == []
+
+
+def test_retry_delay_doubles_up_to_the_cap(settings):
+    settings.EMAIL_RETRY_BACKOFF = 10
+    settings.EMAIL_RETRY_BACKOFF_MAX = 60
+    for attempts, expected in ((1, 10), (2, 20), (3, 40), (4, 60), (10, 60)):
+        assert expected * 0.8 <= mail_queue.retry_delay(attempts) <= expected * 1.2
+
+
+def test_gives_up_after_max_retries(message, settings):
+    settings.EMAIL_MAX_RETRIES = 2
+    for attempt in range(1, 4):
+        EmailOutbox.objects.filter(pk=message.pk).update(available_at=timezone.now())
+        claimed = mail_queue.claim_batch(10)
+        assert [m.attempts for m in claimed] == [attempt]
+        delay = mail_queue.mark_failed(claimed[0], 'smtp down')
+        assert (delay is None) == (attempt == 3)
+
+    message.refresh_from_db()
+    assert message.status == EmailOutbox.STATUS_FAILED
+    assert message.expires_at is not None
+
+
+def test_claim_takes_a_lease(message, settings):
+    settings.EMAIL_OUTBOX_LEASE_SECONDS = 300
+    assert [m.pk for m in mail_queue.claim_batch(10)] == [message.pk]
+    # Claimed and not yet marked: another worker does not get it until the lease expires
+    assert mail_queue.claim_batch(10) == []
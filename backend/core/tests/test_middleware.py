@@ -0,0 +1,75 @@
+"""
+JWTAuthenticationMiddleware on its sync and async paths
+"""
+
+import pytest
+from asgiref.sync import async_to_sync
+from django.contrib.auth import get_user_model
+from django.contrib.auth.models import AnonymousUser
+from django.db import connection
+from django.http import HttpResponse
+from django.test import RequestFactory
+from django.test.utils import CaptureQueriesContext
+
+from core.authentication import JWT_AUTH_ATTR
+from core.middleware import JWTAuthenticationMiddleware
+from core.services import JWTService
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def access_token():
+    user = User.objects.create_user(email='caio@example.com', username='caio', password='s3cret-pass')
+    return JWTService.generate_tokens(user)['access']
+
+
+def anonymous_request(token):
+    request = RequestFactory().get('/api/health/', HTTP_AUTHORIZATION=f'Bearer {token}')
+    request.user = AnonymousUser()
+    return request
+
+
+def test_valid_token_sets_request_user(access_token):
+    request = anonymous_request(access_token)
+    JWTAuthenticationMiddleware(lambda request: HttpResponse())(request)
+    assert request.user.is_authenticated
+    assert request.user.email == 'caio@example.com'
+    # DRF's JWTAuthentication reuses this result instead of decoding again
+    assert getattr(request, JWT_AUTH_ATTR)[0] == access_token
+
+
+def test_invalid_token_leaves_request_anonymous():
+    request = anonymous_request('not-a-jwt')
+    JWTAuthenticationMiddleware(lambda request: HttpResponse())(request)
+    assert not request.user.is_authenticated
+    assert request.auth_error == 'Invalid token'
+
+
+def test_async_path_verifies_the_token():
+    async def get_response(request):
+        return HttpResponse()
+
+    middleware = JWTAuthenticationMiddleware(get_response)
+    request = anonymous_request('not-a-jwt')
+    async_to_sync(middleware)(request)
+    assert not request.user.is_authenticated
+    assert request.auth_error == 'Invalid token'
+
+
+def test_async_path_serves_repeat_requests_from_the_cache(access_token, caplog):
+    async def get_response(request):
+        return HttpResponse()
+
+    middleware = JWTAuthenticationMiddleware(get_response)
+    async_to_sync(middleware)(anonymous_request(access_token))
+
+    request = anonymous_request(access_token)
+    with CaptureQueriesContext(connection) as queries:
+        async_to_sync(middleware)(request)
+    assert request.user.is_authenticated
+    # Generation, revocation index and user record all come from the cache
+    assert len(queries) == 0
+    assert not [record for record in caplog.records if record.levelname == 'WARNING']
@@ -0,0 +1,79 @@
+"""
+Per-worker LRU of verified JWT payloads (core.services.TokenPayloadCache)
+"""
+
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from core.services import JWTService, TokenPayloadCache, payload_cache, token_digest
+
+User = get_user_model()
+
+
+def payload(ttl=60):
+    return {'user_id': 'u', 'exp': time.time() + ttl}
+
+
+def test_counts_hits_and_misses():
+    cache = TokenPayloadCache(maxsize=4)
+    assert cache.get('a') is None
+    cache.set('a', payload())
+    assert cache.get('a')['user_id'] == 'u'
+    assert cache.get('a') is not None
+
+    assert cache.stats() == {'size': 1, 'maxsize': 4, 'hits': 2, 'misses': 1, 'hit_ratio': 0.6667}
+
+
+def test_evicts_the_least_recently_used():
+    cache = TokenPayloadCache(maxsize=2)
+    cache.set('a', payload())
+    cache.set('b', payload())
+    cache.get('a')
+    cache.set('c', payload())
+
+    assert cache.get('b') is None
+    assert cache.get('a') is not None
+    assert cache.get('c') is not None
+    assert cache.stats()['size'] == 2
+
+
+def test_expired_entry_is_a_miss_and_dropped():
+    cache = TokenPayloadCache()
+    cache.set('a', payload(ttl=-1))
+
+    assert cache.get('a') is None
+    assert cache.stats()['size'] == 0
+    assert cache.stats()['misses'] == 1
+
+
+def test_clear_resets_the_counters():
+    cache = TokenPayloadCache()
+    cache.set('a', payload())
+    cache.get('a')
+    cache.clear()
+    assert cache.stats() == {'size': 0, 'maxsize': 1024, 'hits': 0, 'misses': 0, 'hit_ratio': 0.0}
+
+
+@pytest.mark.django_db
+def test_repeated_verification_skips_decoding(monkeypatch):
+    user = User.objects.create_user(email='joao@example.com', username='joao', password='s3cret-pass')
+    token = JWTService.generate_tokens(user)['access']
+    payload_cache.clear()
+
+    assert JWTService.verify_token(token)[1] is None
+    decode = JWTService.decode_token
+
+    def fail(token):
+        raise AssertionError('decoded again')
+
+    monkeypatch.setattr(JWTService, 'decode_token', staticmethod(fail))
+    assert JWTService.verify_token(token)[1] is None
+    stats = JWTService.payload_cache_stats()
+    assert (stats['hits'], stats['misses']) == (1, 1)
+
+    # Blacklisting drops the cached payload
+    monkeypatch.setattr(JWTService, 'decode_token', staticmethod(decode))
+    assert JWTService.blacklist_token(token) == (True, None)
+    assert payload_cache.get(token_digest(token)) is None
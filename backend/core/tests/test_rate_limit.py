@@ -0,0 +1,57 @@
+"""
+Email rate limiting: the process-local tier and the Redis-down fallback
+"""
+
+import pytest
+import redis
+
+from core.email_service import EmailRateLimiter, LocalRateTier, RateLimitResult
+
+
+@pytest.fixture
+def tier(settings):
+    settings.EMAIL_RATE_LIMIT_SYNC_INTERVAL = 60
+    settings.EMAIL_RATE_LIMIT_LOCAL_FRACTION = 0.5
+    settings.EMAIL_RATE_LIMIT_REDIS_RETRY = 60
+    return LocalRateTier()
+
+
+def test_first_decision_goes_to_redis(tier):
+    assert tier.decide('k', 10, 3600, record=True) is None
+
+
+def test_allows_locally_below_the_fraction(tier):
+    tier.record_remote('k', RateLimitResult(True, 8, 0), 10, 3600, recorded=True)
+    # Global count 2; up to half the limit (5) is decided locally
+    assert tier.decide('k', 10, 3600, record=True).allowed
+    assert tier.decide('k', 10, 3600, record=True).allowed
+    assert tier.decide('k', 10, 3600, record=True).allowed
+    assert tier.decide('k', 10, 3600, record=True) is None
+    assert tier.take_pending('k') == 3
+
+
+def test_denied_key_stays_denied_until_retry_after(tier):
+    tier.record_remote('k', RateLimitResult(False, 0, 120), 3, 3600, recorded=True)
+    result = tier.decide('k', 3, 3600, record=True)
+    assert not result.allowed
+    assert 0 < result.retry_after <= 120
+
+
+def test_limits_alone_while_redis_is_down(tier):
+    tier.redis_failed(redis.ConnectionError('down'))
+    assert not tier.redis_available()
+    decisions = [tier.decide('k', 3, 3600, record=True).allowed for _ in range(4)]
+    assert decisions == [True, True, True, False]
+
+
+def test_limiter_falls_back_when_redis_fails(tier, monkeypatch):
+    limiter = EmailRateLimiter(mode='sliding_window', local=True)
+    limiter.local = tier
+
+    def redis_down(calls):
+        raise redis.ConnectionError('down')
+
+    monkeypatch.setattr(limiter, '_run_pipeline', redis_down)
+    results = [limiter.hit('verification', 'hana@example.com', max_attempts=2) for _ in range(3)]
+    assert [result.allowed for result in results] == [True, True, False]
+    assert not tier.redis_available()
@@ -0,0 +1,135 @@
+"""
+Email rate-limit Lua scripts (SLIDING_WINDOW_SCRIPT, TOKEN_BUCKET_SCRIPT) run on fakeredis
+"""
+
+import time
+
+import fakeredis
+import pytest
+import redis
+
+from core.email_service import EmailRateLimiter
+from core.redis_clients import redis_pools
+
+START = 1_700_000_000.0
+
+
+class FakeClock:
+    """Drives redis.call('TIME') and key expiry in fakeredis"""
+
+    def __init__(self):
+        self.now = START
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(time, 'time', clock)
+    return clock
+
+
+@pytest.fixture(autouse=True)
+def fake_redis(monkeypatch):
+    server = fakeredis.FakeServer()
+    pools = {
+        ('rate_limit', decoded): redis.ConnectionPool(
+            connection_class=fakeredis.FakeRedisConnection, server=server, decode_responses=decoded
+        )
+        for decoded in (False, True)
+    }
+    monkeypatch.setattr(redis_pools, '_pools', pools)
+
+
+def limiter(mode):
+    # Without the local tier every decision is the script's
+    return EmailRateLimiter(mode=mode, local=False)
+
+
+def hits(rate_limiter, count, identifier='ana@example.com'):
+    return [rate_limiter.hit('verification', identifier) for _ in range(count)]
+
+
+@pytest.mark.parametrize('mode, retry_after', [('sliding_window', 3600), ('token_bucket', 1200)])
+def test_allows_up_to_the_limit_then_denies(clock, mode, retry_after):
+    rate_limiter = limiter(mode)
+    results = hits(rate_limiter, 4)
+    assert [(result.allowed, result.remaining) for result in results] == [
+        (True, 2), (True, 1), (True, 0), (False, 0)
+    ]
+    assert results[-1].retry_after == retry_after
+
+
+@pytest.mark.parametrize('mode', EmailRateLimiter.MODES)
+def test_check_does_not_record(clock, mode):
+    rate_limiter = limiter(mode)
+    for _ in range(5):
+        assert rate_limiter.check('verification', 'ana@example.com').allowed
+    assert [result.allowed for result in hits(rate_limiter, 4)] == [True, True, True, False]
+
+
+def test_sliding_window_frees_a_slot_exactly_at_the_window_edge(clock):
+    rate_limiter = limiter('sliding_window')
+    hits(rate_limiter, 1)
+    clock.advance(600)
+    hits(rate_limiter, 2)
+
+    clock.advance(3000 - 0.001)
+    denied = rate_limiter.hit('verification', 'ana@example.com')
+    assert not denied.allowed
+    assert denied.retry_after == 1
+
+    # The first hit leaves the window; the other two are still counted
+    clock.advance(0.001)
+    assert rate_limiter.hit('verification', 'ana@example.com') == (True, 0, 0)
+    assert rate_limiter.hit('verification', 'ana@example.com').retry_after == 600
+
+
+def test_token_bucket_refills_over_time(clock):
+    rate_limiter = limiter('token_bucket')
+    hits(rate_limiter, 3)
+
+    clock.advance(600)
+    half = rate_limiter.hit('verification', 'ana@example.com')
+    assert not half.allowed
+    assert half.retry_after == 600
+
+    clock.advance(600)
+    assert [result.allowed for result in hits(rate_limiter, 2)] == [True, False]
+
+    # Never refills past the capacity
+    clock.advance(10 * 3600)
+    assert [result.allowed for result in hits(rate_limiter, 4)] == [True, True, True, False]
+
+
+@pytest.mark.parametrize('mode', EmailRateLimiter.MODES)
+def test_hit_many_decides_each_identifier(clock, mode):
+    rate_limiter = limiter(mode)
+    hits(rate_limiter, 3, identifier='busy@example.com')
+
+    results = rate_limiter.hit_many('verification', ['busy@example.com', 'a@example.com', 'b@example.com'])
+    assert not results['busy@example.com'].allowed
+    assert results['a@example.com'] == (True, 2, 0)
+    assert results['b@example.com'] == (True, 2, 0)
+    # The batch recorded the allowed hits
+    assert rate_limiter.hit('verification', 'a@example.com').remaining == 1
+    assert rate_limiter.hit_many('verification', []) == {}
+
+
+@pytest.mark.parametrize('mode', EmailRateLimiter.MODES)
+def test_sync_flag_records_past_the_limit(clock, mode):
+    rate_limiter = limiter(mode)
+    key = rate_limiter._key('verification', 'ana@example.com')
+
+    # Hits already allowed by a local tier are recorded unconditionally
+    synced, = rate_limiter._run_pipeline([(key, rate_limiter._args(3, 1, 'sync', 2))])
+    assert rate_limiter._result(synced).allowed
+    assert [result.allowed for result in hits(rate_limiter, 2)] == [True, False]
+
+    rate_limiter._run_pipeline([(key, rate_limiter._args(3, 1, 'sync', 5))])
+    assert not rate_limiter.check('verification', 'ana@example.com').allowed
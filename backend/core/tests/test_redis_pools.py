@@ -0,0 +1,75 @@
+"""
+RedisPoolRegistry: sharing the django_redis pool and the connection gauges
+"""
+
+import fakeredis
+import pytest
+from django_redis.pool import ConnectionFactory
+from prometheus_client import REGISTRY
+
+from core.redis_clients import RedisPoolRegistry
+
+
+@pytest.fixture
+def redis_cache(settings, monkeypatch):
+    """The default cache on django_redis, its connections served by fakeredis"""
+    monkeypatch.setattr(ConnectionFactory, '_pools', {})
+    settings.CACHES = {
+        'default': {
+            'BACKEND': 'django_redis.cache.RedisCache',
+            'LOCATION': 'redis://redis:6379/0',
+            'OPTIONS': {
+                'CONNECTION_POOL_KWARGS': {
+                    'connection_class': fakeredis.FakeRedisConnection,
+                    'server': fakeredis.FakeServer(),
+                },
+            },
+        }
+    }
+    from django_redis import get_redis_connection
+    return get_redis_connection('default')
+
+
+def gauge(use, state):
+    return REGISTRY.get_sample_value('redis_pool_connections', {'use': use, 'state': state})
+
+
+def test_cache_use_reuses_the_django_redis_pool(redis_cache):
+    registry = RedisPoolRegistry()
+    assert registry.pool('cache') is redis_cache.connection_pool
+    assert registry.pool('cache') is registry.pool('cache')
+    # Decoded clients need their own pool: django_redis expects raw bytes
+    assert registry.pool('cache', decode_responses=True) is not redis_cache.connection_pool
+
+    registry.client('cache').set('shared', 'yes')
+    assert redis_cache.get('shared') == b'yes'
+
+
+def test_cache_use_has_its_own_pool_without_django_redis():
+    # The test settings use locmem
+    registry = RedisPoolRegistry()
+    assert registry._cache_pool() is None
+    assert registry.pool('cache').connection_kwargs['db'] == 1
+
+
+def test_unknown_use_is_rejected():
+    with pytest.raises(KeyError):
+        RedisPoolRegistry().pool('no-such-use')
+
+
+def test_gauges_and_stats_follow_the_pool(redis_cache):
+    registry = RedisPoolRegistry()
+    pool = registry.pool('cache')
+
+    connection = pool.get_connection('PING')
+    assert gauge('cache', 'in_use') == 1
+    assert gauge('cache', 'idle') == 0
+    pool.release(connection)
+    assert gauge('cache', 'in_use') == 0
+    assert gauge('cache', 'idle') == 1
+
+    registry.pool('rate_limit', decode_responses=True)
+    stats = registry.stats()
+    assert stats['cache'] == {'created': 1, 'in_use': 0, 'idle': 1, 'max': pool.max_connections}
+    assert stats['rate_limit:decoded']['created'] == 0
+    assert gauge('rate_limit:decoded', 'idle') == 0
@@ -0,0 +1,92 @@
+"""
+Refresh token rotation and its cross-worker single flight
+"""
+
+import time
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from core.services import JWTService, REFRESH_IN_PROGRESS, refresh_single_flight, token_digest
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def tokens():
+    user = User.objects.create_user(email='fabio@example.com', username='fabio', password='s3cret-pass')
+    return JWTService.generate_tokens(user)
+
+
+def result_key(token):
+    return f"{refresh_single_flight.key_prefix}{token_digest(token)}"
+
+
+def test_refresh_rotates_the_session(tokens):
+    result, error = JWTService.refresh_access_token(tokens['refresh'])
+    assert error is None
+    assert result['refresh'] != tokens['refresh']
+    assert JWTService.verify_token(result['access'])[1] is None
+    # The new refresh token is the session now
+    assert JWTService.rotate_refresh_token(tokens['refresh']) == (None, 'Invalid refresh token')
+
+
+def test_concurrent_refresh_gets_the_same_tokens(tokens):
+    first, _ = JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    second, error = JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    assert error is None
+    assert second == first
+    assert first['device_id'] == tokens['device_id']
+
+
+@pytest.mark.parametrize('device_id', [None, 'another-device'])
+def test_replay_without_the_session_device_gets_nothing(tokens, device_id):
+    JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    assert JWTService.refresh_access_token(tokens['refresh'], device_id) == (None, 'Invalid refresh token')
+
+
+def test_replay_after_logout_gets_nothing(tokens):
+    result, _ = JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    assert JWTService.blacklist_token(result['refresh']) == (True, None)
+    replay = JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    assert replay == (None, 'Invalid refresh token')
+
+
+def test_replay_after_a_later_rotation_gets_nothing(tokens):
+    result, _ = JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    assert JWTService.refresh_access_token(result['refresh'], tokens['device_id'])[1] is None
+    replay = JWTService.refresh_access_token(tokens['refresh'], tokens['device_id'])
+    assert replay == (None, 'Invalid refresh token')
+
+
+def test_published_result_is_encrypted(tokens):
+    result, _ = JWTService.refresh_access_token(tokens['refresh'])
+    sealed = cache.get(result_key(tokens['refresh']))
+    assert isinstance(sealed, bytes)
+    assert result['access'].encode() not in sealed
+    assert result['refresh'].encode() not in sealed
+    assert refresh_single_flight._published(result_key(tokens['refresh']), 'another-token') is None
+
+
+def test_errors_are_not_published(tokens):
+    JWTService.revoke_all_tokens(JWTService.verify_token(tokens['access'])[0]['user_id'])
+    assert JWTService.refresh_access_token(tokens['refresh']) == (None, 'Invalid refresh token')
+    assert cache.get(result_key(tokens['refresh'])) is None
+
+
+def test_follower_waits_briefly_then_gets_409(tokens):
+    # Another worker holds the rotation lock and never publishes
+    cache.add(f"{result_key(tokens['refresh'])}:lock", 1, 5)
+
+    started = time.monotonic()
+    assert JWTService.refresh_access_token(tokens['refresh']) == (None, REFRESH_IN_PROGRESS)
+    assert time.monotonic() - started < 0.5
+
+    response = APIClient().post('/api/auth/refresh/', {'refresh': tokens['refresh']}, format='json')
+    assert response.status_code == 409
+    # The session was not rotated by the follower
+    assert JWTService.rotate_refresh_token(tokens['refresh'])[1] is None
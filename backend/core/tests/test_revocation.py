@@ -0,0 +1,58 @@
+"""
+Token revocation: blacklist, the database fallback and logout
+"""
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from core.models import BlacklistedToken
+from core.services import JWTService, revocation_index, token_jti
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='ines@example.com', username='ines', password='s3cret-pass')
+
+
+def authenticated_client(tokens):
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {tokens['access']}")
+    return client
+
+
+def test_blacklisted_access_token_is_rejected(user):
+    tokens = JWTService.generate_tokens(user)
+    assert JWTService.verify_token(tokens['access'])[1] is None
+
+    assert JWTService.blacklist_token(tokens['access']) == (True, None)
+    assert JWTService.verify_token(tokens['access']) == (None, 'Token blacklisted')
+    payload = JWTService.decode_token(tokens['access'])
+    assert BlacklistedToken.objects.filter(jti=token_jti(payload, tokens['access'])).exists()
+
+
+def test_revocation_falls_back_to_the_database_without_the_index(user):
+    tokens = JWTService.generate_tokens(user)
+    JWTService.blacklist_token(tokens['access'])
+    payload = JWTService.decode_token(tokens['access'])
+    jti = token_jti(payload, tokens['access'])
+
+    # Index lost (Redis flushed): Postgres still answers
+    cache.clear()
+    assert revocation_index.is_revoked(jti)
+    # ...and the index is rebuilt from it (the Celery task runs eagerly here)
+    assert cache.get(revocation_index._key(jti)) == 1
+
+
+def test_logout_revokes_both_tokens(user):
+    tokens = JWTService.generate_tokens(user)
+    client = authenticated_client(tokens)
+    assert client.post('/api/auth/logout/', {'refresh': tokens['refresh']}, format='json').status_code == 200
+
+    assert client.get('/api/auth/me/').status_code == 401
+    assert JWTService.refresh_access_token(tokens['refresh']) == (None, 'Invalid refresh token')
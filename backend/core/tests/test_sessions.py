@@ -0,0 +1,39 @@
+"""
+Refresh-token sessions: the per-user cap and same-device renewal
+"""
+
+import pytest
+from django.contrib.auth import get_user_model
+
+from core.models import RefreshToken
+from core.services import JWTService
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='ines@example.com', username='ines', password='s3cret-pass')
+
+
+def test_session_cap_drops_the_least_recently_used(user, settings):
+    settings.JWT_MAX_SESSIONS_PER_USER = 2
+    first = JWTService.generate_tokens(user, device_id='first')
+    JWTService.generate_tokens(user, device_id='second')
+    JWTService.generate_tokens(user, device_id='third')
+
+    assert set(RefreshToken.objects.filter(user=user).values_list('device_id', flat=True)) == {'second', 'third'}
+    assert JWTService.refresh_access_token(first['refresh']) == (None, 'Invalid refresh token')
+
+
+def test_same_device_renews_its_session(user, settings):
+    settings.JWT_MAX_SESSIONS_PER_USER = 2
+    old = JWTService.generate_tokens(user, device_id='laptop')
+    JWTService.generate_tokens(user, device_id='laptop')
+    JWTService.generate_tokens(user, device_id='phone')
+
+    assert RefreshToken.objects.filter(user=user).count() == 2
+    # The laptop's previous refresh token died with its jti
+    assert JWTService.refresh_access_token(old['refresh']) == (None, 'Invalid refresh token')
@@ -0,0 +1,63 @@
+"""
+Boot checks under the unmodified production settings (core.settings)
+The rest of the suite runs on core.tests.settings; these run in a fresh
+interpreter so nothing from the test settings can mask a broken app registry
+"""
+
+import os
+import subprocess
+import sys
+from pathlib import Path
+
+BASE_DIR = Path(__file__).resolve().parent.parent.parent
+
+
+def run_under_production_settings(*args, **env_overrides):
+    env = dict(os.environ, DJANGO_SETTINGS_MODULE='core.settings', **env_overrides)
+    return subprocess.run(
+        [sys.executable, *args], cwd=BASE_DIR, env=env, capture_output=True, text=True, timeout=120
+    )
+
+
+def test_manage_check_passes():
+    result = run_under_production_settings('manage.py', 'check', '--fail-level', 'ERROR')
+    assert result.returncode == 0, result.stderr
+
+
+def test_user_model_is_core_user():
+    result = run_under_production_settings('-c', (
+        'import django; django.setup(); '
+        'from django.contrib.auth import get_user_model; '
+        'print(get_user_model()._meta.label)'
+    ))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.strip() == 'core.User'
+
+
+def test_request_through_production_middleware(tmp_path):
+    # Full MIDDLEWARE stack, JWT middleware included, with a Bearer token that does not verify
+    keys = {'JWT_KEYS_DIR': str(tmp_path)}
+    result = run_under_production_settings('manage.py', 'check_keys', **keys)
+    assert result.returncode == 0, result.stderr
+
+    result = run_under_production_settings('-c', (
+        'import django; django.setup(); '
+        'from django.test import Client; '
+        "response = Client().get('/api/health/', secure=True, HTTP_HOST='localhost', "
+        "HTTP_AUTHORIZATION='Bearer not-a-jwt'); "
+        'request = response.wsgi_request; '
+        'print(response.status_code, request.user.is_authenticated, request.auth_error)'
+    ), **keys)
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['200', 'False', 'Invalid', 'token']
+
+
+def test_drf_authentication_classes_import():
+    result = run_under_production_settings('-c', (
+        'import django; django.setup(); '
+        'from rest_framework.settings import api_settings; '
+        'print(api_settings.DEFAULT_AUTHENTICATION_CLASSES[0].__module__, '
+        'api_settings.DEFAULT_AUTHENTICATION_CLASSES[0].__name__)'
+    ))
+    assert result.returncode == 0, result.stderr
+    assert result.stdout.split() == ['core.authentication', 'JWTAuthentication']
@@ -0,0 +1,68 @@
+"""
+Per-user token generation (core.services.TokenGenerationStore) and logout-all
+"""
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from rest_framework.test import APIClient
+
+from core.models import RefreshToken
+from core.services import JWTService, TokenGenerationStore
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='eva@example.com', username='eva', password='s3cret-pass')
+
+
+def test_bump_is_seen_by_other_workers(user):
+    worker_a, worker_b = TokenGenerationStore(), TokenGenerationStore()
+    assert worker_b.current(user.pk) == 0
+    assert worker_a.bump(user.pk) == 1
+    # worker_b's own copy lasts local_ttl; a fresh worker reads the published value
+    assert TokenGenerationStore().current(user.pk) == 1
+
+
+def test_stale_miss_never_overwrites_a_bump(user):
+    store = TokenGenerationStore()
+    load = store._load
+
+    def load_then_bump(user_id):
+        generation = load(user_id)
+        # A revoke-all lands between this worker's DB read and its cache fill
+        TokenGenerationStore().bump(user_id)
+        return generation
+
+    store._load = load_then_bump
+    assert store.current(user.pk) == 0
+    assert cache.get(store._key(user.pk)) == 1
+    assert TokenGenerationStore().current(user.pk) == 1
+
+
+def test_publish_only_moves_forward(user):
+    store = TokenGenerationStore()
+    store._publish(user.pk, 2)
+    store._publish(user.pk, 1)
+    assert cache.get(store._key(user.pk)) == 2
+
+
+def test_logout_all_revokes_every_device(user):
+    laptop = JWTService.generate_tokens(user, device_id='laptop')
+    phone = JWTService.generate_tokens(user, device_id='phone')
+    client = APIClient()
+    client.credentials(HTTP_AUTHORIZATION=f"Bearer {laptop['access']}")
+    assert client.post('/api/auth/logout-all/').status_code == 200
+
+    for tokens in (laptop, phone):
+        assert JWTService.verify_token(tokens['access']) == (None, 'Token revoked')
+        assert JWTService.refresh_access_token(tokens['refresh'])[1] is not None
+    assert not RefreshToken.objects.filter(user=user).exists()
+
+    # Logging in again issues tokens of the new generation
+    fresh = JWTService.generate_tokens(User.objects.get(pk=user.pk))
+    assert JWTService.verify_token(fresh['access'])[1] is None
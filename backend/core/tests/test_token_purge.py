@@ -0,0 +1,117 @@
+"""
+Expired token purge (core.tasks.purge_expired_tokens): chunks, cursor, schedule
+"""
+
+import uuid
+from datetime import timedelta
+
+import pytest
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from prometheus_client import REGISTRY
+
+from core import tasks
+from core.models import RefreshToken
+from core.tasks import purge_expired_rows, purge_expired_tokens
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db
+
+CURSOR_KEY = 'token_purge_cursor:refresh_tokens'
+
+
+class FakeClock:
+    """time.monotonic/time.sleep for core.tasks: sleeping advances the clock instantly"""
+
+    def __init__(self):
+        self.now = 0.0
+
+    def monotonic(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = FakeClock()
+    monkeypatch.setattr(tasks.time, 'monotonic', clock.monotonic)
+    monkeypatch.setattr(tasks.time, 'sleep', clock.sleep)
+    return clock
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='tomas@example.com', username='tomas', password='s3cret-pass')
+
+
+def make_sessions(user, count, expires_in):
+    now = timezone.now()
+    return [
+        RefreshToken.objects.create(
+            user=user, jti=uuid.uuid4(), device_id=uuid.uuid4().hex,
+            expires_at=now + timedelta(minutes=expires_in + i)
+        )
+        for i in range(count)
+    ]
+
+
+def deleted_metric():
+    return REGISTRY.get_sample_value('token_purge_deleted_rows_total', {'table': 'refresh_tokens'}) or 0.0
+
+
+def test_stops_at_the_deadline_and_resumes_from_the_cursor(user, clock):
+    expired = make_sessions(user, 5, expires_in=-60)
+    live = make_sessions(user, 2, expires_in=60)
+
+    # One chunk, then the pause runs past the deadline
+    stats = purge_expired_rows(RefreshToken, chunk_size=2, pause=10, deadline=5)
+    assert (stats['deleted'], stats['chunks'], stats['complete']) == (2, 1, False)
+    assert cache.get(CURSOR_KEY) == expired[1].expires_at
+
+    # Rows behind the cursor are not rescanned by the resumed run...
+    behind = make_sessions(user, 1, expires_in=-120)[0]
+    stats = purge_expired_rows(RefreshToken, chunk_size=2, pause=0, deadline=100)
+    assert (stats['deleted'], stats['complete']) == (3, True)
+    assert cache.get(CURSOR_KEY) is None
+    assert RefreshToken.objects.filter(pk=behind.pk).exists()
+
+    # ...and are picked up by the next full pass
+    purge_expired_rows(RefreshToken, chunk_size=2, pause=0, deadline=100)
+    assert set(RefreshToken.objects.values_list('pk', flat=True)) == {row.pk for row in live}
+
+
+def test_exports_deleted_rows_and_chunk_times(user, clock):
+    make_sessions(user, 3, expires_in=-60)
+    before = deleted_metric()
+    chunks = REGISTRY.get_sample_value('token_purge_chunk_seconds_count', {'table': 'refresh_tokens'}) or 0.0
+
+    purge_expired_rows(RefreshToken, chunk_size=2, pause=0, deadline=100)
+
+    assert deleted_metric() - before == 3
+    assert REGISTRY.get_sample_value('token_purge_chunk_seconds_count', {'table': 'refresh_tokens'}) - chunks == 2
+
+
+def test_skips_business_hours_unless_forced(user, settings, clock):
+    settings.TOKEN_PURGE_BUSINESS_HOURS = (0, 24)
+    make_sessions(user, 1, expires_in=-60)
+
+    assert purge_expired_tokens()['status'] == 'skipped'
+    assert RefreshToken.objects.exists()
+
+    result = purge_expired_tokens(force=True)
+    assert result['status'] == 'success'
+    assert result['tables']['refresh_tokens']['deleted'] == 1
+
+
+def test_run_past_the_deadline_is_partial(user, settings, clock):
+    settings.TOKEN_PURGE_BUSINESS_HOURS = (0, 0)
+    settings.TOKEN_PURGE_MAX_SECONDS = 0
+    make_sessions(user, 1, expires_in=-60)
+
+    result = purge_expired_tokens()
+    assert (result['status'], result['deleted']) == ('partial', 0)
+    assert RefreshToken.objects.exists()
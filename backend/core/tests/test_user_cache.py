@@ -0,0 +1,83 @@
+"""
+Shared user record cache (core.user_cache)
+"""
+
+import pytest
+from datetime import timedelta
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+
+from core.services import token_generations
+from core.user_cache import UserCache, user_cache
+
+User = get_user_model()
+
+pytestmark = pytest.mark.django_db(transaction=True)
+
+
+@pytest.fixture
+def user():
+    return User.objects.create_user(email='bia@example.com', username='bia', password='s3cret-pass')
+
+
+def test_password_hash_is_never_cached(user):
+    user_cache.get(user.pk)
+    entry = cache.get(user_cache._key(user.pk))
+    assert 'password' not in entry['fields']
+    assert user.password not in repr(entry)
+
+
+def test_cached_user_loads_other_fields_from_the_database(user):
+    cache.clear()
+    user_cache.get(user.pk)
+    cached = user_cache.get(user.pk)
+    assert cached.username == 'bia'
+    assert 'password' in cached.get_deferred_fields()
+    assert cached.check_password('s3cret-pass')
+
+
+def test_store_never_replaces_a_newer_version(user):
+    stale = User.objects.get(pk=user.pk)
+    user.first_name = 'Beatriz'
+    user.save()
+    assert user_cache.get(user.pk).first_name == 'Beatriz'
+
+    stale.updated_at = user.updated_at - timedelta(seconds=1)
+    assert user_cache.store(stale) is False
+    assert user_cache.get(user.pk).first_name == 'Beatriz'
+
+
+def test_invalidate_blocks_a_stale_fill(user):
+    # A loader that read the row before the update must not re-cache it
+    stale = User.objects.get(pk=user.pk)
+    User.objects.filter(pk=user.pk).update(is_active=False, updated_at=timezone.now())
+    user_cache.invalidate(user.pk)
+    assert user_cache.store(stale) is False
+    assert cache.get(user_cache._key(user.pk))['fields'] is None
+
+
+def test_read_after_invalidate_fills_the_cache_again(user):
+    user_cache.get(user.pk)
+    user_cache.invalidate(user.pk)
+
+    assert user_cache.get(user.pk).username == 'bia'
+    assert cache.get(user_cache._key(user.pk))['fields']['username'] == 'bia'
+
+
+def test_generation_bump_drops_the_cached_record(user):
+    before = user_cache.get(user.pk).token_generation
+    token_generations.bump(user.pk)
+    assert user_cache.get(user.pk).token_generation == before + 1
+
+
+def test_deactivation_by_update_is_seen_after_invalidate(user):
+    assert user_cache.get(user.pk).is_active
+    User.objects.filter(pk=user.pk).update(is_active=False)
+    user_cache.invalidate(user.pk)
+    assert not user_cache.get(user.pk).is_active
+
+
+def test_missing_user_raises_does_not_exist():
+    with pytest.raises(User.DoesNotExist):
+        UserCache().get('00000000-0000-0000-0000-000000000000')
@@ -7,6 +7,7 @@ from django.conf import settings
 from django.conf.urls.static import static
 from graphene_django.views import GraphQLView
 from rest_framework.authtoken.views import obtain_auth_token
+from core import views as auth_views
 
 urlpatterns = [
     # Admin
@@ -15,12 +16,24 @@ urlpatterns = [
     # REST API
     path('api/', include('apps.core.urls')),
     path('api/auth/token/', obtain_auth_token, name='api-token'),
+    path('.well-known/jwks.json', auth_views.jwks, name='jwks'),
+    
+    # JWT Auth
+    path('api/auth/register/', auth_views.register, name='auth-register'),
+    path('api/auth/login/', auth_views.login, name='auth-login'),
+    path('api/auth/refresh/', auth_views.refresh_token, name='auth-refresh'),
+    path('api/auth/logout/', auth_views.logout, name='auth-logout'),
+    path('api/auth/logout-all/', auth_views.logout_all, name='auth-logout-all'),
+    path('api/auth/me/', auth_views.me, name='auth-me'),
     
     # GraphQL
     path('graphql/', GraphQLView.as_view(graphiql=settings.DEBUG)),
     
     # REST Framework Auth
     path('api-auth/', include('rest_framework.urls')),
+    
+    # Prometheus (/metrics)
+    path('', include('django_prometheus.urls')),
 ]
 
 if settings.DEBUG:
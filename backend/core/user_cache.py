@@ -0,0 +1,196 @@
+import time
+import asyncio
+import logging
+import threading
+from asgiref.sync import sync_to_async
+from django.conf import settings
+from django.contrib.auth import get_user_model
+from django.core.cache import cache
+from django.utils import timezone
+from redis.exceptions import WatchError
+from .redis_clients import async_cache
+from .instrumentation import record_cache
+
+logger = logging.getLogger(__name__)
+
+# Campos lidos pela API a partir de `request.user`; o hash da senha e os
+# demais campos nunca vão para o Redis e, se acessados, vêm do banco (deferred)
+CACHED_FIELDS = (
+    'id', 'email', 'username', 'first_name', 'last_name', 'is_active', 'is_staff',
+    'is_superuser', 'is_email_verified', 'token_generation', 'created_at', 'updated_at',
+)
+
+
+class UserCache:
+    """
+    Cache compartilhado (Redis) dos registros de usuário, indexado pelo id.
+
+    Guarda apenas `CACHED_FIELDS`; a leitura devolve um `User` com os demais
+    campos adiados. As entradas são versionadas por `updated_at` e gravadas
+    com compare-and-set (WATCH/MULTI), de modo que uma leitura atrasada nunca
+    sobrescreve um registro mais novo. `invalidate` deixa uma lápide curta
+    (`lock_timeout`) versionada pelo `updated_at` atual da linha: um
+    carregamento que leu a linha antes da alteração (versão menor) é
+    recusado, e o primeiro que a lê depois volta a popular o cache. Em um
+    miss, apenas um processo consulta o banco; os demais aguardam o cache
+    ser preenchido.
+    """
+
+    key_prefix = 'user_record:'
+
+    def __init__(self, timeout=300, lock_timeout=5, wait_interval=0.05, wait_attempts=10):
+        self.timeout = timeout
+        self.lock_timeout = lock_timeout
+        self.wait_interval = wait_interval
+        self.wait_attempts = wait_attempts
+        # Compare-and-set dos backends sem Redis (locmem em testes e desenvolvimento)
+        self._local_lock = threading.Lock()
+
+    def _key(self, user_id):
+        return f"{self.key_prefix}{user_id}"
+
+    @staticmethod
+    def _entry(user):
+        return {
+            'version': user.updated_at,
+            'fields': {name: getattr(user, name) for name in CACHED_FIELDS},
+        }
+
+    @staticmethod
+    def _user(entry):
+        """Reconstrói o usuário a partir da entrada; None para ausência ou lápide."""
+        if entry is None or entry['fields'] is None:
+            return None
+        fields = entry['fields']
+        User = get_user_model()
+        names = [f.attname for f in User._meta.concrete_fields if f.attname in fields]
+        return User.from_db('default', names, [fields[name] for name in names])
+
+    def _load(self, user_id):
+        return get_user_model().objects.only(*CACHED_FIELDS).get(pk=user_id)
+
+    def _redis(self):
+        try:
+            from django_redis import get_redis_connection
+            return get_redis_connection('default')
+        except (ImportError, NotImplementedError):
+            # Cache padrão não é o django_redis (testes, desenvolvimento)
+            return None
+
+    def _compare_and_set(self, key, entry, timeout):
+        """Grava a entrada se não houver uma de versão mais nova; True se gravou."""
+        client = self._redis()
+        if client is None:
+            with self._local_lock:
+                current = cache.get(key)
+                if current is not None and current['version'] > entry['version']:
+                    return False
+                cache.set(key, entry, timeout)
+                return True
+
+        redis_key = cache.make_key(key)
+        value = cache.client.encode(entry)
+        with client.pipeline() as pipe:
+            while True:
+                try:
+                    pipe.watch(redis_key)
+                    raw = pipe.get(redis_key)
+                    current = cache.client.decode(raw) if raw is not None else None
+                    if current is not None and current['version'] > entry['version']:
+                        pipe.unwatch()
+                        return False
+                    pipe.multi()
+                    pipe.set(redis_key, value, ex=timeout)
+                    pipe.execute()
+                    return True
+                except WatchError:
+                    # Outra escrita entre o GET e o EXEC: compara de novo
+                    continue
+
+    def _fill(self, user):
+        try:
+            self._compare_and_set(self._key(user.pk), self._entry(user), self.timeout)
+        except Exception as e:
+            logger.warning(f"Falha ao gravar o usuário {user.pk} no cache: {str(e)}")
+
+    def get(self, user_id):
+        """Retorna o usuário do cache, consultando o banco apenas em um miss."""
+        key = self._key(user_id)
+        try:
+            user = self._user(cache.get(key))
+        except Exception as e:
+            logger.warning(f"Cache de usuários indisponível: {str(e)}")
+            return self._load(user_id)
+
+        record_cache('user_record', user is not None)
+        if user is not None:
+            return user
+
+        # Proteção contra stampede: só quem obtém o lock vai ao banco
+        lock_key = f"{key}:lock"
+        if cache.add(lock_key, 1, self.lock_timeout):
+            try:
+                user = self._load(user_id)
+                self._fill(user)
+                return user
+            finally:
+                cache.delete(lock_key)
+
+        for _ in range(self.wait_attempts):
+            time.sleep(self.wait_interval)
+            user = self._user(cache.get(key))
+            if user is not None:
+                return user
+
+        return self._load(user_id)
+
+    async def aget(self, user_id):
+        """Versão assíncrona de `get`: hits via cache assíncrono, misses via ORM assíncrono."""
+        key = self._key(user_id)
+        try:
+            entry = await async_cache.get(key)
+        except Exception as e:
+            logger.warning(f"Cache de usuários indisponível: {str(e)}")
+            return await get_user_model().objects.only(*CACHED_FIELDS).aget(pk=user_id)
+
+        user = self._user(entry)
+        record_cache('user_record', user is not None)
+        if user is not None:
+            return user
+
+        lock_key = f"{key}:lock"
+        if await cache.aadd(lock_key, 1, self.lock_timeout):
+            try:
+                user = await get_user_model().objects.only(*CACHED_FIELDS).aget(pk=user_id)
+                await sync_to_async(self._fill)(user)
+                return user
+            finally:
+                await cache.adelete(lock_key)
+
+        for _ in range(self.wait_attempts):
+            await asyncio.sleep(self.wait_interval)
+            user = self._user(await cache.aget(key))
+            if user is not None:
+                return user
+
+        return await get_user_model().objects.only(*CACHED_FIELDS).aget(pk=user_id)
+
+    def store(self, user):
+        """Grava o registro, ignorando versões mais antigas que a já armazenada."""
+        return self._compare_and_set(self._key(user.pk), self._entry(user), self.timeout)
+
+    def invalidate(self, user_id):
+        """
+        Remove o registro do cache. Chame após alterações que não disparam
+        `post_save` (`QuerySet.update()`, SQL direto), atualizando também
+        `updated_at`: sem isso, um carregamento concorrente que leu a linha
+        antiga tem a mesma versão da lápide e pode voltar a ser gravado.
+        """
+        version = get_user_model().objects.filter(pk=user_id).values_list('updated_at', flat=True).first()
+        if version is None:
+            # Linha excluída: nenhum carregamento é válido, a lápide vence qualquer versão
+            version = timezone.now()
+        self._compare_and_set(self._key(user_id), {'version': version, 'fields': None}, self.lock_timeout)
+
+
+user_cache = UserCache(timeout=getattr(settings, 'USER_CACHE_TIMEOUT', 300))
@@ -2,22 +2,49 @@ from rest_framework import status
 from rest_framework.decorators import api_view, permission_classes
 from rest_framework.permissions import AllowAny, IsAuthenticated
 from rest_framework.response import Response
+from django.conf import settings
 from django.contrib.auth import authenticate
 from django.contrib.auth import get_user_model
-from .services import JWTService
-from .serializers import UserSerializer, LoginSerializer
+from django.db import transaction
+from django.http import HttpResponse, HttpResponseNotModified
+from django.views.decorators.http import require_GET
+from .hashing import password_hash_limiter, PasswordHashBusy
+from .email_service import EmailService
+from .jwt_keys import key_ring
+from .services import JWTService, REFRESH_IN_PROGRESS
+from .serializers import UserSerializer, LoginSerializer, RegisterSerializer
 
 User = get_user_model()
 
 
+def server_busy():
+    """Resposta de descarte quando não há capacidade de hashing de senha no host."""
+    return Response(
+        {'error': 'Server busy, try again later'},
+        status=status.HTTP_503_SERVICE_UNAVAILABLE,
+        headers={'Retry-After': '1'}
+    )
+
+
 @api_view(['POST'])
 @permission_classes([AllowAny])
 def register(request):
     """Registro de novo usuário."""
-    serializer = UserSerializer(data=request.data)
+    serializer = RegisterSerializer(data=request.data)
     if serializer.is_valid():
-        user = serializer.save()
-        tokens = JWTService.generate_tokens(user)
+        try:
+            password_hash = password_hash_limiter.make_password(serializer.validated_data['password'])
+        except PasswordHashBusy:
+            return server_busy()
+        # Usuário, token de verificação e email no outbox entram juntos ou nenhum entra
+        with transaction.atomic():
+            user = serializer.save(password_hash=password_hash)
+            EmailService().queue_verification_email(user)
+        tokens = JWTService.generate_tokens(
+            user,
+            device_id=serializer.validated_data.get('device_id'),
+            user_agent=request.META.get('HTTP_USER_AGENT', '')
+        )
         return Response({
             'user': UserSerializer(user).data,
             'tokens': tokens
@@ -34,18 +61,24 @@ def login(request):
         email = serializer.validated_data['email']
         password = serializer.validated_data['password']
         
+        user = User.objects.filter(email=email).first()
         try:
-            user = User.objects.get(email=email)
-            if user.check_password(password):
-                tokens = JWTService.generate_tokens(user)
-                return Response({
-                    'user': UserSerializer(user).data,
-                    'tokens': tokens
-                })
-            else:
-                return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
-        except User.DoesNotExist:
-            return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
+            # Email inexistente também paga um hash, mantendo o tempo de resposta constante
+            valid = password_hash_limiter.check_password(user, password)
+        except PasswordHashBusy:
+            return server_busy()
+        
+        if valid:
+            tokens = JWTService.generate_tokens(
+                user,
+                device_id=serializer.validated_data.get('device_id'),
+                user_agent=request.META.get('HTTP_USER_AGENT', '')
+            )
+            return Response({
+                'user': UserSerializer(user).data,
+                'tokens': tokens
+            })
+        return Response({'error': 'Invalid credentials'}, status=status.HTTP_401_UNAUTHORIZED)
     
     return Response(serializer.errors, status=status.HTTP_400_BAD_REQUEST)
 
@@ -58,7 +91,11 @@ def refresh_token(request):
     if not refresh_token:
         return Response({'error': 'Refresh token required'}, status=status.HTTP_400_BAD_REQUEST)
     
-    result, error = JWTService.refresh_access_token(refresh_token)
+    # Refreshes concorrentes (várias abas) só recebem a rotação compartilhada com o device_id da sessão
+    result, error = JWTService.refresh_access_token(refresh_token, request.data.get('device_id'))
+    if error == REFRESH_IN_PROGRESS:
+        # Outra request já está rotacionando este token; o cliente repete em seguida
+        return Response({'error': error}, status=status.HTTP_409_CONFLICT, headers={'Retry-After': '1'})
     if error:
         return Response({'error': error}, status=status.HTTP_401_UNAUTHORIZED)
     
@@ -81,6 +118,14 @@ def logout(request):
     return Response({'message': 'Logged out successfully'})
 
 
+@api_view(['POST'])
+@permission_classes([IsAuthenticated])
+def logout_all(request):
+    """Logout de todos os dispositivos - revoga todos os tokens do usuário."""
+    JWTService.revoke_all_tokens(request.user.pk)
+    return Response({'message': 'Logged out from all devices'})
+
+
 @api_view(['GET'])
 @permission_classes([IsAuthenticated])
 def me(request):
@@ -93,4 +138,17 @@ def me(request):
 @permission_classes([AllowAny])
 def health(request):
     """Health check endpoint."""
-    return Response({'status': 'healthy'})
\ No newline at end of file
+    return Response({'status': 'healthy'})
+
+
+@require_GET
+def jwks(request):
+    """Chaves públicas (JWKS) para validação offline dos tokens por outros serviços."""
+    body, etag = key_ring.jwks()
+    if etag in request.headers.get('If-None-Match', ''):
+        response = HttpResponseNotModified()
+    else:
+        response = HttpResponse(body, content_type='application/json')
+    response['ETag'] = etag
+    response['Cache-Control'] = f'public, max-age={settings.JWT_JWKS_MAX_AGE}'
+    return response
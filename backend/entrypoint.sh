@@ -78,7 +78,9 @@ echo -e "${GREEN}✅ Sistema pronto!${NC}"
 
 # Iniciar servidor Django
 if [ "$1" = "gunicorn" ]; then
-    exec gunicorn core.wsgi:application --bind 0.0.0.0:8000 --workers 3 --timeout 120
+    exec gunicorn core.wsgi:application --config gunicorn.conf.py
+elif [ "$1" = "uvicorn" ]; then
+    exec uvicorn core.asgi:application --host 0.0.0.0 --port 8000 --workers 3
 else
     exec "$@"
 fi
\ No newline at end of file
@@ -0,0 +1,13 @@
+"""
+Configuração do gunicorn usada pelo entrypoint.sh e pelo benchmark
+benchmarks/asgi_vs_wsgi.py, para que o benchmark meça o que vai para produção
+"""
+
+import os
+
+bind = '0.0.0.0:8000'
+workers = int(os.environ.get('GUNICORN_WORKERS', '3'))
+# gthread: hashes de senha (core.hashing) rodam em paralelo nas threads de cada worker
+worker_class = 'gthread'
+threads = int(os.environ.get('GUNICORN_THREADS', '4'))
+timeout = 120
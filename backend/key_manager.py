@@ -6,8 +6,11 @@ Handles encryption keys, signing keys, and secret key generation with 2-year lif
 
 import os
 import json
+import fcntl
 import base64
 import hashlib
+import tempfile
+from contextlib import contextmanager
 from datetime import datetime, timedelta
 from cryptography.fernet import Fernet
 from cryptography.hazmat.primitives import hashes
@@ -16,13 +19,44 @@ from cryptography.hazmat.primitives.asymmetric import rsa
 from cryptography.hazmat.primitives import serialization
 
 
+class KeysUnavailable(Exception):
+    """The key files are missing, expired or inconsistent; run `manage.py check_keys`"""
+
+
 class KeyManager:
     def __init__(self, keys_dir=None):
         self.keys_dir = keys_dir or os.path.join(os.path.dirname(__file__), 'keys')
         self.metadata_file = os.path.join(self.keys_dir, 'key_metadata.json')
         self.encryption_key_file = os.path.join(self.keys_dir, 'encryption.key')
         self.signing_key_file = os.path.join(self.keys_dir, 'signing.key')
-        
+        self.retired_keys_dir = os.path.join(self.keys_dir, 'retired')
+        self.lock_file = os.path.join(self.keys_dir, '.lock')
+    
+    @contextmanager
+    def lock(self):
+        """Exclusive lock across processes sharing keys_dir, held while keys are generated or pruned"""
+        os.makedirs(self.keys_dir, exist_ok=True)
+        with open(self.lock_file, 'a') as f:
+            fcntl.flock(f, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+    
+    def _write_atomic(self, path, data, mode=0o600):
+        """Write through a temporary file and rename, so readers never see a partial key"""
+        directory = os.path.dirname(path)
+        fd, tmp_path = tempfile.mkstemp(dir=directory, prefix='.tmp-')
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                f.write(data)
+            os.chmod(tmp_path, mode)
+            os.replace(tmp_path, path)
+        except BaseException:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            raise
+    
     def generate_encryption_key(self):
         """Generate a new Fernet encryption key"""
         return Fernet.generate_key()
@@ -43,6 +77,71 @@ class KeyManager:
         """Generate Django secret key from encryption key"""
         return base64.urlsafe_b64encode(encryption_key[:32]).decode()
     
+    def get_public_key_pem(self, signing_key):
+        """Derive the PEM public key from a PEM private signing key"""
+        private_key = serialization.load_pem_private_key(signing_key, password=None)
+        return private_key.public_key().public_bytes(
+            encoding=serialization.Encoding.PEM,
+            format=serialization.PublicFormat.SubjectPublicKeyInfo
+        )
+    
+    def retire_signing_key(self):
+        """Keep the public half of the current signing key so issued tokens stay verifiable"""
+        if not os.path.exists(self.signing_key_file):
+            return None
+        
+        try:
+            with open(self.signing_key_file, 'rb') as f:
+                public_key = self.get_public_key_pem(f.read())
+        except (ValueError, TypeError):
+            # Not a valid PEM key, nothing worth keeping
+            return None
+        
+        os.makedirs(self.retired_keys_dir, exist_ok=True)
+        # The key's own hash keeps names unique when two rotations fall in the
+        # same second, and makes retiring the same key twice a no-op
+        suffix = f"_{self.calculate_hash(public_key)[:16]}.pub"
+        for filename in os.listdir(self.retired_keys_dir):
+            if filename.endswith(suffix):
+                return os.path.join(self.retired_keys_dir, filename)
+        
+        retired_path = os.path.join(
+            self.retired_keys_dir,
+            f"signing_{datetime.now().strftime('%Y%m%d_%H%M%S')}{suffix}"
+        )
+        self._write_atomic(retired_path, public_key, 0o644)
+        
+        return retired_path
+    
+    def get_retired_public_keys(self):
+        """Get public keys of retired signing keys (read-only; pruning is done by prune_retired_keys)"""
+        if not os.path.isdir(self.retired_keys_dir):
+            return []
+        
+        public_keys = []
+        for filename in sorted(os.listdir(self.retired_keys_dir)):
+            if not filename.endswith('.pub'):
+                continue
+            with open(os.path.join(self.retired_keys_dir, filename), 'rb') as f:
+                public_keys.append(f.read())
+        
+        return public_keys
+    
+    def prune_retired_keys(self, max_age_days=400):
+        """Remove retired public keys older than any token they could have signed"""
+        if not os.path.isdir(self.retired_keys_dir):
+            return 0
+        
+        cutoff = datetime.now() - timedelta(days=max_age_days)
+        removed = 0
+        for filename in os.listdir(self.retired_keys_dir):
+            path = os.path.join(self.retired_keys_dir, filename)
+            if datetime.fromtimestamp(os.path.getmtime(path)) < cutoff:
+                os.remove(path)
+                removed += 1
+        
+        return removed
+    
     def calculate_hash(self, data):
         """Calculate SHA256 hash of data"""
         return hashlib.sha256(data).hexdigest()
@@ -91,8 +190,9 @@ class KeyManager:
             return False
     
     def generate_new_keys(self):
-        """Generate new keys and save them with metadata"""
+        """Generate new keys and save them with metadata (callers hold the lock, see ensure_keys)"""
         os.makedirs(self.keys_dir, exist_ok=True)
+        self.retire_signing_key()
         
         # Generate keys
         encryption_key = self.generate_encryption_key()
@@ -106,12 +206,9 @@ class KeyManager:
         created_at = datetime.now()
         expires_at = created_at + timedelta(days=730)
         
-        # Save keys
-        with open(self.encryption_key_file, 'wb') as f:
-            f.write(encryption_key)
-        
-        with open(self.signing_key_file, 'wb') as f:
-            f.write(signing_key)
+        # Save keys (metadata last: it is what marks the new keys as valid)
+        self._write_atomic(self.encryption_key_file, encryption_key)
+        self._write_atomic(self.signing_key_file, signing_key)
         
         # Save metadata
         metadata = {
@@ -120,14 +217,7 @@ class KeyManager:
             'encryption_key_hash': encryption_hash,
             'signing_key_hash': signing_hash
         }
-        
-        with open(self.metadata_file, 'w') as f:
-            json.dump(metadata, f, indent=4)
-        
-        # Set secure permissions
-        os.chmod(self.encryption_key_file, 0o600)
-        os.chmod(self.signing_key_file, 0o600)
-        os.chmod(self.metadata_file, 0o600)
+        self._write_atomic(self.metadata_file, json.dumps(metadata, indent=4).encode())
         
         return {
             'encryption_key': encryption_key,
@@ -136,20 +226,22 @@ class KeyManager:
             'expires_at': expires_at
         }
     
-    def get_keys(self):
-        """Get current keys, generate new ones if needed"""
+    def load_keys(self):
+        """Read the current keys without ever generating them; raises KeysUnavailable"""
         if not self.check_key_validity() or not self.verify_key_integrity():
-            return self.generate_new_keys()
-        
-        # Load existing keys
-        with open(self.encryption_key_file, 'rb') as f:
-            encryption_key = f.read()
+            raise KeysUnavailable(f"No valid keys in {self.keys_dir}")
         
-        with open(self.signing_key_file, 'rb') as f:
-            signing_key = f.read()
-        
-        with open(self.metadata_file, 'r') as f:
-            metadata = json.load(f)
+        try:
+            with open(self.encryption_key_file, 'rb') as f:
+                encryption_key = f.read()
+            
+            with open(self.signing_key_file, 'rb') as f:
+                signing_key = f.read()
+            
+            with open(self.metadata_file, 'r') as f:
+                metadata = json.load(f)
+        except (IOError, json.JSONDecodeError) as e:
+            raise KeysUnavailable(str(e))
         
         return {
             'encryption_key': encryption_key,
@@ -157,6 +249,23 @@ class KeyManager:
             'secret_key': self.generate_secret_key(encryption_key),
             'expires_at': datetime.fromisoformat(metadata['expires_at'].replace('Z', '+00:00'))
         }
+    
+    def ensure_keys(self, force_new=False, max_age_days=400):
+        """
+        Generate or rotate the keys if needed and prune old retired keys, under
+        the keys_dir lock so concurrent processes never generate two different keys
+        Returns (keys, generated)
+        """
+        with self.lock():
+            generated = force_new or not self.check_key_validity() or not self.verify_key_integrity()
+            if generated:
+                self.generate_new_keys()
+            self.prune_retired_keys(max_age_days)
+            return self.load_keys(), generated
+    
+    def get_keys(self):
+        """Get current keys, generate new ones if needed"""
+        return self.ensure_keys()[0]
 
 
 def initialize_keys():
@@ -6,24 +6,22 @@
 set -e
 
 BACKUP_DIR="/app/backups"
-TIMESTAMP=$(date +%Y%m%d_%H%M%S)
-BACKUP_FILE="backup_${POSTGRES_DB:-sistema}_${TIMESTAMP}.sql.gz"
 
 # Create backup directory if it doesn't exist
 mkdir -p "$BACKUP_DIR"
 
 echo "Creating database backup..."
 echo "Database: ${POSTGRES_DB:-sistema}"
-echo "Backup file: ${BACKUP_DIR}/${BACKUP_FILE}"
+echo "Format: ${BACKUP_FORMAT:-plain}"
 
 # Run backup using Python script
 cd /app
-python backup_manager.py backup
+python backup_manager.py backup "$@"
 
 echo "Backup completed successfully"
 
 # Clean old backups (keep last 7 days)
-find "$BACKUP_DIR" -name "backup_*.sql.gz" -mtime +7 -delete
-find "$BACKUP_DIR" -name "backup_*.json" -mtime +7 -delete
+# Dumps are files (.sql.gz, .dump.zst, ...) or directories (.dir)
+find "$BACKUP_DIR" -mindepth 1 -maxdepth 1 -name "backup_*" -mtime +7 -exec rm -rf {} +
 
 echo "Old backups cleaned up"
\ No newline at end of file
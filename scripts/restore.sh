@@ -9,21 +9,23 @@ BACKUP_DIR="/app/backups"
 
 # Function to display usage
 usage() {
-    echo "Usage: $0 <backup_filename>"
+    echo "Usage: $0 <backup_filename> [--jobs N] [--mode swap|replace]"
     echo "Available backups:"
-    ls -la "$BACKUP_DIR"/backup_*.sql.gz 2>/dev/null || echo "No backups found"
+    # Dumps are files (.sql.gz, .sql.zst, .dump.zst, ...) or directories (.dir)
+    ls -dla "$BACKUP_DIR"/backup_* 2>/dev/null | grep -v '\.json$' || echo "No backups found"
     exit 1
 }
 
 # Check if backup filename is provided
-if [ $# -ne 1 ]; then
+if [ $# -lt 1 ]; then
     usage
 fi
 
 BACKUP_FILE="$1"
+shift
 
 # Check if backup file exists
-if [ ! -f "$BACKUP_DIR/$BACKUP_FILE" ]; then
+if [ ! -e "$BACKUP_DIR/$BACKUP_FILE" ]; then
     echo "Error: Backup file not found: $BACKUP_DIR/$BACKUP_FILE"
     usage
 fi
@@ -31,6 +33,9 @@ fi
 echo "Restoring database from backup..."
 echo "Backup file: $BACKUP_FILE"
 echo "Database: ${POSTGRES_DB:-sistema}"
+# swap: restore into a side database and rename it over the live one (seconds of downtime)
+# replace: drop the live database and restore in place (down for the whole restore)
+echo "Mode: ${BACKUP_RESTORE_MODE:-swap}"
 
 # Confirm restoration
 read -p "This will replace the current database. Continue? (y/N): " -n 1 -r
@@ -42,9 +47,12 @@ fi
 
 # Run restore using Python script
 cd /app
-python backup_manager.py restore "$BACKUP_FILE"
+# Progress (MB/s, ETA) is printed on stderr while the restore runs
+python backup_manager.py restore --filename "$BACKUP_FILE" "$@"
 
 echo "Database restored successfully from $BACKUP_FILE"
+echo "In swap mode the replaced database is kept as ${POSTGRES_DB:-sistema}_previous_<timestamp>"
+echo "If the backup predates the current code, run 'python manage.py migrate'"
 
 # Restart services to ensure clean state
 echo "Restarting services..."
@@ -123,17 +123,23 @@ cat > scripts/restore.sh << 'EOF'
 
 # Restore script for Sistema
 
+set -e
+
 BACKUP_DIR="/app/backups"
-LATEST_BACKUP=$(ls -t $BACKUP_DIR/*.sql.gz | head -n 1)
+# Each backup has a metadata file naming its dump (.sql.gz, .sql.zst, .dump.zst, .dir)
+LATEST_METADATA=$(ls -t $BACKUP_DIR/backup_*.json 2>/dev/null | head -n 1)
 
-if [ -z "$LATEST_BACKUP" ]; then
+if [ -z "$LATEST_METADATA" ]; then
     echo "No backup files found in $BACKUP_DIR"
     exit 1
 fi
 
+LATEST_BACKUP=$(python -c 'import json, sys; print(json.load(open(sys.argv[1]))["filename"])' "$LATEST_METADATA")
+
 echo "Restoring from backup: $LATEST_BACKUP"
 
-gunzip -c "$LATEST_BACKUP" | PGPASSWORD="$POSTGRES_PASSWORD" psql -h "$POSTGRES_HOST" -U "$POSTGRES_USER" -d "$POSTGRES_DB"
+cd /app
+python backup_manager.py restore --filename "$LATEST_BACKUP"
 
 echo "Restore completed successfully"
 EOF